@@ -0,0 +1,144 @@
+"""Synthetic data mirroring the size of real MEG recordings"""
+
+import os
+import os.path as op
+
+import numpy as np
+
+import mne
+from mne.fiff import (read_info, pick_types, pick_info, start_writing_raw,
+                      write_raw_buffer, finish_writing_raw)
+from mne.fiff.constants import FIFF
+from mne.surface import _get_ico_surface, write_surface
+
+data_dir = op.join(op.dirname(mne.__file__), 'fiff', 'tests', 'data')
+template_fname = op.join(data_dir, 'test_raw.fif')
+cov_fname = op.join(data_dir, 'test-cov.fif')
+
+sfreq = 1000.
+raw_duration = 60.  # seconds
+event_interval = 1000  # samples between events
+n_src_hemi = 5121  # ~10k sources in total
+
+
+def make_info():
+    """Measurement info with 306 MEG channels and a trigger channel"""
+    info = read_info(template_fname)
+    picks = pick_types(info, meg=True, stim=True, exclude=[])
+    info = pick_info(info, picks)
+    info['sfreq'] = sfreq
+    info['lowpass'] = sfreq / 2.
+    info['highpass'] = 0.
+    info['bads'] = []
+    info['projs'] = []
+    info['comps'] = []
+    return info
+
+
+def make_raw(fname, duration=raw_duration, seed=0):
+    """Write a raw file with white noise and regularly spaced events"""
+    info = make_info()
+    rng = np.random.RandomState(seed)
+    scale = np.empty(info['nchan'])
+    for k, ch in enumerate(info['chs']):
+        if ch['kind'] == FIFF.FIFFV_STIM_CH:
+            scale[k] = 0.
+        elif ch['unit'] == FIFF.FIFF_UNIT_T_M:
+            scale[k] = 1e-11
+        else:
+            scale[k] = 1e-13
+    stim = info['ch_names'].index('STI 014')
+    fid, cals = start_writing_raw(fname, info)
+    n_times = int(duration * sfreq)
+    buffer_size = int(sfreq)
+    for first in range(0, n_times, buffer_size):
+        n_buf = min(buffer_size, n_times - first)
+        data = scale[:, np.newaxis] * rng.randn(info['nchan'], n_buf)
+        times = np.arange(first, first + n_buf)
+        data[stim, times % event_interval == event_interval // 2] = 1.
+        write_raw_buffer(fid, data, cals, 'single', None)
+    finish_writing_raw(fid)
+    return fname
+
+
+def make_events(duration=raw_duration):
+    """Events matching the triggers written by make_raw"""
+    samples = np.arange(event_interval // 2, int(duration * sfreq),
+                        event_interval)
+    return np.c_[samples, np.zeros_like(samples), np.ones_like(samples)]
+
+
+def make_src(grade=5, n_use=n_src_hemi):
+    """Two spherical hemispheres with n_use sources each"""
+    ico = _get_ico_surface(grade)
+    rr = ico['rr'] / np.sqrt(np.sum(ico['rr'] ** 2, axis=1))[:, np.newaxis]
+    vertno = np.linspace(0, len(rr) - 1, n_use).astype(int)
+    src = list()
+    for s_id, offset in ((FIFF.FIFFV_MNE_SURF_LEFT_HEMI, -0.035),
+                         (FIFF.FIFFV_MNE_SURF_RIGHT_HEMI, 0.035)):
+        inuse = np.zeros(len(rr), int)
+        inuse[vertno] = 1
+        src.append(dict(id=s_id, type='surf', np=len(rr),
+                        ntri=len(ico['tris']),
+                        rr=0.07 * rr + [offset, 0., 0.04], nn=rr.copy(),
+                        tris=ico['tris'], inuse=inuse, vertno=vertno.copy(),
+                        nuse=n_use, coord_frame=FIFF.FIFFV_COORD_MRI,
+                        nuse_tri=0, use_tris=None, nearest=None,
+                        nearest_dist=None, pinfo=None, patch_inds=None,
+                        dist=None, dist_limit=None))
+    return src
+
+
+def make_forward(info, src, seed=0):
+    """Fixed-orientation forward solution with a random gain matrix"""
+    picks = pick_types(info, meg=True, exclude=[])
+    info = pick_info(info, picks)
+    n_src = sum(s['nuse'] for s in src)
+    rng = np.random.RandomState(seed)
+    gain = 1e-8 * rng.randn(info['nchan'], n_src)
+    source_rr = np.concatenate([s['rr'][s['vertno']] for s in src])
+    source_nn = np.concatenate([s['nn'][s['vertno']] for s in src])
+    sol = dict(data=gain, row_names=info['ch_names'], col_names=[],
+               nrow=gain.shape[0], ncol=gain.shape[1])
+    mri_head_t = dict(to=FIFF.FIFFV_COORD_HEAD, trans=np.eye(4))
+    mri_head_t['from'] = FIFF.FIFFV_COORD_MRI
+    fwd = dict(info=info, sol=sol, sol_grad=None, nchan=info['nchan'],
+               nsource=n_src, source_ori=FIFF.FIFFV_MNE_FIXED_ORI,
+               _orig_source_ori=FIFF.FIFFV_MNE_FIXED_ORI, surf_ori=True,
+               coord_frame=FIFF.FIFFV_COORD_HEAD, mri_head_t=mri_head_t,
+               source_rr=source_rr, source_nn=source_nn, src=src,
+               _orig_sol=gain, _orig_sol_grad=None)
+    return fwd
+
+
+def make_inverse(info, src):
+    """Fixed-orientation inverse operator for the synthetic forward"""
+    fwd = make_forward(info, src)
+    cov = mne.read_cov(cov_fname)
+    return mne.minimum_norm.make_inverse_operator(
+        info, fwd, cov, loose=None, depth=None, fixed=True, verbose=False)
+
+
+def make_subjects_dir(subjects_dir, grade=6):
+    """Two subjects with (rotated) icosahedral sphere.reg surfaces"""
+    ico = _get_ico_surface(grade)
+    rr = ico['rr'] / np.sqrt(np.sum(ico['rr'] ** 2, axis=1))[:, np.newaxis]
+    for subject, angle in (('sub_from', 0.), ('sub_to', 0.1)):
+        rot = np.array([[np.cos(angle), -np.sin(angle), 0.],
+                        [np.sin(angle), np.cos(angle), 0.],
+                        [0., 0., 1.]])
+        surf_dir = op.join(subjects_dir, subject, 'surf')
+        if not op.isdir(surf_dir):
+            os.makedirs(surf_dir)
+        for hemi in ('lh', 'rh'):
+            write_surface(op.join(surf_dir, '%s.sphere.reg' % hemi),
+                          100. * np.dot(rr, rot.T), ico['tris'])
+    return 'sub_from', 'sub_to'
+
+
+def make_stc(n_vertices, n_use=n_src_hemi, n_times=100, seed=0):
+    """Surface source estimate on n_use vertices per hemisphere"""
+    rng = np.random.RandomState(seed)
+    vertno = np.linspace(0, n_vertices - 1, n_use).astype(int)
+    data = rng.randn(2 * n_use, n_times)
+    return mne.SourceEstimate(data, [vertno, vertno.copy()], 0., 1. / sfreq)
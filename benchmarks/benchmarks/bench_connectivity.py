@@ -0,0 +1,29 @@
+"""Benchmarks of spectral connectivity estimation"""
+
+import numpy as np
+
+import mne
+from mne.connectivity import spectral_connectivity
+
+from ._synthetic import sfreq
+
+mne.set_log_level('WARNING')
+
+
+class SpectralConnectivity(object):
+    """Connectivity between 68 labels for 30 epochs of 1000 samples"""
+    timeout = 600
+    params = ['multitaper', 'fourier']
+    param_names = ['mode']
+
+    def setup(self, mode):
+        rng = np.random.RandomState(0)
+        self.data = rng.randn(30, 68, 1000)
+
+    def time_spectral_connectivity(self, mode):
+        spectral_connectivity(self.data, method=['coh', 'pli'], mode=mode,
+                              sfreq=sfreq, fmin=8., fmax=13., faverage=True)
+
+    def peakmem_spectral_connectivity(self, mode):
+        spectral_connectivity(self.data, method=['coh', 'pli'], mode=mode,
+                              sfreq=sfreq, fmin=8., fmax=13., faverage=True)
@@ -0,0 +1,14 @@
+"""Benchmarks of the import time of mne (each in a fresh interpreter)"""
+
+
+class Import(object):
+    timeout = 120
+
+    def timeraw_import_mne(self):
+        return 'import mne'
+
+    def timeraw_read_events(self):
+        return 'import mne; mne.read_events'
+
+    def timeraw_import_minimum_norm(self):
+        return 'import mne.minimum_norm'
@@ -0,0 +1,36 @@
+"""Benchmarks of raw data reading"""
+
+import os.path as op
+
+import mne
+from mne.fiff import Raw
+
+from ._synthetic import make_raw
+
+mne.set_log_level('WARNING')
+
+
+class RawIO(object):
+    """Reading a 60 s, 306 channel, 1 kHz raw file"""
+    timeout = 300
+
+    def setup_cache(self):
+        return op.abspath(make_raw('bench_raw.fif'))
+
+    def setup(self, fname):
+        self.raw = Raw(fname, preload=False)
+
+    def teardown(self, fname):
+        self.raw.close()
+
+    def time_read_segment(self, fname):
+        self.raw._read_segment(start=0, stop=10000)
+
+    def peakmem_read_segment(self, fname):
+        self.raw._read_segment(start=0, stop=10000)
+
+    def time_preload(self, fname):
+        Raw(fname, preload=True).close()
+
+    def peakmem_preload(self, fname):
+        Raw(fname, preload=True).close()
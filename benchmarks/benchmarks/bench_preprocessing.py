@@ -0,0 +1,42 @@
+"""Benchmarks of filtering and epoching"""
+
+import os.path as op
+
+import mne
+from mne import Epochs
+from mne.fiff import Raw, pick_types
+from mne.filter import band_pass_filter
+
+from ._synthetic import make_raw, make_events, sfreq
+
+mne.set_log_level('WARNING')
+
+
+class Preprocessing(object):
+    """Filtering and epoching a 60 s, 306 channel, 1 kHz raw file"""
+    timeout = 300
+
+    def setup_cache(self):
+        return op.abspath(make_raw('bench_raw.fif'))
+
+    def setup(self, fname):
+        self.raw = Raw(fname, preload=True)
+        self.events = make_events()
+        self.picks = pick_types(self.raw.info, meg=True, exclude=[])
+        self.data = self.raw._data[self.picks]
+
+    def _epochs(self):
+        return Epochs(self.raw, self.events, 1, -0.2, 0.5, picks=self.picks,
+                      baseline=(None, 0), preload=True, proj=False)
+
+    def time_epochs(self, fname):
+        self._epochs()
+
+    def peakmem_epochs(self, fname):
+        self._epochs()
+
+    def time_band_pass_filter(self, fname):
+        band_pass_filter(self.data, sfreq, 1., 40.)
+
+    def peakmem_band_pass_filter(self, fname):
+        band_pass_filter(self.data, sfreq, 1., 40.)
@@ -0,0 +1,65 @@
+"""Benchmarks of inverse solutions and morphing with ~10k sources"""
+
+import os.path as op
+
+import mne
+from mne import Epochs, morph_data, read_morph_map, compute_morph_matrix
+from mne.fiff import Raw
+from mne.minimum_norm import apply_inverse_epochs, apply_inverse_epochs_data
+
+from ._synthetic import (make_raw, make_events, make_src, make_inverse,
+                         make_subjects_dir, make_stc)
+
+mne.set_log_level('WARNING')
+
+
+class InverseEpochs(object):
+    """dSPM on 10 epochs of 306 channels x 701 samples"""
+    timeout = 600
+
+    def setup_cache(self):
+        return op.abspath(make_raw('bench_raw.fif', duration=12.))
+
+    def setup(self, fname):
+        raw = Raw(fname, preload=True)
+        self.inv = make_inverse(raw.info, make_src())
+        self.epochs = Epochs(raw, make_events(12.)[:10], 1, -0.2, 0.5,
+                             baseline=(None, 0), preload=True, proj=False)
+
+    def time_apply_inverse_epochs(self, fname):
+        apply_inverse_epochs(self.epochs, self.inv, 1. / 9., 'dSPM')
+
+    def peakmem_apply_inverse_epochs(self, fname):
+        apply_inverse_epochs(self.epochs, self.inv, 1. / 9., 'dSPM')
+
+    def time_apply_inverse_epochs_data(self, fname):
+        apply_inverse_epochs_data(self.epochs, self.inv, 1. / 9., 'dSPM')
+
+
+class Morph(object):
+    """Morphing ~10k sources x 100 samples between ico-6 spheres"""
+    timeout = 900
+
+    def setup_cache(self):
+        subjects_dir = op.abspath('subjects')
+        subject_from, subject_to = make_subjects_dir(subjects_dir)
+        # the morph maps are computed once and saved in subjects_dir
+        read_morph_map(subject_from, subject_to, subjects_dir)
+        return subjects_dir
+
+    def setup(self, subjects_dir):
+        self.stc = make_stc(40962)
+        self.vertices_to = mne.grade_to_vertices('sub_to', 5, subjects_dir)
+
+    def time_compute_morph_matrix(self, subjects_dir):
+        compute_morph_matrix('sub_from', 'sub_to', self.stc.vertno,
+                             self.vertices_to, smooth=5,
+                             subjects_dir=subjects_dir, cache=False)
+
+    def time_morph_data(self, subjects_dir):
+        morph_data('sub_from', 'sub_to', self.stc, grade=5, smooth=5,
+                   subjects_dir=subjects_dir, cache=False)
+
+    def peakmem_morph_data(self, subjects_dir):
+        morph_data('sub_from', 'sub_to', self.stc, grade=5, smooth=5,
+                   subjects_dir=subjects_dir, cache=False)
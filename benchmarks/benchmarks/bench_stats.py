@@ -0,0 +1,32 @@
+"""Benchmarks of cluster-level permutation statistics"""
+
+import numpy as np
+
+import mne
+from mne import spatial_tris_connectivity
+from mne.stats import spatio_temporal_cluster_1samp_test
+from mne.surface import _get_ico_surface
+
+mne.set_log_level('WARNING')
+
+
+class ClusterStats(object):
+    """1-sample test on 15 subjects x 50 times x 2562 vertices"""
+    timeout = 600
+
+    def setup(self):
+        tris = _get_ico_surface(4)['tris']
+        self.connectivity = spatial_tris_connectivity(tris)
+        rng = np.random.RandomState(0)
+        self.X = rng.randn(15, 50, 2562)
+        self.X[:, 20:30, :100] += 1.
+
+    def time_spatio_temporal_cluster_1samp_test(self):
+        spatio_temporal_cluster_1samp_test(
+            self.X, threshold=3., n_permutations=64,
+            connectivity=self.connectivity, seed=0)
+
+    def peakmem_spatio_temporal_cluster_1samp_test(self):
+        spatio_temporal_cluster_1samp_test(
+            self.X, threshold=3., n_permutations=64,
+            connectivity=self.connectivity, seed=0)
@@ -0,0 +1,53 @@
+"""Benchmarks of the call overhead of the verbose decorator"""
+
+import os.path as op
+
+import mne
+from mne import Epochs
+from mne.fiff import Raw
+from mne.utils import verbose
+
+from ._synthetic import make_raw, make_events
+
+mne.set_log_level('WARNING')
+
+
+@verbose
+def _decorated(x, verbose=None):
+    return x
+
+
+def _plain(x, verbose=None):
+    return x
+
+
+class VerboseOverhead(object):
+    """Calling a trivial function 10000 times"""
+    params = [None, 'WARNING', 'INFO']
+    param_names = ['verbose']
+
+    def time_decorated(self, level):
+        for ii in range(10000):
+            _decorated(ii, verbose=level)
+
+    def time_plain(self, level):
+        for ii in range(10000):
+            _plain(ii, verbose=level)
+
+
+class EpochsIteration(object):
+    """Iterating over ~60 epochs read from disk, one at a time"""
+    timeout = 300
+
+    def setup_cache(self):
+        return op.abspath(make_raw('bench_raw.fif'))
+
+    def setup(self, fname):
+        raw = Raw(fname, preload=False)
+        self.epochs = Epochs(raw, make_events(), 1, -0.2, 0.5,
+                             baseline=(None, 0), preload=False, proj=False,
+                             verbose='WARNING')
+
+    def time_iterate(self, fname):
+        for epoch in self.epochs:
+            pass
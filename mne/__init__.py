@@ -3,6 +3,8 @@
 
 __version__ = '0.8.git'
 
+import sys
+
 # have to import verbose first since it's needed by many things
 from .utils import (set_log_level, set_log_file, verbose, set_config,
                     get_config, get_config_path, set_cache_dir,
@@ -14,10 +16,6 @@ from .cov import (read_cov, write_cov, Covariance,
 from .event import (read_events, write_events, find_events, merge_events,
                     pick_events, make_fixed_length_events, concatenate_events,
                     find_stim_steps)
-from .forward import (read_forward_solution, apply_forward, apply_forward_raw,
-                      do_forward_solution, average_forward_solutions,
-                      write_forward_solution, make_forward_solution,
-                      convert_forward_solution, make_field_map)
 from .source_estimate import (read_source_estimate,
                               SourceEstimate, VolSourceEstimate, morph_data,
                               morph_data_precomputed, compute_morph_matrix,
@@ -28,7 +26,8 @@ from .source_estimate import (read_source_estimate,
                               spatio_temporal_src_connectivity,
                               spatio_temporal_tris_connectivity,
                               spatio_temporal_dist_connectivity,
-                              save_stc_as_volume, extract_label_time_course)
+                              save_stc_as_volume, extract_label_time_course,
+                              LabelExtractor)
 from .surface import (read_bem_surfaces, read_surface, write_bem_surface,
                       write_surface, decimate_surface, read_morph_map,
                       read_bem_solution)
@@ -53,26 +52,42 @@ from .dipole import read_dip
 from .layouts.layout import find_layout
 from .fiff.channels import equalize_channels, rename_channels
 
-from . import beamformer
-from . import connectivity
 from . import coreg
 from . import cuda
-from . import datasets
 from . import epochs
 from . import externals
 from . import fiff
 from . import filter
-from . import gui
 from . import layouts
-from . import minimum_norm
-from . import mixed_norm
-from . import preprocessing
-from . import simulation
-from . import stats
-from . import time_frequency
-from . import viz
-from . import decoding
-from . import realtime
+
+# heavy submodules (and names from them) are only imported on first access
+_lazy_submodules = ['beamformer', 'connectivity', 'datasets', 'decoding',
+                    'forward', 'gui', 'minimum_norm', 'mixed_norm',
+                    'preprocessing', 'realtime', 'simulation', 'stats',
+                    'time_frequency', 'viz']
+_lazy_names = dict((name, 'forward') for name in (
+    'read_forward_solution', 'apply_forward', 'apply_forward_raw',
+    'do_forward_solution', 'average_forward_solutions',
+    'write_forward_solution', 'make_forward_solution',
+    'make_forward_solutions_positions',
+    'convert_forward_solution', 'make_field_map'))
+
+
+def __getattr__(name):
+    if name in _lazy_submodules:
+        __import__(__name__ + '.' + name)
+        return sys.modules[__name__ + '.' + name]
+    if name in _lazy_names:
+        value = getattr(__getattr__(_lazy_names[name]), name)
+        setattr(sys.modules[__name__], name, value)
+        return value
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+
+def __dir__():
+    return sorted(set(sys.modules[__name__].__dict__) |
+                  set(_lazy_submodules) | set(_lazy_names))
+
 
 # initialize logging
 set_log_level(None, False)
@@ -81,3 +96,22 @@ set_log_file()
 # initialize CUDA
 if get_config('MNE_USE_CUDA', 'false').lower() == 'true':
     cuda.init_cuda()
+
+# initialize profiling
+if get_config('MNE_PROFILE', 'false').lower() not in ('false', '0'):
+    from .utils import _start_global_profile
+    _start_global_profile(get_config('MNE_PROFILE'))
+
+if sys.version_info < (3, 7):
+    # module-level __getattr__ is not supported (PEP 562), so the module is
+    # replaced with an instance of a module class that implements it
+    class _LazyModule(type(sys)):
+        def __getattr__(self, name):
+            return __getattr__(name)
+
+        def __dir__(self):
+            return __dir__()
+
+    _module = _LazyModule(__name__, __doc__)
+    _module.__dict__.update(globals())
+    sys.modules[__name__] = _module
@@ -10,7 +10,6 @@ from glob import glob, iglob
 import os
 import re
 import shutil
-from warnings import warn
 
 import numpy as np
 from numpy import dot
@@ -22,7 +21,7 @@ from .fiff.meas_info import read_fiducials, write_fiducials
 from .label import read_label, Label
 from .source_space import read_source_spaces, write_source_spaces
 from .surface import (read_surface, write_surface, read_bem_surfaces,
-                      write_bem_surface)
+                      write_bem_surface, _get_nearest_tree)
 from .transforms import rotation, rotation3d, scaling, translation
 from .utils import get_config, get_subjects_dir, logger, pformat
 from functools import reduce
@@ -447,17 +446,17 @@ def _point_cloud_error(src_pts, tgt_pts):
     return dist
 
 
-def _point_cloud_error_balltree(src_pts, tgt_tree):
+def _point_cloud_error_tree(src_pts, tgt_tree):
     """Find the distance from each source point to its closest target point
 
-    Uses sklearn.neighbors.BallTree for greater efficiency
+    Uses scipy.spatial.cKDTree for greater efficiency
 
     Parameters
     ----------
     src_pts : array, shape = (n, 3)
         Source points.
-    tgt_tree : sklearn.neighbors.BallTree
-        BallTree of the target points.
+    tgt_tree : scipy.spatial.cKDTree
+        KD-tree of the target points.
 
     Returns
     -------
@@ -525,14 +524,8 @@ def fit_point_cloud(src_pts, tgt_pts, rotate=True, translate=True,
     if translate:
         src_pts = np.hstack((src_pts, np.ones((len(src_pts), 1))))
 
-    try:
-        from sklearn.neighbors import BallTree
-        tgt_pts = BallTree(tgt_pts)
-        errfunc = _point_cloud_error_balltree
-    except ImportError:
-        warn("Sklearn could not be imported. Fitting points will be slower. "
-             "To improve performance, install the sklearn module.")
-        errfunc = _point_cloud_error
+    tgt_pts = _get_nearest_tree(tgt_pts)
+    errfunc = _point_cloud_error_tree
 
     # for efficiency, define parameter specific error function
     param_info = (rotate, translate, scale)
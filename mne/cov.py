@@ -12,7 +12,7 @@ import numpy as np
 from scipy import linalg
 
 from . import fiff
-from .utils import logger, verbose
+from .utils import logger, verbose, profiled
 from .fiff.write import start_file, end_file
 from .fiff.proj import (make_projector, proj_equal, activate_proj,
                         _has_eeg_average_ref_proj)
@@ -294,6 +294,7 @@ def compute_raw_data_covariance(raw, tmin=None, tmax=None, tstep=0.2,
 
 
 @verbose
+@profiled
 def compute_covariance(epochs, keep_sample_mean=True, tmin=None, tmax=None,
                        projs=None, verbose=None):
     """Estimate noise covariance matrix from epochs
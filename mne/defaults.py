@@ -0,0 +1,40 @@
+"""Default values used for plotting and scaling of channel types
+"""
+
+# License: Simplified BSD
+
+from copy import deepcopy
+
+
+DEFAULTS = dict(color=dict(mag='darkblue', grad='b', eeg='k', eog='k', ecg='r',
+                           emg='k', ref_meg='steelblue', misc='k', stim='k',
+                           resp='k', chpi='k', exci='k', ias='k', syst='k'),
+                units=dict(eeg='uV', grad='fT/cm', mag='fT', misc='AU'),
+                scalings=dict(eeg=1e6, grad=1e13, mag=1e15, misc=1.0),
+                scalings_plot_raw=dict(mag=1e-12, grad=4e-11, eeg=20e-6,
+                                       eog=150e-6, ecg=5e-4, emg=1e-3,
+                                       ref_meg=1e-12, misc=1e-3,
+                                       stim=1, resp=1, chpi=1e-4, exci=1,
+                                       ias=1, syst=1),
+                ylim=dict(mag=(-600., 600.), grad=(-200., 200.),
+                          eeg=(-200., 200.), misc=(-5., 5.)),
+                titles=dict(eeg='EEG', grad='Gradiometers',
+                            mag='Magnetometers', misc='misc'))
+
+
+def _mutable_defaults(*mappings):
+    """ To avoid dicts as default keyword arguments
+
+    Use this function instead to resolve default dict values.
+    Example usage:
+    scalings, units = _mutable_defaults(('scalings', scalings,
+                                         'units', units))
+    """
+    out = []
+    for k, v in mappings:
+        this_mapping = DEFAULTS[k]
+        if v is not None:
+            this_mapping = deepcopy(DEFAULTS[k])
+            this_mapping.update(v)
+        out += [this_mapping]
+    return out
@@ -36,7 +36,7 @@ from .utils import (check_random_state, _check_pandas_index_arguments,
 from .filter import resample, detrend
 from .event import _read_events_fif
 from .fixes import in1d
-from .viz import _mutable_defaults, plot_epochs
+from .defaults import _mutable_defaults
 from .utils import logger, verbose
 from .externals import six
 from .externals.six.moves import zip
@@ -477,6 +477,7 @@ class _BaseEpochs(ProjMixin, ContainsMixin, DropChannelsMixin):
         fig : Instance of matplotlib.figure.Figure
             The figure.
         """
+        from .viz import plot_epochs
         return plot_epochs(self, epoch_idx=epoch_idx, picks=picks,
                            scalings=scalings, title_str=title_str,
                            show=show, block=block)
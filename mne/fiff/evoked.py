@@ -25,8 +25,7 @@ from .write import (start_file, start_block, end_file, end_block,
                     write_int, write_string, write_float_matrix,
                     write_id)
 
-from ..viz import plot_evoked, plot_evoked_topomap, _mutable_defaults
-from ..viz import plot_evoked_field
+from ..defaults import _mutable_defaults
 
 aspect_dict = {'average': FIFF.FIFFV_ASPECT_AVERAGE,
                'standard_error': FIFF.FIFFV_ASPECT_STD_ERR}
@@ -393,6 +392,7 @@ class Evoked(ProjMixin, ContainsMixin, DropChannelsMixin):
             the same length as the number of channel types. If instance of
             Axes, there must be only one channel type plotted.
         """
+        from ..viz import plot_evoked
         return plot_evoked(self, picks=picks, exclude=exclude, unit=unit,
                            show=show, ylim=ylim, proj=proj, xlim=xlim,
                            hline=hline, units=units, scalings=scalings,
@@ -456,6 +456,7 @@ class Evoked(ProjMixin, ContainsMixin, DropChannelsMixin):
         title : str | None
             Title. If None (default), no title is displayed.
         """
+        from ..viz import plot_evoked_topomap
         return plot_evoked_topomap(self, times=times, ch_type=ch_type,
                                    layout=layout,
                                    vmax=vmax, cmap=cmap, sensors=sensors,
@@ -485,6 +486,7 @@ class Evoked(ProjMixin, ContainsMixin, DropChannelsMixin):
         fig : instance of mlab.Figure
             The mayavi figure.
         """
+        from ..viz import plot_evoked_field
         return plot_evoked_field(self, surf_maps, time=time, time_label=time_label,
                                  n_jobs=n_jobs)
 
@@ -3,8 +3,10 @@
 #
 # License: BSD (3-clause)
 
+import numpy as np
+
 from .constants import FIFF
-from .tag import find_tag, has_tag
+from .tag import find_tag, has_tag, read_tag, _mmap_matrix
 from .write import (write_int, start_block, end_block, write_float_matrix,
                     write_name_list)
 from ..utils import logger, verbose
@@ -21,8 +23,44 @@ def _transpose_named_matrix(mat, copy=True):
     return mat
 
 
+def _find_named_matrix(node, matkind):
+    """Find the node of a named matrix (None if not available)"""
+    #   Descend one level if necessary
+    if node['block'] != FIFF.FIFFB_MNE_NAMED_MATRIX:
+        for k in range(node['nchild']):
+            if node['children'][k]['block'] == FIFF.FIFFB_MNE_NAMED_MATRIX:
+                if has_tag(node['children'][k], matkind):
+                    return node['children'][k]
+    elif has_tag(node, matkind):
+        return node
+    return None
+
+
+def _read_matrix_rows(fid, node, matkind, rows=None, mmap=False):
+    """Read the data of a matrix, only reading the given rows"""
+    pos = [d.pos for d in node['directory'] if d.kind == matkind]
+    if len(pos) == 0:
+        raise ValueError('Matrix data missing')
+    data = _mmap_matrix(fid, pos[0]) if mmap else None
+    if data is not None:
+        if rows is not None:
+            data = data[rows]
+    elif rows is None:
+        data = read_tag(fid, pos[0]).data
+    else:
+        # contiguous runs of rows are read at once
+        rows = np.asarray(rows, dtype=int)
+        breaks = np.where(np.diff(rows) != 1)[0] + 1
+        starts = rows[np.r_[0, breaks]]
+        stops = rows[np.r_[breaks - 1, len(rows) - 1]] + 1
+        data = np.concatenate([read_tag(fid, pos[0], rlims=rlims).data
+                               for rlims in zip(starts, stops)])
+    return data
+
+
 @verbose
-def _read_named_matrix(fid, node, matkind, indent='    ', verbose=None):
+def _read_named_matrix(fid, node, matkind, indent='    ', rows=None,
+                       mmap=False, verbose=None):
     """Read named matrix from the given node
 
     Parameters
@@ -33,6 +71,11 @@ def _read_named_matrix(fid, node, matkind, indent='    ', verbose=None):
         The node in the tree.
     matkind : int
         The type of matrix.
+    rows : array of int | None
+        If not None, only these rows of the matrix are read.
+    mmap : bool
+        If True, memory-map the matrix data (read-only) instead of reading
+        them, if possible.
     verbose : bool, str, int, or None
         If not None, override default verbose level (see mne.verbose).
 
@@ -41,33 +84,18 @@ def _read_named_matrix(fid, node, matkind, indent='    ', verbose=None):
     mat: dict
         The matrix data
     """
-    #   Descend one level if necessary
-    if node['block'] != FIFF.FIFFB_MNE_NAMED_MATRIX:
-        for k in range(node['nchild']):
-            if node['children'][k]['block'] == FIFF.FIFFB_MNE_NAMED_MATRIX:
-                if has_tag(node['children'][k], matkind):
-                    node = node['children'][k]
-                    break
-        else:
-            logger.info(indent + 'Desired named matrix (kind = %d) not '
-                        'available' % matkind)
-            return None
-    else:
-        if not has_tag(node, matkind):
-            logger.info(indent + 'Desired named matrix (kind = %d) not '
-                        'available' % matkind)
-            return None
+    node = _find_named_matrix(node, matkind)
+    if node is None:
+        logger.info(indent + 'Desired named matrix (kind = %d) not '
+                    'available' % matkind)
+        return None
 
     #   Read everything we need
-    tag = find_tag(fid, node, matkind)
-    if tag is None:
-        raise ValueError('Matrix data missing')
-    else:
-        data = tag.data
+    data = _read_matrix_rows(fid, node, matkind, rows, mmap)
 
     nrow, ncol = data.shape
     tag = find_tag(fid, node, FIFF.FIFF_MNE_NROW)
-    if tag is not None and tag.data != nrow:
+    if rows is None and tag is not None and tag.data != nrow:
         raise ValueError('Number of rows in matrix data and FIFF_MNE_NROW '
                          'tag do not match')
 
@@ -78,6 +106,8 @@ def _read_named_matrix(fid, node, matkind, indent='    ', verbose=None):
 
     tag = find_tag(fid, node, FIFF.FIFF_MNE_ROW_NAMES)
     row_names = tag.data.split(':') if tag is not None else []
+    if rows is not None and len(row_names) > 0:
+        row_names = [row_names[r] for r in rows]
 
     tag = find_tag(fid, node, FIFF.FIFF_MNE_COL_NAMES)
     col_names = tag.data.split(':') if tag is not None else []
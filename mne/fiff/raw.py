@@ -32,8 +32,8 @@ from ..filter import (low_pass_filter, high_pass_filter, band_pass_filter,
                       notch_filter, band_stop_filter, resample)
 from ..parallel import parallel_func
 from ..utils import (_check_fname, estimate_rank, _check_pandas_installed,
-                     logger, verbose)
-from ..viz import plot_raw, plot_raw_psds, _mutable_defaults
+                     logger, verbose, profiled)
+from ..defaults import _mutable_defaults
 
 
 class Raw(ProjMixin, ContainsMixin, DropChannelsMixin):
@@ -1104,6 +1104,7 @@ class Raw(ProjMixin, ContainsMixin, DropChannelsMixin):
         of a channel's time series. The changes will be reflected immediately
         in the raw object's ``raw.info['bads']`` entry.
         """
+        from ..viz import plot_raw
         return plot_raw(raw, events, duration, start, n_channels, bgcolor,
                         color, bad_color, event_color, scalings, remove_dc,
                         order, show_options, title, show, block)
@@ -1148,6 +1149,7 @@ class Raw(ProjMixin, ContainsMixin, DropChannelsMixin):
         verbose : bool, str, int, or None
             If not None, override default verbose level (see mne.verbose).
         """
+        from ..viz import plot_raw_psds
         return plot_raw_psds(self, tmin, tmax, fmin, fmax, proj, n_fft, picks,
                              ax, color, area_mode, area_alpha, n_jobs)
 
@@ -1526,6 +1528,7 @@ class Raw(ProjMixin, ContainsMixin, DropChannelsMixin):
         return raw_ts
 
     @verbose
+    @profiled
     def _read_segment(self, start=0, stop=None, sel=None, data_buffer=None,
                       verbose=None, projector=None):
         """Read a chunk of raw data
@@ -8,8 +8,9 @@ import os
 import gzip
 import numpy as np
 from scipy import linalg
-from ..externals.six import b, text_type
+from ..externals.six import b, text_type, string_types
 from ..externals.jdcal import jd2jcal
+from ..utils import _profilers, _profile_count
 
 from .constants import FIFF
 
@@ -178,6 +179,33 @@ def _fromstring_rows(fid, tag_size, dtype=None, shape=None, rlims=None):
     return out
 
 
+# The dtypes of the real-valued dense matrices
+_matrix_dtypes = {FIFF.FIFFT_INT: '>i4', FIFF.FIFFT_JULIAN: '>i4',
+                  FIFF.FIFFT_FLOAT: '>f4', FIFF.FIFFT_DOUBLE: '>f8'}
+
+
+def _mmap_matrix(fid, pos):
+    """Memory-map the data of a dense real-valued matrix Tag (read-only)
+
+    Returns None if the matrix cannot be memory-mapped, e.g., if the file
+    is compressed.
+    """
+    fname = getattr(fid, 'name', None)
+    if isinstance(fid, gzip.GzipFile) or not isinstance(fname, string_types):
+        return None
+    fid.seek(pos, 0)
+    tag = Tag(*struct.unpack(">iIii", fid.read(4 * 4)))
+    if (tag.type >> 16) != 16384 or (tag.type & 65535) not in _matrix_dtypes:
+        return None
+    data_pos = fid.tell()
+    fid.seek(tag.size - 4, 1)
+    ndim = int(np.fromstring(fid.read(4), dtype='>i4'))
+    fid.seek(-(ndim + 1) * 4, 1)
+    dims = np.fromstring(fid.read(4 * ndim), dtype='>i4')[::-1]
+    return np.memmap(fname, dtype=_matrix_dtypes[tag.type & 65535],
+                     mode='r', offset=data_pos, shape=tuple(dims))
+
+
 def _loc_to_trans(loc):
     """Helper to convert loc vector to coil_trans"""
     # deal with nasty OSX Anaconda bug by casting to float64
@@ -201,8 +229,8 @@ def read_tag(fid, pos=None, shape=None, rlims=None):
         data stored as a vector (not implemented for matrices yet).
     rlims : tuple | None
         If tuple, the first and last rows to retrieve. Note that data are
-        assumed to be stored row-major in the file. Only to be used with
-        data stored as a vector (not implemented for matrices yet).
+        assumed to be stored row-major in the file. For dense real-valued
+        matrices, the rows are taken along the first dimension.
 
     Returns
     -------
@@ -254,7 +282,24 @@ def read_tag(fid, pos=None, shape=None, rlims=None):
 
                 matrix_type = data_type & tag.type
 
-                if matrix_type == FIFF.FIFFT_INT:
+                if rlims is not None:
+                    # Only read the requested rows
+                    if matrix_type not in _matrix_dtypes:
+                        raise ValueError('Row reading not implemented for '
+                                         'matrices of type %d' % matrix_type)
+                    dtype = np.dtype(_matrix_dtypes[matrix_type])
+                    n_row_out = rlims[1] - rlims[0]
+                    if n_row_out <= 0 or rlims[1] > dims[0]:
+                        raise ValueError('rlims must yield at least one '
+                                         'output and be within the matrix')
+                    row_size = dtype.itemsize * int(np.prod(dims[1:]))
+                    fid.seek(int(rlims[0] * row_size), 1)
+                    tag.data = np.fromstring(read_big(fid, n_row_out *
+                                                      row_size), dtype=dtype)
+                    tag.data.shape = (n_row_out,) + tuple(dims[1:])
+                    # Move the pointer ahead to the end of the tag
+                    fid.seek(pos + tag.size, 0)
+                elif matrix_type == FIFF.FIFFT_INT:
                     tag.data = np.fromstring(read_big(fid, 4 * dims.prod()),
                                              dtype='>i4').reshape(dims)
                 elif matrix_type == FIFF.FIFFT_JULIAN:
@@ -468,6 +513,8 @@ def read_tag(fid, pos=None, shape=None, rlims=None):
         # f.seek(tag.next,0)
         fid.seek(tag.next, 1)  # XXX : fix? pb when tag.next < 0
 
+    if len(_profilers) > 0:  # too many calls to time each of them
+        _profile_count('mne.fiff.tag.read_tag', 16 + tag.size)
     return tag
 
 
@@ -9,11 +9,10 @@ from scipy import signal, stats
 from copy import deepcopy
 
 from .fixes import firwin2, filtfilt  # back port for old scipy
-from .time_frequency.multitaper import dpss_windows, _mt_spectra
-from .parallel import parallel_func
+from .parallel import parallel_func, chunk_jobs
 from .cuda import (setup_cuda_fft_multiply_repeated, fft_multiply_repeated,
                    setup_cuda_fft_resample, fft_resample, _smart_pad)
-from .utils import logger, verbose, sum_squared
+from .utils import logger, verbose, sum_squared, profiled
 
 
 def is_power2(num):
@@ -40,6 +39,7 @@ def is_power2(num):
     return num != 0 and ((num & (num - 1)) == 0)
 
 
+@profiled
 def _overlap_add_filter(x, h, n_fft=None, zero_phase=True, picks=None,
                         n_jobs=1):
     """ Filter using overlap-add FFTs.
@@ -141,13 +141,26 @@ def _overlap_add_filter(x, h, n_fft=None, zero_phase=True, picks=None,
                                       n_segments, n_seg, cuda_dict)
     else:
         _check_njobs(n_jobs, can_be_cuda=True)
-        parallel, p_fun, _ = parallel_func(_1d_overlap_filter, n_jobs)
-        data_new = parallel(p_fun(x[p], h_fft, n_edge, n_fft, zero_phase,
-                                  n_segments, n_seg, cuda_dict)
-                            for p in picks)
-        for pp, p in enumerate(picks):
-            x[p] = data_new[pp]
+        parallel, p_fun, n_jobs = parallel_func(_overlap_filter_chunk, n_jobs)
+        # rough cost of filtering one channel (in seconds)
+        cost = (2e-9 * (1 + zero_phase) * n_segments * n_fft *
+                np.log2(n_fft))
+        chunks = chunk_jobs(len(picks), n_jobs, cost=cost)
+        data_new = parallel(p_fun(x[picks[c]], h_fft, n_edge, n_fft,
+                                  zero_phase, n_segments, n_seg, cuda_dict)
+                            for c in chunks)
+        for c, d in zip(chunks, data_new):
+            x[picks[c]] = d
+
+    return x
+
 
+def _overlap_filter_chunk(x, h_fft, n_edge, n_fft, zero_phase, n_segments,
+                          n_seg, cuda_dict):
+    """Helper to filter a chunk of channels in a parallel job"""
+    for ii in range(len(x)):
+        x[ii] = _1d_overlap_filter(x[ii], h_fft, n_edge, n_fft, zero_phase,
+                                   n_segments, n_seg, cuda_dict)
     return x
 
 
@@ -1083,6 +1096,7 @@ def _mt_spectrum_remove(x, sfreq, line_freqs, notch_widths,
     Based on Chronux. If line_freqs is specified, all freqs within notch_width
     of each line_freq is set to zero.
     """
+    from .time_frequency.multitaper import dpss_windows, _mt_spectra
     # XXX need to implement the moving window version for raw files
     n_times = x.size
 
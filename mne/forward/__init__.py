@@ -9,6 +9,7 @@ from .forward import (read_forward_solution, write_forward_solution,
                       _fill_measurement_info, _apply_forward,
                       _subject_from_forward, convert_forward_solution,
                       _to_fixed_ori, prepare_bem_model)
-from ._make_forward import make_forward_solution
+from ._make_forward import (make_forward_solution,
+                            make_forward_solutions_positions)
 from ._field_interpolation import _make_surface_mapping, make_field_map
 from . import _lead_dots  # for testing purposes
@@ -5,6 +5,8 @@
 #
 # License: BSD (3-clause)
 
+import os
+import hashlib
 import numpy as np
 from copy import deepcopy
 
@@ -12,8 +14,8 @@ from ..surface import (fast_cross_3d, _find_nearest_tri_pt, _get_tri_supp_geom,
                        _triangle_coords)
 from ..fiff.constants import FIFF
 from ..transforms import apply_trans
-from ..utils import logger
-from ..parallel import parallel_func
+from ..utils import logger, profiled, get_config, _LRUCache
+from ..parallel import parallel_func, chunk_jobs, _max_nbytes
 from ..fiff.compensator import get_current_comp, make_compensator
 from ..fiff.pick import pick_types
 
@@ -151,6 +153,100 @@ def _bem_specify_els(bem, els):
     return sol
 
 
+#############################################################################
+# COIL SOLUTION CACHE
+
+_coil_solution_cache = _LRUCache(max_size=8)  # BEM solutions at the coils
+
+
+def _coil_solution_key(bem, coils, coord_frame, coil_type):
+    """Hash identifying the BEM solution at a set of coils or electrodes
+
+    The BEM is identified by its surfaces, conductivities, approximation
+    method, head->MRI transform and a subset of the rows of its solution
+    matrix (hashing all of it would be as slow as recomputing).
+    """
+    md5 = hashlib.md5()
+    sol = bem['solution']
+    md5.update(('%s|%s|%s|%s' % (coil_type, coord_frame, bem['bem_method'],
+                                 sol.shape)).encode('utf-8'))
+    for arr in ([bem['head_mri_t']['trans'], bem['sigma'],
+                 sol[::max(len(sol) // 16, 1)]] +
+                [s[key] for s in bem['surfs'] for key in ('rr', 'tris')] +
+                [c[key] for c in coils for key in ('rmag', 'cosmag', 'w')]):
+        md5.update(b'|')
+        md5.update(np.ascontiguousarray(arr, dtype=np.float64))
+    return md5.hexdigest()
+
+
+def _get_coil_solution_cache_fname(key):
+    """Name of the on-disk cache file of a coil solution (None if unset)"""
+    cache_dir = get_config('MNE_CACHE_DIR', None)
+    if cache_dir is None:
+        return None
+    return os.path.join(cache_dir, 'bem-coil-solutions', '%s.npy' % key)
+
+
+def _read_coil_solution_cache(fname):
+    """Read a coil solution written by _write_coil_solution_cache"""
+    if fname is None or not os.path.isfile(fname):
+        return None
+    try:
+        solution = np.load(fname)
+    except Exception as exp:
+        logger.warning('Could not read cached coil solution %s (%s)'
+                       % (fname, exp))
+        return None
+    return solution
+
+
+def _write_coil_solution_cache(fname, solution):
+    """Write a coil solution, warn on failure"""
+    if fname is None:
+        return
+    try:
+        cache_dir = os.path.dirname(fname)
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        # write to a temporary file first so that concurrent readers
+        # never see a partially written matrix
+        tmp_fname = '%s-%d.tmp.npy' % (fname[:-4], os.getpid())
+        np.save(tmp_fname, solution)
+        os.rename(tmp_fname, fname)
+    except Exception as exp:
+        logger.warning('Could not write coil solution cache %s (%s)'
+                       % (fname, exp))
+
+
+def _get_coil_solution(bem, coils, coord_frame, coil_type, n_jobs,
+                       cache=True):
+    """Get the BEM solution at the coils, using the cache if possible
+
+    The result can be modified in place, cached solutions are copied.
+    """
+    if coil_type == 'meg':
+        specify = lambda: _bem_specify_coils(bem, coils, coord_frame, n_jobs)
+    else:
+        specify = lambda: _bem_specify_els(bem, coils)
+    if not cache:
+        return specify()
+
+    key = _coil_solution_key(bem, coils, coord_frame, coil_type)
+    solution = _coil_solution_cache.get(key)
+    if solution is not None:
+        logger.info('    Using the cached coil solution')
+    else:
+        fname = _get_coil_solution_cache_fname(key)
+        solution = _read_coil_solution_cache(fname)
+        if solution is not None:
+            logger.info('    Reading the coil solution from %s' % fname)
+        else:
+            solution = specify()
+            _write_coil_solution_cache(fname, solution)
+        _coil_solution_cache.set(key, solution)
+    return solution.copy()
+
+
 #############################################################################
 # FORWARD COMPUTATION
 
@@ -234,58 +330,68 @@ def _bem_pot_or_field(rr, mri_rr, mri_Q, mults, coils, solution, srr,
     # multiply solution by "mults" here for simplicity
     # we can do this one in-place because it's not used elsewhere
     solution *= mults
+    sol = np.ascontiguousarray(solution.T)
 
-    # Both MEG and EEG have the inifinite-medium potentials
-    # This could be just vectorized, but eats too much memory, so instead we
-    # reduce memory by chunking within _do_inf_pots and parallelize, too:
-    parallel, p_fun, _ = parallel_func(_do_inf_pots, n_jobs)
-    nas = np.array_split
-    B = np.sum(parallel(p_fun(mri_rr, sr.copy(), mri_Q, sol.copy())
-                        for sr, sol in zip(nas(srr, n_jobs),
-                                           nas(solution.T, n_jobs))), axis=0)
-    # The copy()s above should make it so the whole objects don't need to be
-    # pickled...
+    # Only MEG gets the primary current distribution, for which the
+    # integration points of all coils are processed at once
+    if coil_type == 'meg':
+        counts = np.array([len(coil['rmag']) for coil in coils])
+        coil_pts = (np.concatenate([coil['rmag'] for coil in coils]),
+                    np.concatenate([coil['cosmag'] for coil in coils]),
+                    np.concatenate([coil['w'] for coil in coils]),
+                    np.r_[0, np.cumsum(counts[:-1])])
+        n_pts = len(coil_pts[0])
+    else:
+        coil_pts = None
+        n_pts = 0
 
-    # Only MEG gets the primary current distribution
+    # Both MEG and EEG have the inifinite-medium potentials
+    # This could be just vectorized, but eats too much memory, so instead
+    # the sources are split in chunks whose temporary arrays (a few
+    # 3 x n_bem and 3 x n_pts arrays per source) fit in the memory budget.
+    # The jobs share the (memmapped, if large) solution and only the
+    # sources are split, so that the cost of each chunk is the same.
+    nbytes = 8 * 3 * 4 * (len(srr) + n_pts)
+    chunks = chunk_jobs(len(rr), n_jobs, nbytes=nbytes)
+    parallel, p_fun, _ = parallel_func(_do_pot_or_field, n_jobs)
+    B = np.concatenate(parallel(p_fun(rr[c], mri_rr[c], mri_Q, srr, sol,
+                                      coil_pts) for c in chunks))
     if coil_type == 'meg':
-        # Primary current contribution (can be calc. in coil/dipole coords)
-        parallel, p_fun, _ = parallel_func(_do_prim_curr, n_jobs)
-        pcc = np.concatenate(parallel(p_fun(rr, c)
-                                      for c in nas(coils, n_jobs)), axis=1)
-        B += pcc
         B *= 1e-7  # MAG_FACTOR from C code
     return B
 
 
-def _do_prim_curr(rr, coils):
-    """Calculate primary currents in a set of coils"""
-    out = np.empty((len(rr) * 3, len(coils)))
-    for ci, c in enumerate(coils):
-        out[:, ci] = np.sum(c['w'] * _bem_inf_fields(rr, c['rmag'],
-                                                     c['cosmag']), 2).ravel()
-    return out
+def _do_pot_or_field(rr, mri_rr, mri_Q, srr, sol, coil_pts):
+    """Calculate the field or potential of a chunk of sources"""
+    # The infinite medium potentials at the BEM nodes, through the BEM
+    v0s = _bem_inf_pots(mri_rr, srr, mri_Q)  # n_rr x 3 x n_surf_rr
+    v0s.shape = (len(rr) * 3, v0s.shape[2])
+    B = np.dot(v0s, sol)
+    if coil_pts is not None:
+        # Primary current contribution (can be calc. in coil/dipole coords),
+        # summed over the integration points of each coil
+        rmags, cosmags, ws, offsets = coil_pts
+        x = _bem_inf_fields(rr, rmags, cosmags)  # n_rr x 3 x n_pts
+        x *= ws
+        B += np.add.reduceat(x, offsets, axis=2).reshape(len(rr) * 3, -1)
+    return B
 
 
-def _do_inf_pots(rr, srr, mri_Q, sol):
-    """Calculate infinite potentials using chunks"""
-    # The following code is equivalent to this, but saves memory
-    #v0s = _bem_inf_pots(rr, srr, mri_Q)  # n_rr x 3 x n_surf_rr
-    #v0s.shape = (len(rr) * 3, v0s.shape[2])
-    #B = np.dot(v0s, sol)
-
-    # We chunk the source rr's in order to save memory
-    bounds = np.r_[np.arange(0, len(rr), 1000), len(rr)]
-    B = np.empty((len(rr) * 3, sol.shape[1]))
-    for bi in range(len(bounds) - 1):
-        v0s = _bem_inf_pots(rr[bounds[bi]:bounds[bi + 1]], srr, mri_Q)
-        v0s.shape = (v0s.shape[0] * 3, v0s.shape[2])
-        B[3 * bounds[bi]:3 * bounds[bi + 1]] = np.dot(v0s, sol)
-    return B
+def _stack_coil_solutions(bem, coils, cf, coil_type, n_jobs, cache):
+    """Get the BEM solutions at several coil sets, stacked along the rows"""
+    return np.concatenate([_get_coil_solution(bem, c, cf, coil_type, n_jobs,
+                                              cache) for c in coils])
 
 
+@profiled
 def _compute_forwards(src, bem, coils_list, cfs, ccoils_list, ccfs,
-                      infos, coil_types, n_jobs):
-    """Compute the MEG and EEG forward solutions"""
+                      infos, coil_types, n_jobs, cache=True):
+    """Compute the MEG and EEG forward solutions
+
+    Each entry of coils_list (and ccoils_list) is a list of coil sets, e.g.,
+    the MEG coils at different head positions, and the forward solutions
+    are returned as lists with one matrix per coil set.
+    """
     if bem['bem_method'] != 'linear collocation':
         raise RuntimeError('only linear collocation supported')
 
@@ -305,45 +411,67 @@ def _compute_forwards(src, bem, coils_list, cfs, ccoils_list, ccfs,
                                                        infos):
         if coils is None:  # nothing to do
             Bs.append(None)
+            continue
+        if coil_type == 'meg':
+            # Compose a compensation data set if necessary
+            compensator = _make_ctf_comp_coils(info, coils[0])
         else:
+            compensator = None
+            cf = None
+
+        # The coil sets are stacked so that the infinite-medium potentials
+        # of the sources are computed only once for all of them, in groups
+        # of coil sets small enough for the stacked solutions to fit in
+        # memory (they are kept for the whole computation, so they get a
+        # larger share of the memory than the temporary arrays)
+        nbytes = 16 * (len(coils[0]) + (len(ccoils[0]) if compensator
+                                        is not None else 0)) * len(srr)
+        B = list()
+        for group in chunk_jobs(len(coils), 1, nbytes=nbytes,
+                                max_nbytes=4 * _max_nbytes):
+            group_coils = coils[group]
             if coil_type == 'meg':
-                # Compose a compensation data set if necessary
-                compensator = _make_ctf_comp_coils(info, coils)
-
                 # Field computation matrices...
                 logger.info('')
                 start = 'Composing the field computation matrix'
                 logger.info(start + '...')
-                solution = _bem_specify_coils(bem, coils, cf, n_jobs)
-                if compensator is not None:
-                    logger.info(start + ' (compensation coils)...')
-                    csolution = _bem_specify_coils(bem, ccoils, ccf, n_jobs)
-
-            elif coil_type == 'eeg':
-                solution = _bem_specify_els(bem, coils)
-                compensator = None
+            solution = _stack_coil_solutions(bem, group_coils, cf, coil_type,
+                                             n_jobs, cache)
+            if compensator is not None:
+                logger.info(start + ' (compensation coils)...')
+                group_ccoils = ccoils[group]
+                csolution = _stack_coil_solutions(bem, group_ccoils, ccf,
+                                                  coil_type, n_jobs, cache)
 
             # Do the actual calculation
             logger.info('Computing %s at %d source locations '
                         '(free orientations)...'
                         % (coil_type.upper(), len(rr)))
             # Note: this function modifies "solution" in-place
-            B = _bem_pot_or_field(rr, mri_rr, mri_Q, mults, coils,
-                                  solution, srr, n_jobs, coil_type)
+            splits = np.cumsum([len(c) for c in group_coils])[:-1]
+            group_B = np.split(_bem_pot_or_field(rr, mri_rr, mri_Q, mults,
+                                                 sum(group_coils, []),
+                                                 solution, srr, n_jobs,
+                                                 coil_type), splits, axis=1)
 
             # Compensate if needed (only done for MEG systems w/compensation)
             if compensator is not None:
                 # Compute the field in the compensation coils
-                work = _bem_pot_or_field(rr, mri_rr, mri_Q, mults,
-                                         ccoils, csolution, srr, n_jobs,
-                                         coil_type)
+                splits = np.cumsum([len(c) for c in group_ccoils])[:-1]
+                works = np.split(_bem_pot_or_field(rr, mri_rr, mri_Q, mults,
+                                                   sum(group_ccoils, []),
+                                                   csolution, srr, n_jobs,
+                                                   coil_type), splits, axis=1)
                 # Combine solutions so we can do the compensation
-                both = np.zeros((work.shape[0], B.shape[1] + work.shape[1]))
-                picks = pick_types(info, meg=True, ref_meg=False)
-                both[:, picks] = B
-                picks = pick_types(info, meg=False, ref_meg=True)
-                both[:, picks] = work
-                B = np.dot(both, compensator.T)
-            Bs.append(B)
+                meg_picks = pick_types(info, meg=True, ref_meg=False)
+                ref_picks = pick_types(info, meg=False, ref_meg=True)
+                for bi, (b, work) in enumerate(zip(group_B, works)):
+                    both = np.zeros((work.shape[0],
+                                     b.shape[1] + work.shape[1]))
+                    both[:, meg_picks] = b
+                    both[:, ref_picks] = work
+                    group_B[bi] = np.dot(both, compensator.T)
+            B.extend(group_B)
+        Bs.append(B)
 
     return Bs
@@ -3,6 +3,7 @@ from scipy import linalg
 from copy import deepcopy
 import os
 import glob
+import hashlib
 
 from ..fiff import FIFF
 from ..fiff.pick import pick_types, pick_info
@@ -14,7 +15,7 @@ from ._make_forward import _create_coils
 from ._lead_dots import (_do_self_dots, _do_surface_dots, _get_legen_table,
                          _get_legen_lut_fast, _get_legen_lut_accurate)
 from ..parallel import check_n_jobs
-from ..utils import logger, verbose
+from ..utils import logger, verbose, _LRUCache
 from ..fixes import partial
 
 
@@ -88,9 +89,28 @@ def _compute_mapping_matrix(fmd, info):
     return mapping_mat
 
 
+_mapping_cache = _LRUCache(max_size=8)  # in-memory cache of the matrices
+
+
+def _mapping_key(coils, ch_names, surf, proj_op, avg_ref, ch_type, mode):
+    """Hash identifying a mapping matrix
+
+    The coils and the surface are in head coordinates, so the device->head
+    and head<->MRI transforms are accounted for.
+    """
+    md5 = hashlib.md5()
+    md5.update(('%s|%s|%s|%s' % (ch_type, mode, avg_ref,
+                                 ','.join(ch_names))).encode('utf-8'))
+    for arr in ([surf['rr'], surf['nn'], proj_op] +
+                [c[key] for c in coils for key in ('rmag', 'cosmag', 'w')]):
+        md5.update(b'|')
+        md5.update(np.ascontiguousarray(arr, dtype=np.float64))
+    return md5.hexdigest()
+
+
 @verbose
 def _make_surface_mapping(info, surf, ch_type='meg', trans=None, mode='fast',
-                          n_jobs=1, verbose=None):
+                          n_jobs=1, cache=True, verbose=None):
     """Re-map M/EEG data to a surface
 
     Parameters
@@ -111,6 +131,9 @@ def _make_surface_mapping(info, surf, ch_type='meg', trans=None, mode='fast',
         for most applications.
     n_jobs : int
         Number of permutations to run in parallel (requires joblib package).
+    cache : bool
+        If True, reuse the mapping matrix computed for the same channels,
+        sensor locations, projections, surface and mode if available.
     verbose : bool, str, int, or None
         If not None, override default verbose level (see mne.verbose).
 
@@ -166,12 +189,27 @@ def _make_surface_mapping(info, surf, ch_type='meg', trans=None, mode='fast',
         type_str = 'electrodes'
         miss = 1e-3  # Smoothing criterion for EEG
 
+    ch_names = [c['ch_name'] for c in chs]
+    noise = _ad_hoc_noise(coils, ch_type)
+    my_origin = np.array([0.0, 0.0, 0.04])
+    fmd = dict(kind=ch_type, surf=surf, ch_names=ch_names, coils=coils,
+               origin=my_origin, noise=noise)
+    if cache:
+        projs = info.get('projs', list())
+        key = _mapping_key(coils, ch_names, surf,
+                           make_projector(projs, ch_names)[0],
+                           _has_eeg_average_ref_proj(projs), ch_type, mode)
+        item = _mapping_cache.get(key)
+        if item is not None:
+            logger.info('Using the cached mapping matrix')
+            fmd['data'] = item[0].copy()
+            fmd['nest'] = item[1]
+            return fmd
+
     #
     # Step 2. Calculate the dot products
     #
-    my_origin = np.array([0.0, 0.0, 0.04])
     int_rad = 0.06
-    noise = _ad_hoc_noise(coils, ch_type)
     if mode == 'fast':
         # Use 50 coefficients with nearest-neighbor interpolation
         lut, n_fact = _get_legen_table(ch_type, False, 50)
@@ -193,10 +231,8 @@ def _make_surface_mapping(info, surf, ch_type='meg', trans=None, mode='fast',
     #
     # Step 4. Return the result
     #
-    ch_names = [c['ch_name'] for c in chs]
-    fmd = dict(kind=ch_type, surf=surf, ch_names=ch_names, coils=coils,
-               origin=my_origin, noise=noise, self_dots=self_dots,
-               surface_dots=surface_dots, int_rad=int_rad, miss=miss)
+    fmd.update(self_dots=self_dots, surface_dots=surface_dots,
+               int_rad=int_rad, miss=miss)
     logger.info('Field mapping data ready')
 
     fmd['data'] = _compute_mapping_matrix(fmd, info)
@@ -206,6 +242,9 @@ def _make_surface_mapping(info, surf, ch_type='meg', trans=None, mode='fast',
     del fmd['surface_dots']
     del fmd['int_rad']
     del fmd['miss']
+
+    if cache:
+        _mapping_cache.set(key, (fmd['data'].copy(), fmd['nest']))
     return fmd
 
 
@@ -228,7 +267,7 @@ def _find_trans(subject, subjects_dir=None):
 
 
 def make_field_map(evoked, trans_fname='auto', subject=None, subjects_dir=None,
-                   ch_type=None, mode='fast', n_jobs=1):
+                   ch_type=None, mode='fast', n_jobs=1, cache=True):
     """Compute surface maps used for field display in 3D
 
     Parameters
@@ -255,6 +294,10 @@ def make_field_map(evoked, trans_fname='auto', subject=None, subjects_dir=None,
         for most applications.
     n_jobs : int
         The number of jobs to run in parallel.
+    cache : bool
+        If True, the mapping matrices are kept in memory and reused for
+        other data with the same channels, sensor locations, projections,
+        trans and surfaces (e.g., the other conditions of a session).
 
     Returns
     -------
@@ -298,8 +341,9 @@ def make_field_map(evoked, trans_fname='auto', subject=None, subjects_dir=None,
     surf_maps = list()
 
     for this_type, this_surf in zip(types, surfs):
-        this_map = _make_surface_mapping(evoked.info, this_surf, this_type, trans,
-                                         n_jobs=n_jobs)
+        this_map = _make_surface_mapping(evoked.info, this_surf, this_type,
+                                         trans, mode=mode, n_jobs=n_jobs,
+                                         cache=cache)
         this_map['surf'] = this_surf  # XXX : a bit weird...
         surf_maps.append(this_map)
 
@@ -4,7 +4,7 @@ from os import path as op
 import numpy as np
 from numpy.polynomial import legendre
 
-from ..parallel import parallel_func
+from ..parallel import parallel_func, chunk_jobs
 from ..utils import logger, _get_extra_data_path
 
 
@@ -161,8 +161,11 @@ def _comp_sums_meg(beta, ctheta, lut_fun, n_fact, volume_integral):
 # SPHERE DOTS
 
 def _fast_sphere_dot_r0(r, rr1, rr2, lr1, lr2, cosmags1, cosmags2,
-                        w1, w2, volume_integral, lut, n_fact, ch_type):
-    """Lead field dot product computation for M/EEG in the sphere model"""
+                        volume_integral, lut, n_fact, ch_type):
+    """Lead field dot products between two sets of points in the sphere model
+
+    All pairs of points are computed at once, the result is (n_rr1, n_rr2).
+    """
     ct = np.einsum('ik,jk->ij', rr1, rr2)  # outer product, sum over coords
 
     # expand axes
@@ -209,100 +212,107 @@ def _fast_sphere_dot_r0(r, rr1, rr2, lr1, lr2, cosmags1, cosmags2,
         # Give it a finishing touch!
         eeg_const = 1.0 / (4.0 * np.pi)
         result = eeg_const * sums / lr1lr2
-    # new we add them all up with weights
-    if w1 is None:  # operating on surface, treat independently
-        #result = np.sum(w2[np.newaxis, :] * result, axis=1)
-        result = np.dot(result, w2)
-    else:
-        #result = np.sum((w1[:, np.newaxis] * w2[np.newaxis, :]) * result)
-        result = np.einsum('i,j,ij', w1, w2, result)
     return result
 
 
+def _concatenate_coils(coils, r0):
+    """Concatenate the integration points of coils, relative to r0"""
+    # convert to normalized distances from expansion center
+    rmags = np.concatenate([coil['rmag'] for coil in coils]) - r0
+    rlens = np.sqrt(np.sum(rmags * rmags, axis=1))
+    rmags /= rlens[:, np.newaxis]
+    cosmags = np.concatenate([coil['cosmag'] for coil in coils])
+    ws = np.concatenate([coil['w'] for coil in coils])
+    # the first integration point of each coil (and the total)
+    offsets = np.r_[0, np.cumsum([len(coil['rmag']) for coil in coils])]
+    return rmags, rlens, cosmags, ws, offsets
+
+
+def _dots_nbytes(ch_type, n_fact):
+    """Approximate size of the temporary arrays for one pair of points"""
+    return (150 if ch_type == 'meg' else 50) * n_fact.shape[0]
+
+
 def _do_self_dots(intrad, volume, coils, r0, ch_type, lut, n_fact, n_jobs):
     """Perform the lead field dot product integrations"""
     if ch_type == 'eeg':
         intrad *= 0.7
-    # convert to normalized distances from expansion center
-    rmags = [coil['rmag'] - r0[np.newaxis, :] for coil in coils]
-    rlens = [np.sqrt(np.sum(r * r, axis=1)) for r in rmags]
-    rmags = [r / rl[:, np.newaxis] for r, rl in zip(rmags, rlens)]
-    cosmags = [coil['cosmag'] for coil in coils]
-    ws = [coil['w'] for coil in coils]
+    rmags, rlens, cosmags, ws, offsets = _concatenate_coils(coils, r0)
+
+    # The products are symmetric, so each block of coils (rows) is only
+    # combined with the coils up to the end of the block. The blocks are
+    # chosen so that the temporary arrays of the pairs of integration points
+    # fit in the memory budget, and have approximately the same cost.
+    n_pairs = np.diff(offsets) * offsets[1:]
+    nbytes = n_pairs * _dots_nbytes(ch_type, n_fact)
+    chunks = chunk_jobs(len(coils), n_jobs, cost=1e-10 * nbytes,
+                        nbytes=nbytes)
     parallel, p_fun, _ = parallel_func(_do_self_dots_subset, n_jobs)
-    prods = parallel(p_fun(intrad, rmags, rlens, cosmags,
-                           ws, volume, lut, n_fact, ch_type, idx)
-                     for idx in np.array_split(np.arange(len(rmags)), n_jobs))
-    products = np.sum(prods, axis=0)
+    prods = parallel(p_fun(intrad, rmags, rlens, cosmags, ws, offsets,
+                           volume, lut, n_fact, ch_type, idx)
+                     for idx in chunks)
+    products = np.zeros((len(coils), len(coils)))
+    for idx, prod in zip(chunks, prods):
+        products[idx, :idx.stop] = prod
+    # fill in the upper triangle
+    products = np.tril(products) + np.tril(products, -1).T
     return products
 
 
-def _do_self_dots_subset(intrad, rmags, rlens, cosmags, ws, volume, lut,
-                         n_fact, ch_type, idx):
+def _do_self_dots_subset(intrad, rmags, rlens, cosmags, ws, offsets, volume,
+                         lut, n_fact, ch_type, idx):
     """Helper for parallelization"""
-    products = np.zeros((len(rmags), len(rmags)))
-    for ci1 in idx:
-        for ci2 in range(0, ci1 + 1):
-            res = _fast_sphere_dot_r0(intrad, rmags[ci1], rmags[ci2],
-                                      rlens[ci1], rlens[ci2],
-                                      cosmags[ci1], cosmags[ci2],
-                                      ws[ci1], ws[ci2], volume, lut,
-                                      n_fact, ch_type)
-            products[ci1, ci2] = res
-            products[ci2, ci1] = res
+    rows = slice(offsets[idx.start], offsets[idx.stop])
+    cols = slice(0, offsets[idx.stop])
+    products = _fast_sphere_dot_r0(intrad, rmags[rows], rmags[cols],
+                                   rlens[rows], rlens[cols], cosmags[rows],
+                                   cosmags[cols], volume, lut, n_fact,
+                                   ch_type)
+    products *= ws[rows, np.newaxis]
+    products *= ws[np.newaxis, cols]
+    # sum over the integration points of each coil
+    products = np.add.reduceat(products, offsets[idx] - offsets[idx.start],
+                               axis=0)
+    products = np.add.reduceat(products, offsets[:idx.stop], axis=1)
     return products
 
 
 def _do_surface_dots(intrad, volume, coils, surf, sel, r0, ch_type,
                      lut, n_fact, n_jobs):
     """Compute the map construction products"""
-    virt_ref = False
-    # convert to normalized distances from expansion center
-    rmags = [coil['rmag'] - r0[np.newaxis, :] for coil in coils]
-    rlens = [np.sqrt(np.sum(r * r, axis=1)) for r in rmags]
-    rmags = [r / rl[:, np.newaxis] for r, rl in zip(rmags, rlens)]
-    cosmags = [coil['cosmag'] for coil in coils]
-    ws = [coil['w'] for coil in coils]
-    rref = None
-    refl = None
+    # virtual reference electrodes (virt_ref in the C code) are not
+    # supported
     if ch_type == 'eeg':
         intrad *= 0.7
-        if virt_ref:
-            rref = virt_ref[np.newaxis, :] - r0[np.newaxis, :]
-            refl = np.sqrt(np.sum(rref * rref, axis=1))
-            rref /= refl[:, np.newaxis]
+    rmags, rlens, cosmags, ws, offsets = _concatenate_coils(coils, r0)
 
     rsurf = surf['rr'][sel] - r0[np.newaxis, :]
     lsurf = np.sqrt(np.sum(rsurf * rsurf, axis=1))
     rsurf /= lsurf[:, np.newaxis]
     this_nn = surf['nn'][sel]
 
+    # The surface points are processed in blocks, whose temporary arrays fit
+    # in the memory budget
+    nbytes = len(rmags) * _dots_nbytes(ch_type, n_fact)
+    chunks = chunk_jobs(len(rsurf), n_jobs, cost=1e-10 * nbytes,
+                        nbytes=nbytes)
     parallel, p_fun, _ = parallel_func(_do_surface_dots_subset, n_jobs)
-    prods = parallel(p_fun(intrad, rsurf, rmags, rref, refl, lsurf, rlens,
-                           this_nn, cosmags, ws, volume, lut, n_fact, ch_type,
-                           idx)
-                     for idx in np.array_split(np.arange(len(rmags)), n_jobs))
-    products = np.sum(prods, axis=0)
+    prods = parallel(p_fun(intrad, rsurf[idx], lsurf[idx], this_nn[idx],
+                           rmags, rlens, cosmags, ws, offsets, volume, lut,
+                           n_fact, ch_type)
+                     for idx in chunks)
+    products = np.concatenate(prods)
     return products
 
 
-def _do_surface_dots_subset(intrad, rsurf, rmags, rref, refl, lsurf, rlens,
-                            this_nn, cosmags, ws, volume, lut, n_fact, ch_type,
-                            idx):
+def _do_surface_dots_subset(intrad, rsurf, lsurf, this_nn, rmags, rlens,
+                            cosmags, ws, offsets, volume, lut, n_fact,
+                            ch_type):
     """Helper for parallelization"""
-    products = np.zeros((len(rsurf), len(rmags)))
-    for ci in idx:
-        res = _fast_sphere_dot_r0(intrad, rsurf, rmags[ci],
-                                  lsurf, rlens[ci],
-                                  this_nn, cosmags[ci],
-                                  None, ws[ci], volume, lut,
-                                  n_fact, ch_type)
-        if rref is not None:
-            vres = _fast_sphere_dot_r0(intrad, rref, rmags[ci],
-                                       refl, rlens[ci],
-                                       None, ws[ci], volume,
-                                       lut, n_fact, ch_type)
-            products[:, ci] = res - vres
-        else:
-            products[:, ci] = res
+    products = _fast_sphere_dot_r0(intrad, rsurf, rmags, lsurf, rlens,
+                                   this_nn, cosmags, volume, lut, n_fact,
+                                   ch_type)
+    products *= ws
+    # sum over the integration points of each coil
+    products = np.add.reduceat(products, offsets[:-1], axis=1)
     return products
@@ -8,15 +8,16 @@
 from ..externals.six import string_types
 import os
 from os import path as op
+from copy import copy
 import numpy as np
 
 from ..fiff import read_info, pick_types, pick_info, FIFF, _has_kit_refs
-from .forward import write_forward_solution, _merge_meg_eeg_fwds
+from .forward import write_forward_solution, _copy_writeable
 from ._compute_forward import _compute_forwards
 from ..transforms import (invert_transform, transform_surface_to,
                           read_trans, _get_mri_head_t_from_trans_file,
                           apply_trans, _print_coord_trans, _coord_frame_name)
-from ..utils import logger, verbose
+from ..utils import logger, verbose, profiled
 from ..source_space import (read_source_spaces, _filter_source_spaces,
                             SourceSpaces)
 from ..surface import read_bem_solution, _normalize_vectors
@@ -162,9 +163,10 @@ def _create_coils(chs, acc=None, t=None, coil_type='meg', coilset=None):
 
 
 @verbose
+@profiled
 def make_forward_solution(info, mri, src, bem, fname=None, meg=True, eeg=True,
                           mindist=0.0, ignore_ref=False, overwrite=False,
-                          n_jobs=1, verbose=None):
+                          n_jobs=1, cache=True, verbose=None):
     """Calculate a forward solution for a subject
 
     Parameters
@@ -204,6 +206,12 @@ def make_forward_solution(info, mri, src, bem, fname=None, meg=True, eeg=True,
         If False (default), an error will be raised if the file exists.
     n_jobs : int
         Number of jobs to run in parallel.
+    cache : bool
+        If True (default), the BEM solutions at the MEG coils and EEG
+        electrodes are kept in memory (and on disk in the MNE_CACHE_DIR
+        directory, if set) to be reused by calls with the same BEM model,
+        transformations and sensors, e.g., when only the source space
+        changes.
     verbose : bool, str, int, or None
         If not None, override default verbose level (see mne.verbose).
 
@@ -224,7 +232,120 @@ def make_forward_solution(info, mri, src, bem, fname=None, meg=True, eeg=True,
     # 2. --grad option (gradients of the field, not used much)
     # 3. --fixed option (can be computed post-hoc)
     # 4. --mricoord option (probably not necessary)
+    if fname is not None and op.isfile(fname) and not overwrite:
+        raise IOError('file "%s" exists, consider using overwrite=True'
+                      % fname)
+    arg_list = [mri, bem, fname, meg, eeg, mindist, overwrite, n_jobs,
+                verbose]
+    fwd = _make_forward_solutions(info, mri, src, bem, None, meg, eeg,
+                                  mindist, ignore_ref, n_jobs, cache,
+                                  'make_forward_solution', arg_list,
+                                  fname)[0]
+    if fname is not None:
+        logger.info('writing %s...', fname)
+        write_forward_solution(fname, fwd, overwrite, verbose=False)
+
+    logger.info('Finished.')
+    return fwd
+
+
+@verbose
+@profiled
+def make_forward_solutions_positions(info, mri, src, bem, dev_head_ts,
+                                     meg=True, eeg=True, mindist=0.0,
+                                     ignore_ref=False, n_jobs=1, cache=True,
+                                     verbose=None):
+    """Calculate forward solutions for several head positions
+
+    This is equivalent to calling make_forward_solution once for each
+    device to head transformation, but the source spaces, the BEM model,
+    and the EEG solution are only set up once, and the infinite-medium
+    potentials of the sources are shared between the head positions. Only
+    the parts of the computation that depend on the MEG coil locations are
+    repeated for each position.
+
+    Parameters
+    ----------
+    info : instance of mne.fiff.meas_info.Info | str
+        If str, then it should be a filename to a Raw, Epochs, or Evoked
+        file with measurement information. If dict, should be an info
+        dict (such as one from Raw, Epochs, or Evoked).
+    mri : dict | str
+        Either a transformation filename (usually made using mne_analyze)
+        or an info dict (usually opened using read_trans()).
+    src : str | instance of SourceSpaces
+        If string, should be a source space filename. Can also be an
+        instance of loaded or generated SourceSpaces.
+    bem : str
+        Filename of the BEM (e.g., "sample-5120-5120-5120-bem-sol.fif") to
+        use.
+    dev_head_ts : list of dict | list of array
+        The device to head transformations (dicts such as info['dev_head_t']
+        or 4x4 arrays), one for each head position.
+    meg : bool
+        If True (Default), include MEG computations.
+    eeg : bool
+        If True (Default), include EEG computations.
+    mindist : float
+        Minimum distance of sources from inner skull surface (in mm).
+    ignore_ref : bool
+        If True, do not include reference channels in compensation.
+    n_jobs : int
+        Number of jobs to run in parallel.
+    cache : bool
+        If True (default), the BEM solutions at the sensors are cached
+        (see make_forward_solution).
+    verbose : bool, str, int, or None
+        If not None, override default verbose level (see mne.verbose).
 
+    Returns
+    -------
+    fwds : list of dict
+        The forward solutions, one for each head position, with
+        info['dev_head_t'] set to the corresponding transformation. They can
+        be combined with average_forward_solutions. To save memory, the
+        forward solutions share their source spaces ('src'), source
+        locations and MRI->head transform, which must not be modified in
+        place. Without MEG, they also share the EEG gain matrix, which is
+        read-only.
+    """
+    if not isinstance(dev_head_ts, (list, tuple)) or len(dev_head_ts) == 0:
+        raise ValueError('dev_head_ts must be a non-empty list of '
+                         'transformations')
+    dev_head_ts = [_check_dev_head_t(t) for t in dev_head_ts]
+    arg_list = [mri, bem, '%d positions' % len(dev_head_ts), meg, eeg,
+                mindist, n_jobs, verbose]
+    fwds = _make_forward_solutions(info, mri, src, bem, dev_head_ts, meg,
+                                   eeg, mindist, ignore_ref, n_jobs, cache,
+                                   'make_forward_solutions_positions',
+                                   arg_list)
+    logger.info('Finished.')
+    return fwds
+
+
+def _check_dev_head_t(t):
+    """Make sure a head position is a device to head transformation dict"""
+    if not isinstance(t, dict):
+        trans = np.asarray(t, dtype=np.float64)
+        if trans.shape != (4, 4):
+            raise ValueError('Each head position must be a transformation '
+                             'dict or a 4x4 array')
+        t = dict(trans=trans, to=FIFF.FIFFV_COORD_HEAD)
+        t['from'] = FIFF.FIFFV_COORD_DEVICE
+    elif not (t['from'] == FIFF.FIFFV_COORD_DEVICE and
+              t['to'] == FIFF.FIFFV_COORD_HEAD):
+        raise ValueError('Each head position must be a device to head '
+                         'transformation')
+    return t
+
+
+def _make_forward_solutions(info, mri, src, bem, dev_head_ts, meg, eeg,
+                            mindist, ignore_ref, n_jobs, cache, func_name,
+                            arg_list, fname=None):
+    """Compute the forward solutions for a list of head positions
+
+    If dev_head_ts is None, the head position stored in info is used.
+    """
     if isinstance(mri, string_types):
         if not op.isfile(mri):
             raise IOError('mri file "%s" not found' % mri)
@@ -246,9 +367,6 @@ def make_forward_solution(info, mri, src, bem, fname=None, meg=True, eeg=True,
             raise IOError('Source space file "%s" not found' % src)
     if not op.isfile(bem):
         raise IOError('BEM file "%s" not found' % bem)
-    if fname is not None and op.isfile(fname) and not overwrite:
-        raise IOError('file "%s" exists, consider using overwrite=True'
-                      % fname)
     if not isinstance(info, (dict, string_types)):
         raise TypeError('info should be a dict or string')
     if isinstance(info, string_types):
@@ -258,9 +376,8 @@ def make_forward_solution(info, mri, src, bem, fname=None, meg=True, eeg=True,
     else:
         info_extra = 'info dict'
         info_extra_long = info_extra
-    arg_list = [info_extra, mri, src_extra, bem, fname,  meg, eeg,
-                mindist, overwrite, n_jobs, verbose]
-    cmd = 'make_forward_solution(%s)' % (', '.join([str(a) for a in arg_list]))
+    arg_list = [info_extra, mri, src_extra] + arg_list[1:]
+    cmd = '%s(%s)' % (func_name, ', '.join([str(a) for a in arg_list]))
 
     # this could, in principle, be an option
     coord_frame = FIFF.FIFFV_COORD_HEAD
@@ -275,7 +392,10 @@ def make_forward_solution(info, mri, src, bem, fname=None, meg=True, eeg=True,
     logger.info('Do computations in %s coordinates',
                 _coord_frame_name(coord_frame))
     logger.info('Free source orientations')
-    logger.info('Destination for the solution : %s' % fname)
+    if dev_head_ts is None:
+        logger.info('Destination for the solution : %s' % fname)
+    else:
+        logger.info('Head positions               : %d' % len(dev_head_ts))
 
     # Read the source locations
     logger.info('')
@@ -311,7 +431,8 @@ def make_forward_solution(info, mri, src, bem, fname=None, meg=True, eeg=True,
                 mri_file=mri_extra, mri_id=mri_id, meas_file=info_extra_long,
                 meas_id=None, working_dir=os.getcwd(),
                 command_line=cmd, bads=info['bads'])
-    meg_head_t = info['dev_head_t']
+    if dev_head_ts is None:
+        dev_head_ts = [info['dev_head_t']]
     logger.info('')
 
     # MEG channels
@@ -340,7 +461,8 @@ def make_forward_solution(info, mri, src, bem, fname=None, meg=True, eeg=True,
                            'reference channels. Consider using '
                            '"ignore_ref=True" in calculation')
                     raise NotImplementedError(err)
-            _print_coord_trans(meg_head_t)
+            for meg_head_t in dev_head_ts:
+                _print_coord_trans(meg_head_t)
             # make info structure to allow making compensator later
         else:
             ncomp = 0
@@ -377,23 +499,28 @@ def make_forward_solution(info, mri, src, bem, fname=None, meg=True, eeg=True,
         logger.info('%d compensation data sets in %s'
                     % (ncomp_data, info_extra))
 
-    meg_xform = meg_head_t
     extra_str = 'Head'
 
+    # the MEG coils are created for each head position
     megcoils, megcf, compcoils, compcf = None, None, None, None
     if nmeg > 0:
-        megcoils, megcf = _create_coils(megchs,
-                                        FIFF.FWD_COIL_ACCURACY_ACCURATE,
-                                        meg_xform, coil_type='meg',
-                                        coilset=templates)
-        if ncomp > 0:
-            compcoils, compcf = _create_coils(compchs,
+        megcoils = list()
+        compcoils = list() if ncomp > 0 else None
+        for meg_xform in dev_head_ts:
+            coils, megcf = _create_coils(megchs,
+                                         FIFF.FWD_COIL_ACCURACY_ACCURATE,
+                                         meg_xform, coil_type='meg',
+                                         coilset=templates)
+            megcoils.append(coils)
+            if ncomp > 0:
+                coils, compcf = _create_coils(compchs,
                                               FIFF.FWD_COIL_ACCURACY_NORMAL,
                                               meg_xform, coil_type='meg',
                                               coilset=templates)
+                compcoils.append(coils)
     eegels = None
     if neeg > 0:
-        eegels, _ = _create_coils(eegchs, coil_type='eeg')
+        eegels = [_create_coils(eegchs, coil_type='eeg')[0]]
     logger.info('%s coordinate coil definitions created.' % extra_str)
 
     # Transform the source spaces into the appropriate coordinates
@@ -440,24 +567,13 @@ def make_forward_solution(info, mri, src, bem, fname=None, meg=True, eeg=True,
     ccoils = [compcoils, None]
     ccfs = [compcf, None]
     infos = [meg_info, None]
-    megfwd, eegfwd = _compute_forwards(src, bem, coils, cfs, ccoils, ccfs,
-                                       infos, coil_types, n_jobs)
-
-    # merge forwards into one
-    megfwd = _to_forward_dict(megfwd, None, megnames, coord_frame,
-                              FIFF.FIFFV_MNE_FREE_ORI)
-    eegfwd = _to_forward_dict(eegfwd, None, eegnames, coord_frame,
-                              FIFF.FIFFV_MNE_FREE_ORI)
-    fwd = _merge_meg_eeg_fwds(megfwd, eegfwd, verbose=False)
-    logger.info('')
+    megfwds, eegfwds = _compute_forwards(src, bem, coils, cfs, ccoils, ccfs,
+                                         infos, coil_types, n_jobs, cache)
 
     # pick out final dict info
     picks = pick_types(info, meg=meg, eeg=eeg, ref_meg=False, exclude=[])
     info = pick_info(info, picks)
     source_rr = np.concatenate([s['rr'][s['vertno']] for s in src])
-    # deal with free orientations:
-    nsource = fwd['sol']['data'].shape[1] / 3
-    source_nn = np.tile(np.eye(3), (nsource, 1))
 
     # Don't transform the source spaces back into MRI coordinates (which is
     # done in the C code) because mne-python assumes forward solution source
@@ -466,32 +582,57 @@ def make_forward_solution(info, mri, src, bem, fname=None, meg=True, eeg=True,
     for key in ['working_dir', 'command_line']:
         if key in src.info:
             del src.info[key]
-    fwd.update(dict(nchan=fwd['sol']['data'].shape[0], nsource=nsource,
-                    info=info, src=src, source_nn=source_nn,
-                    source_rr=source_rr, surf_ori=False,
-                    mri_head_t=mri_head_t))
-    fwd['info']['mri_head_t'] = mri_head_t
-    if fname is not None:
-        logger.info('writing %s...', fname)
-        write_forward_solution(fname, fwd, overwrite, verbose=False)
 
-    logger.info('Finished.')
-    return fwd
+    # The forward solutions share the source spaces, the source locations
+    # and the MRI->head transform, only info['dev_head_t'] is specific to
+    # each of them. The EEG solution does not depend on the head position,
+    # so its gain matrix is shared too (and made read-only) when there is
+    # no MEG.
+    if eegfwds is not None and megfwds is None and len(dev_head_ts) > 1:
+        eegfwds[0].flags.writeable = False
+    names = (megnames if megfwds is not None else []) + \
+        (eegnames if eegfwds is not None else [])
+    nsource = sum(s['nuse'] for s in src)
+    source_nn = np.tile(np.eye(3), (nsource, 1))
+    fwds = list()
+    for pi, dev_head_t in enumerate(dev_head_ts):
+        gains = list()
+        if megfwds is not None:
+            gains.append(megfwds[pi])
+        if eegfwds is not None:
+            gains.append(eegfwds[0])
+        gain = gains[0] if len(gains) == 1 else np.concatenate(gains, axis=1)
+        fwd = _to_forward_dict(gain, None, names, coord_frame,
+                               FIFF.FIFFV_MNE_FREE_ORI)
+        fwd_info = copy(info)
+        fwd_info['dev_head_t'] = dev_head_t
+        fwd_info['mri_head_t'] = mri_head_t
+        fwd.update(dict(nchan=fwd['sol']['data'].shape[0], nsource=nsource,
+                        info=fwd_info, src=src, source_nn=source_nn,
+                        source_rr=source_rr, surf_ori=False,
+                        mri_head_t=mri_head_t))
+        fwds.append(fwd)
+    logger.info('')
+    return fwds
 
 
 def _to_forward_dict(fwd, fwd_grad, names, coord_frame, source_ori):
-    """Convert forward solution matrices to dicts"""
+    """Convert forward solution matrices to dicts
+
+    Read-only matrices are not copied (see read_forward_solution).
+    """
     if fwd is not None:
         sol = dict(data=fwd.T, nrow=fwd.shape[1], ncol=fwd.shape[0],
                    row_names=names, col_names=[])
         fwd = dict(sol=sol, source_ori=source_ori, nsource=sol['ncol'],
                    coord_frame=coord_frame, sol_grad=None,
                    nchan=sol['nrow'], _orig_source_ori=source_ori,
-                   _orig_sol=sol['data'].copy(), _orig_sol_grad=None)
+                   _orig_sol=_copy_writeable(sol['data']),
+                   _orig_sol_grad=None)
         if fwd_grad is not None:
             sol_grad = dict(data=fwd_grad.T, nrow=fwd_grad.shape[1],
                             ncol=fwd_grad.shape[0], row_names=names,
                             col_names=[])
             fwd.update(dict(sol_grad=sol_grad),
-                       _orig_sol_grad=sol_grad['data'].copy())
+                       _orig_sol_grad=_copy_writeable(sol_grad['data']))
     return fwd
@@ -24,7 +24,7 @@ from ..fiff.tree import dir_tree_find
 from ..fiff.channels import read_bad_channels
 from ..fiff.tag import find_tag, read_tag
 from ..fiff.matrix import (_read_named_matrix, _transpose_named_matrix,
-                           write_named_matrix)
+                           _find_named_matrix, write_named_matrix)
 from ..fiff.pick import (pick_channels_forward, pick_info, pick_channels,
                          pick_types)
 from ..fiff.write import (write_int, start_block, end_block,
@@ -39,7 +39,7 @@ from ..source_space import (read_source_spaces_from_tree,
 from ..transforms import (transform_surface_to, invert_transform,
                           write_trans)
 from ..utils import (_check_fname, get_subjects_dir, has_command_line_tools,
-                     run_subprocess, logger, verbose)
+                     run_subprocess, logger, verbose, profiled)
 
 
 def prepare_bem_model(bem, sol_fname=None, method='linear'):
@@ -159,8 +159,20 @@ def _inv_block_diag(A, n):
     return bd
 
 
-def _read_one(fid, node):
+def _has_col_names(fid, node):
+    """Check if the channel names are stored with a forward solution"""
+    mat_node = _find_named_matrix(node, FIFF.FIFF_MNE_FORWARD_SOLUTION)
+    if mat_node is None:
+        return False
+    return find_tag(fid, mat_node, FIFF.FIFF_MNE_COL_NAMES) is not None
+
+
+def _read_one(fid, node, include=[], exclude=[], src_sel=None, mmap=False,
+              dtype=None):
     """Read all interesting stuff for one forward solution
+
+    Only the channels selected by include and exclude and the sources in
+    src_sel (all if None) are read. Returns None if no channel is selected.
     """
     if node is None:
         return None
@@ -191,23 +203,58 @@ def _read_one(fid, node):
         raise ValueError('Number of channels not found')
     one['nchan'] = int(tag.data)
 
-    try:
-        one['sol'] = _read_named_matrix(fid, node,
-                                        FIFF.FIFF_MNE_FORWARD_SOLUTION)
-        one['sol'] = _transpose_named_matrix(one['sol'], copy=False)
-        one['_orig_sol'] = one['sol']['data'].copy()
-    except:
-        fid.close()
-        logger.error('Forward solution data not found')
-        raise
-
-    try:
-        one['sol_grad'] = _read_named_matrix(fid, node,
-                                        FIFF.FIFF_MNE_FORWARD_SOLUTION_GRAD)
-        one['sol_grad'] = _transpose_named_matrix(one['sol_grad'], copy=False)
-        one['_orig_sol_grad'] = one['sol_grad']['data'].copy()
-    except:
-        one['sol_grad'] = None
+    # The channels are the columns of the matrices in the file, the sources
+    # (with 1 or 3 components each) are the rows
+    ch_sel = None
+    if len(include) > 0 or len(exclude) > 0:
+        mat_node = _find_named_matrix(node, FIFF.FIFF_MNE_FORWARD_SOLUTION)
+        tag = None
+        if mat_node is not None:
+            tag = find_tag(fid, mat_node, FIFF.FIFF_MNE_COL_NAMES)
+        if tag is not None:
+            ch_names = tag.data.split(':')
+            ch_sel = pick_channels(ch_names, include=include,
+                                   exclude=exclude)
+            if len(ch_sel) == 0:
+                return None
+            one['nchan'] = len(ch_sel)
+            if len(ch_sel) == len(ch_names):
+                ch_sel = None  # all channels are kept
+    n_ori = 1 if one['source_ori'] == FIFF.FIFFV_MNE_FIXED_ORI else 3
+
+    for key, kind, n_comp in (('sol', FIFF.FIFF_MNE_FORWARD_SOLUTION, 1),
+                              ('sol_grad',
+                               FIFF.FIFF_MNE_FORWARD_SOLUTION_GRAD, 3)):
+        rows = None
+        if src_sel is not None:
+            n_row = n_ori * n_comp
+            rows = (n_row * src_sel[:, np.newaxis] +
+                    np.arange(n_row)).ravel()
+        try:
+            mat = _read_named_matrix(fid, node, kind, rows=rows, mmap=mmap)
+            mat = _transpose_named_matrix(mat, copy=False)
+        except:
+            if key == 'sol_grad':
+                one['sol_grad'] = None
+                continue
+            fid.close()
+            logger.error('Forward solution data not found')
+            raise
+        if ch_sel is not None:
+            mat['data'] = mat['data'][ch_sel]
+            mat['row_names'] = [mat['row_names'][k] for k in ch_sel]
+            mat['nrow'] = len(ch_sel)
+        if dtype is not None and mat['data'].dtype != dtype:
+            mat['data'] = mat['data'].astype(dtype)
+        one[key] = mat
+        # read-only (memory-mapped) data cannot be modified, so they do
+        # not need to be copied
+        if mat['data'].flags.writeable:
+            one['_orig_' + key] = mat['data'].copy()
+        else:
+            one['_orig_' + key] = mat['data']
+    if src_sel is not None:
+        one['nsource'] = len(src_sel)
 
     if one['sol']['data'].shape[0] != one['nchan'] or \
                 (one['sol']['data'].shape[1] != one['nsource'] and
@@ -226,6 +273,45 @@ def _read_one(fid, node):
     return one
 
 
+def _restrict_src_to_labels(src, labels):
+    """Restrict (in place) surface source spaces to the sources in labels
+
+    Returns the indices of the selected sources.
+    """
+    if len(src) != 2 or any(s['type'] != 'surf' for s in src):
+        raise ValueError('Restricting to labels is only possible with the '
+                         'two surface source spaces of the hemispheres')
+    if not isinstance(labels, list):
+        labels = [labels]
+    vertices = dict(lh=list(), rh=list())
+    for label in labels:
+        if label.hemi == 'both':
+            vertices['lh'].append(label.lh.vertices)
+            vertices['rh'].append(label.rh.vertices)
+        else:
+            vertices[label.hemi].append(label.vertices)
+    src_sel = list()
+    offset = 0
+    for s, hemi in zip(src, ['lh', 'rh']):
+        sel = np.where(np.in1d(s['vertno'],
+                               np.concatenate([[]] + vertices[hemi])))[0]
+        src_sel.append(sel + offset)
+        offset += s['nuse']
+        s['vertno'] = s['vertno'][sel]
+        s['nuse'] = len(sel)
+        s['inuse'] = np.zeros_like(s['inuse'])
+        s['inuse'][s['vertno']] = 1
+        s['use_tris'] = np.array([])
+        s['nuse_tri'] = np.array([0])
+        if s.get('patch_inds') is not None:
+            s['patch_inds'] = s['patch_inds'][sel]
+    src_sel = np.concatenate(src_sel)
+    if len(src_sel) == 0:
+        raise ValueError('No sources of the forward solution are in the '
+                         'labels')
+    return src_sel
+
+
 def read_forward_meas_info(tree, fid):
     """Read light measurement info from forward operator
 
@@ -356,8 +442,10 @@ def _merge_meg_eeg_fwds(megfwd, eegfwd, verbose=None):
 
 
 @verbose
+@profiled
 def read_forward_solution(fname, force_fixed=False, surf_ori=False,
-                          include=[], exclude=[], verbose=None):
+                          include=[], exclude=[], labels=None, mmap=False,
+                          dtype=None, verbose=None):
     """Read a forward solution a.k.a. lead field
 
     Parameters
@@ -375,6 +463,17 @@ def read_forward_solution(fname, force_fixed=False, surf_ori=False,
     exclude : list, optional
         List of names of channels to exclude. If empty include all
         channels.
+    labels : Label | list of Label | None
+        If not None, the forward solution is restricted to the sources in
+        these labels (of the two hemispheres of a surface source space).
+    mmap : bool
+        If True, the gain matrices are memory-mapped (read-only) instead
+        of being read, so that only the parts that are used are loaded.
+        This is only possible for uncompressed files, and the data are
+        still loaded if MEG and EEG solutions have to be combined.
+    dtype : dtype | None
+        If not None, the gain matrices are converted to this type (e.g.,
+        np.float32), otherwise the type of the file is kept.
     verbose : bool, str, int, or None
         If not None, override default verbose level (see mne.verbose).
 
@@ -382,6 +481,15 @@ def read_forward_solution(fname, force_fixed=False, surf_ori=False,
     -------
     fwd : dict
         The forward solution.
+
+    Notes
+    -----
+    The channel (include and exclude) and source (labels) selections are
+    done while reading, so only the rows of the stored matrices that
+    correspond to the selected sources are read, and the MEG or EEG
+    solution is not read at all if none of its channels is selected. If the
+    channel names are not stored with the solutions, the channels are
+    picked after reading instead.
     """
 
     #   Open the file, create directory
@@ -410,6 +518,14 @@ def read_forward_solution(fname, force_fixed=False, surf_ori=False,
     for s in src:
         s['id'] = find_source_space_hemi(s)
 
+    src_sel = None
+    if labels is not None:
+        try:
+            src_sel = _restrict_src_to_labels(src, labels)
+        except:
+            fid.close()
+            raise
+
     fwd = None
 
     #   Locate and read the forward solutions
@@ -427,7 +543,19 @@ def read_forward_solution(fname, force_fixed=False, surf_ori=False,
         elif tag.data == FIFF.FIFFV_MNE_EEG:
             eegnode = fwds[k]
 
-    megfwd = _read_one(fid, megnode)
+    # the channels can only be selected while reading if their names are
+    # stored with the solutions, otherwise they are picked after reading
+    pick_after = False
+    if len(include) > 0 or len(exclude) > 0:
+        for node in (megnode, eegnode):
+            if node is not None and not _has_col_names(fid, node):
+                pick_after = True
+    read_include, read_exclude = include, exclude
+    if pick_after:
+        read_include, read_exclude = [], []
+
+    megfwd = _read_one(fid, megnode, read_include, read_exclude, src_sel,
+                       mmap, dtype)
     if megfwd is not None:
         if is_fixed_orient(megfwd):
             ori = 'fixed'
@@ -437,7 +565,8 @@ def read_forward_solution(fname, force_fixed=False, surf_ori=False,
                     '%s orientations)' % (megfwd['nsource'], megfwd['nchan'],
                                           ori))
 
-    eegfwd = _read_one(fid, eegnode)
+    eegfwd = _read_one(fid, eegnode, read_include, read_exclude, src_sel,
+                       mmap, dtype)
     if eegfwd is not None:
         if is_fixed_orient(eegfwd):
             ori = 'fixed'
@@ -449,6 +578,8 @@ def read_forward_solution(fname, force_fixed=False, surf_ori=False,
 
     #   Merge the MEG and EEG solutions together
     try:
+        if megfwd is None and eegfwd is None:
+            raise ValueError('Nothing remains after picking')
         fwd = _merge_meg_eeg_fwds(megfwd, eegfwd)
     except:
         fid.close()
@@ -475,6 +606,14 @@ def read_forward_solution(fname, force_fixed=False, surf_ori=False,
     # get parent MEG info
     #
     fwd['info'] = read_forward_meas_info(tree, fid)
+    if len(read_include) > 0 or len(read_exclude) > 0:
+        ch_names = fwd['sol']['row_names']
+        logger.info('    %d out of %d channels remain after picking'
+                    % (len(ch_names), fwd['info']['nchan']))
+        pick_info(fwd['info'], pick_channels(fwd['info']['ch_names'],
+                                             include=ch_names), copy=False)
+        fwd['info']['bads'] = [b for b in fwd['info']['bads']
+                               if b in ch_names]
 
     # MNE environment
     parent_env = dir_tree_find(tree, FIFF.FIFFB_MNE_ENV)
@@ -521,10 +660,17 @@ def read_forward_solution(fname, force_fixed=False, surf_ori=False,
     # as necessary later
     fwd['_orig_source_ori'] = fwd['source_ori']
     convert_forward_solution(fwd, surf_ori, force_fixed, copy=False)
-    fwd = pick_channels_forward(fwd, include=include, exclude=exclude)
+
+    if pick_after:
+        fwd = pick_channels_forward(fwd, include=include, exclude=exclude)
     return fwd
 
 
+def _copy_writeable(data):
+    """Copy an array unless it is read-only (e.g., memory-mapped)"""
+    return data.copy() if data.flags.writeable else data
+
+
 @verbose
 def convert_forward_solution(fwd, surf_ori=False, force_fixed=False,
                              copy=True, verbose=None):
@@ -629,10 +775,10 @@ def convert_forward_solution(fwd, surf_ori=False, force_fixed=False,
     else:  # Free, cartesian
         logger.info('    Cartesian source orientations...')
         fwd['source_nn'] = np.kron(np.ones((fwd['nsource'], 1)), np.eye(3))
-        fwd['sol']['data'] = fwd['_orig_sol'].copy()
+        fwd['sol']['data'] = _copy_writeable(fwd['_orig_sol'])
         fwd['sol']['ncol'] = 3 * fwd['nsource']
         if fwd['sol_grad'] is not None:
-            fwd['sol_grad']['data'] = fwd['_orig_sol_grad'].copy()
+            fwd['sol_grad']['data'] = _copy_writeable(fwd['_orig_sol_grad'])
             fwd['sol_grad']['ncol'] = 3 * fwd['nsource']
         fwd['source_ori'] = FIFF.FIFFV_MNE_FREE_ORI
         fwd['surf_ori'] = False
@@ -1,19 +1,25 @@
 import numpy as np
 from os import path as op
 from numpy.polynomial import legendre
-from numpy.testing.utils import assert_allclose, assert_array_equal
+from numpy.testing.utils import (assert_allclose, assert_array_equal,
+                                 assert_equal)
 from nose.tools import assert_raises, assert_true
 
 from mne import read_trans
 from mne.forward import _make_surface_mapping, make_field_map
+from mne.forward import _field_interpolation
 from mne.surface import get_meg_helmet_surf, get_head_surf
 from mne.datasets import sample
+from mne.forward import _lead_dots
 from mne.forward._lead_dots import (_comp_sum_eeg, _comp_sums_meg,
                                     _get_legen_table,
                                     _get_legen_lut_fast,
-                                    _get_legen_lut_accurate)
+                                    _get_legen_lut_accurate,
+                                    _fast_sphere_dot_r0, _do_self_dots,
+                                    _do_surface_dots)
 from mne.fiff import read_info, read_evoked, pick_types_evoked
 from mne.fixes import partial
+from mne.parallel import chunk_jobs
 from mne.externals.six.moves import zip
 
 
@@ -91,6 +97,78 @@ def test_legendre_table():
         assert_allclose(n_fact1, n_fact2)
 
 
+def _normalize_points(rr, r0):
+    """Helper to get unit vectors and distances from the expansion center"""
+    rr = rr - r0
+    lr = np.sqrt(np.sum(rr * rr, axis=1))
+    return rr / lr[:, np.newaxis], lr
+
+
+def test_lead_dots_blocks():
+    """Test blocked lead field dot products against per-coil products
+    """
+    rng = np.random.RandomState(0)
+    r0 = np.array([0., 0., 0.04])
+    int_rad = 0.06
+    n_coils, n_surf = 12, 15
+    surf = dict(rr=r0 + 0.08 * rng.randn(n_surf, 3),
+                nn=rng.randn(n_surf, 3))
+    surf['nn'] /= np.sqrt(np.sum(surf['nn'] ** 2, axis=1))[:, np.newaxis]
+    sel = np.arange(n_surf)[::-1]
+
+    # use a tiny memory budget so the products are computed in many blocks
+    n_chunks = list()
+
+    def small_chunk_jobs(*args, **kwargs):
+        kwargs['max_nbytes'] = 1e5
+        chunks = chunk_jobs(*args, **kwargs)
+        n_chunks.append(len(chunks))
+        return chunks
+
+    for ch_type, radius in zip(['meg', 'eeg'], [0.12, 0.09]):
+        lut, n_fact = _get_legen_table(ch_type, n_coeff=50)
+        lut_fun = partial(_get_legen_lut_fast, lut=lut)
+        coils = list()
+        for ci in range(n_coils):
+            n_pts = 1 if ch_type == 'eeg' else [1, 4, 8][ci % 3]
+            rr = rng.randn(n_pts, 3)
+            rr *= radius / np.sqrt(np.sum(rr * rr, axis=1))[:, np.newaxis]
+            coils.append(dict(rmag=r0 + rr, cosmag=rng.randn(n_pts, 3),
+                              w=rng.rand(n_pts)))
+        rad = int_rad * 0.7 if ch_type == 'eeg' else int_rad
+
+        # straightforward computation, one pair of coils at a time
+        self_want = np.empty((n_coils, n_coils))
+        surf_want = np.empty((n_surf, n_coils))
+        rsurf, lsurf = _normalize_points(surf['rr'][sel], r0)
+        for ci1, coil1 in enumerate(coils):
+            rr1, lr1 = _normalize_points(coil1['rmag'], r0)
+            for ci2, coil2 in enumerate(coils):
+                rr2, lr2 = _normalize_points(coil2['rmag'], r0)
+                res = _fast_sphere_dot_r0(rad, rr1, rr2, lr1, lr2,
+                                          coil1['cosmag'], coil2['cosmag'],
+                                          False, lut_fun, n_fact, ch_type)
+                self_want[ci1, ci2] = np.dot(np.dot(coil1['w'], res),
+                                             coil2['w'])
+            res = _fast_sphere_dot_r0(rad, rsurf, rr1, lsurf, lr1,
+                                      surf['nn'][sel], coil1['cosmag'],
+                                      False, lut_fun, n_fact, ch_type)
+            surf_want[:, ci1] = np.dot(res, coil1['w'])
+
+        _lead_dots.chunk_jobs = small_chunk_jobs
+        try:
+            self_dots = _do_self_dots(int_rad, False, coils, r0, ch_type,
+                                      lut_fun, n_fact, n_jobs=1)
+            surface_dots = _do_surface_dots(int_rad, False, coils, surf, sel,
+                                            r0, ch_type, lut_fun, n_fact,
+                                            n_jobs=1)
+        finally:
+            _lead_dots.chunk_jobs = chunk_jobs
+        assert_true(all(n > 1 for n in n_chunks[-2:]))
+        assert_allclose(self_dots, self_want, rtol=1e-10)
+        assert_allclose(surface_dots, surf_want, rtol=1e-10)
+
+
 @sample.requires_sample_data
 def test_make_field_map_eeg():
     """Test interpolation of EEG field onto head
@@ -153,3 +231,29 @@ def test_make_field_map_meg():
     assert_true(len(fmd[0]['ch_names']), 106)
 
     assert_raises(ValueError, make_field_map, evoked, ch_type='foobar')
+
+
+def test_make_field_map_cache():
+    """Test caching of the field mapping matrices
+    """
+    evoked = read_evoked(evoked_fname, setno='Left Auditory')
+    info = evoked.info
+    info['bads'] = info['ch_names'][:200]
+    surf = get_meg_helmet_surf(info)
+    _field_interpolation._mapping_cache.clear()
+    fmd = _make_surface_mapping(info, surf, 'meg')
+    assert_true(len(_field_interpolation._mapping_cache) == 1)
+    fmd['data'][:] = 0.  # the cached matrix must not be modified
+    fmd_cached = _make_surface_mapping(info, surf, 'meg')
+    fmd_nocache = _make_surface_mapping(info, surf, 'meg', cache=False)
+    assert_allclose(fmd_cached['data'], fmd_nocache['data'])
+    assert_equal(fmd_cached['nest'], fmd_nocache['nest'])
+    assert_true(len(_field_interpolation._mapping_cache) == 1)
+    # other channels, projections or modes give other matrices
+    info['bads'] = info['ch_names'][:201]
+    _make_surface_mapping(info, surf, 'meg')
+    info['projs'] = []
+    _make_surface_mapping(info, surf, 'meg')
+    _make_surface_mapping(info, surf, 'meg', mode='accurate')
+    assert_true(len(_field_interpolation._mapping_cache) == 4)
+    _field_interpolation._mapping_cache.clear()
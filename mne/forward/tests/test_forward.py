@@ -1,6 +1,7 @@
 import os
 import os.path as op
 import warnings
+from copy import deepcopy
 
 from nose.tools import assert_true, assert_raises
 import numpy as np
@@ -12,10 +13,11 @@ from mne.fiff import Raw, Evoked, pick_types_forward
 from mne import (read_forward_solution, apply_forward, apply_forward_raw,
                  average_forward_solutions, write_forward_solution,
                  convert_forward_solution)
-from mne import SourceEstimate
+from mne import SourceEstimate, Label
 from mne.label import read_label
 from mne.utils import requires_mne, run_subprocess, _TempDir
 from mne.forward import restrict_forward_to_stc, restrict_forward_to_label
+from mne.forward.forward import _restrict_src_to_labels
 
 data_path = sample.data_path(download=False)
 fname = op.join(data_path, 'MEG', 'sample', 'sample_audvis-meg-oct-6-fwd.fif')
@@ -257,6 +259,68 @@ def test_restrict_forward_to_label():
     assert_equal(fwd_out['src'][1]['vertno'], src_sel_rh)
 
 
+@sample.requires_sample_data
+def test_read_forward_selection():
+    """Test restricting forward solutions while reading them
+    """
+    fwd = read_forward_solution(fname_meeg)
+    # channels
+    fwd_meg = pick_types_forward(fwd, meg=True, eeg=False)
+    fwd_sel = read_forward_solution(fname_meeg,
+                                    exclude=fwd['info']['ch_names'][306:])
+    compare_forwards(fwd_meg, fwd_sel)
+    assert_equal(fwd_meg['info']['ch_names'], fwd_sel['info']['ch_names'])
+    assert_equal(fwd_meg['sol']['row_names'], fwd_sel['sol']['row_names'])
+    assert_raises(ValueError, read_forward_solution, fname_meeg,
+                  include=['foo'])
+
+    # memory mapping and data type
+    fwd_mmap = read_forward_solution(fname_meeg, mmap=True,
+                                     exclude=fwd['info']['ch_names'][306:])
+    assert_true(not fwd_mmap['sol']['data'].flags.writeable)
+    compare_forwards(fwd_meg, fwd_mmap)
+    fwd_32 = read_forward_solution(fname_meeg, dtype=np.float32)
+    assert_equal(fwd_32['sol']['data'].dtype, np.float32)
+    compare_forwards(fwd, fwd_32)
+
+    # sources
+    label_path = op.join(data_path, 'MEG', 'sample', 'labels')
+    label_lh = read_label(op.join(label_path, 'Aud-lh.label'))
+    label_rh = read_label(op.join(label_path, 'Vis-rh.label'))
+    for force_fixed in (False, True):
+        fwd = read_forward_solution(fname_meeg, force_fixed=force_fixed)
+        fwd_sel = read_forward_solution(fname_meeg, force_fixed=force_fixed,
+                                        labels=[label_lh, label_rh])
+        src_sel = list()
+        for s, label, offset in zip(fwd['src'], [label_lh, label_rh],
+                                    [0, fwd['src'][0]['nuse']]):
+            vertno = np.intersect1d(s['vertno'], label.vertices)
+            assert_array_equal(fwd_sel['src'][len(src_sel)]['vertno'],
+                               vertno)
+            src_sel.append(np.searchsorted(s['vertno'], vertno) + offset)
+        src_sel = np.concatenate(src_sel)
+        n_ori = 1 if force_fixed else 3
+        idx = (n_ori * src_sel[:, np.newaxis] + np.arange(n_ori)).ravel()
+        assert_equal(fwd_sel['nsource'], len(src_sel))
+        assert_allclose(fwd_sel['sol']['data'], fwd['sol']['data'][:, idx])
+        assert_allclose(fwd_sel['source_nn'], fwd['source_nn'][idx])
+        assert_allclose(fwd_sel['source_rr'], fwd['source_rr'][src_sel])
+
+
+def test_restrict_src_to_labels():
+    """Test that only the two hemispheres can be restricted to labels
+    """
+    label = Label(np.arange(10), hemi='lh')
+    surf = dict(type='surf', vertno=np.arange(0, 20, 2), nuse=10,
+                inuse=np.arange(20) % 2 == 0)
+    vol = dict(surf, type='vol')
+    for src in ([surf], [surf, vol], [vol, vol], [surf, surf, surf]):
+        assert_raises(ValueError, _restrict_src_to_labels, deepcopy(src),
+                      label)
+    src_sel = _restrict_src_to_labels([deepcopy(surf), deepcopy(surf)], label)
+    assert_array_equal(src_sel, np.arange(5))
+
+
 @sample.requires_sample_data
 @requires_mne
 def test_average_forward_solution():
@@ -4,7 +4,8 @@ import os
 import os.path as op
 from subprocess import CalledProcessError
 
-from nose.tools import assert_raises
+from nose.tools import assert_raises, assert_true
+import numpy as np
 from numpy.testing import (assert_equal, assert_allclose)
 
 from mne.datasets import sample
@@ -12,9 +13,11 @@ from mne.fiff import Raw
 from mne.fiff.kit import read_raw_kit
 from mne.fiff.bti import read_raw_bti
 from mne import (read_forward_solution, make_forward_solution,
+                 make_forward_solutions_positions, average_forward_solutions,
                  do_forward_solution, setup_source_space, read_trans,
                  convert_forward_solution)
 from mne.utils import requires_mne, _TempDir
+from mne.forward import _compute_forward
 from mne.tests.test_source_space import _compare_source_spaces
 
 data_path = sample.data_path(download=False)
@@ -175,6 +178,92 @@ def test_make_forward_solution():
     _compare_forwards(fwd, fwd_py, 366, 22494)
 
 
+@sample.requires_sample_data
+def test_make_forward_solution_cache():
+    """Test reuse of the BEM solutions at the sensors
+    """
+    fname_bem = op.join(subjects_dir, 'sample', 'bem',
+                        'sample-5120-5120-5120-bem-sol.fif')
+    srcs = [setup_source_space('sample', None, spacing, overwrite=True,
+                               subjects_dir=subjects_dir)
+            for spacing in ('oct2', 'oct3')]
+    _compute_forward._coil_solution_cache.clear()
+    for src in srcs:
+        fwd_py = make_forward_solution(fname_raw, mindist=5.0, src=src,
+                                       eeg=True, meg=True, bem=fname_bem,
+                                       mri=fname_mri)
+        # one MEG and one EEG solution
+        assert_equal(len(_compute_forward._coil_solution_cache), 2)
+    fwd_nocache = make_forward_solution(fname_raw, mindist=5.0, src=src,
+                                        eeg=True, meg=True, bem=fname_bem,
+                                        mri=fname_mri, cache=False)
+    assert_allclose(fwd_py['sol']['data'], fwd_nocache['sol']['data'])
+
+    # the cache can be stored on disk
+    os.environ['MNE_CACHE_DIR'] = temp_dir
+    try:
+        _compute_forward._coil_solution_cache.clear()
+        make_forward_solution(fname_raw, mindist=5.0, src=src, eeg=True,
+                              meg=True, bem=fname_bem, mri=fname_mri)
+        cache_dir = op.join(temp_dir, 'bem-coil-solutions')
+        assert_equal(len(os.listdir(cache_dir)), 2)
+        _compute_forward._coil_solution_cache.clear()
+        fwd_disk = make_forward_solution(fname_raw, mindist=5.0, src=src,
+                                         eeg=True, meg=True, bem=fname_bem,
+                                         mri=fname_mri)
+    finally:
+        del os.environ['MNE_CACHE_DIR']
+    assert_allclose(fwd_py['sol']['data'], fwd_disk['sol']['data'])
+
+
+@sample.requires_sample_data
+def test_make_forward_solutions_positions():
+    """Test making forward solutions for several head positions
+    """
+    fname_bem = op.join(subjects_dir, 'sample', 'bem',
+                        'sample-5120-5120-5120-bem-sol.fif')
+    src = setup_source_space('sample', None, 'oct3', overwrite=True,
+                             subjects_dir=subjects_dir)
+    info = Raw(fname_raw).info
+    dev_head_t = info['dev_head_t']
+    shifted = dev_head_t['trans'].copy()
+    shifted[:3, 3] += [0., 0., 0.01]
+    fwds = make_forward_solutions_positions(info, fname_mri, src, fname_bem,
+                                            [dev_head_t, shifted],
+                                            mindist=5.0)
+    assert_equal(len(fwds), 2)
+    # the source spaces are shared, not the head positions
+    assert_true(fwds[0]['src'] is fwds[1]['src'])
+    assert_true(fwds[0]['info']['dev_head_t'] is not
+                fwds[1]['info']['dev_head_t'])
+    fwd_py = make_forward_solution(info, mindist=5.0, src=src, eeg=True,
+                                   meg=True, bem=fname_bem, mri=fname_mri)
+    assert_allclose(fwds[0]['sol']['data'], fwd_py['sol']['data'])
+    assert_allclose(fwds[1]['info']['dev_head_t']['trans'], shifted)
+    info['dev_head_t'] = fwds[1]['info']['dev_head_t']
+    fwd_py = make_forward_solution(info, mindist=5.0, src=src, eeg=True,
+                                   meg=True, bem=fname_bem, mri=fname_mri)
+    assert_allclose(fwds[1]['sol']['data'], fwd_py['sol']['data'])
+    # only MEG depends on the head position
+    assert_allclose(fwds[0]['sol']['data'][306:],
+                    fwds[1]['sol']['data'][306:])
+    fwd_ave = average_forward_solutions(fwds)
+    assert_allclose(fwd_ave['sol']['data'],
+                    (fwds[0]['sol']['data'] + fwds[1]['sol']['data']) / 2.)
+    # without MEG, the EEG gain matrix is shared and read-only
+    fwds = make_forward_solutions_positions(info, fname_mri, src, fname_bem,
+                                            [dev_head_t, shifted], meg=False,
+                                            mindist=5.0)
+    assert_true(np.may_share_memory(fwds[0]['sol']['data'],
+                                    fwds[1]['sol']['data']))
+    assert_true(not fwds[0]['sol']['data'].flags.writeable)
+    assert_true(fwds[0]['_orig_sol'] is fwds[0]['sol']['data'])
+    assert_raises(ValueError, make_forward_solutions_positions, info,
+                  fname_mri, src, fname_bem, [])
+    assert_raises(ValueError, make_forward_solutions_positions, info,
+                  fname_mri, src, fname_bem, [np.eye(3)])
+
+
 @sample.requires_sample_data
 @requires_mne
 def test_do_forward_solution():
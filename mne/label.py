@@ -20,7 +20,6 @@ from .source_estimate import (_read_stc, mesh_edges, mesh_dist, morph_data,
                               SourceEstimate, spatial_src_connectivity)
 from .surface import read_surface, fast_cross_3d
 from .parallel import parallel_func, check_n_jobs
-from .stats.cluster_level import _find_clusters
 from .externals.six import b, string_types
 from .externals.six.moves import zip, xrange
 
@@ -955,6 +954,7 @@ def stc_to_label(stc, src=None, smooth=5, connected=False, subjects_dir=None):
         ordered in decreasing order depending of the maximum value in the stc.
         If no Label is available in an hemisphere, an empty list is returned.
     """
+    from .stats.cluster_level import _find_clusters
     src = stc.subject if src is None else src
     if src is None:
         raise ValueError('src cannot be None if stc.subject is None')
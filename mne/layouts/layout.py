@@ -10,7 +10,6 @@ from collections import defaultdict
 import os.path as op
 import numpy as np
 from scipy.optimize import leastsq
-from ..preprocessing.maxfilter import fit_sphere_to_headshape
 from ..fiff import FIFF, pick_types
 from ..utils import _clean_names
 from ..externals.six.moves import map
@@ -191,6 +190,7 @@ def make_eeg_layout(info, radius=20, width=5, height=4):
                            'Cannot generate layout based on the subject\'s '
                            'head shape')
 
+    from ..preprocessing.maxfilter import fit_sphere_to_headshape
     radius_head, origin_head, origin_device = fit_sphere_to_headshape(info)
     inds = pick_types(info, meg=False, eeg=True, ref_meg=False,
                       exclude='bads')
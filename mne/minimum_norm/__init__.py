@@ -2,7 +2,10 @@
 
 from .inverse import (read_inverse_operator, apply_inverse,
                       apply_inverse_raw, make_inverse_operator,
-                      apply_inverse_epochs, write_inverse_operator,
-                      compute_rank_inverse)
+                      make_inverse_operators, prepare_inverse_operators,
+                      apply_inverse_epochs, apply_inverse_epochs_data,
+                      apply_inverse_epochs_labels,
+                      write_inverse_operator, compute_rank_inverse,
+                      clear_inverse_cache)
 from .time_frequency import (source_band_induced_power, source_induced_power,
                              compute_source_psd, compute_source_psd_epochs)
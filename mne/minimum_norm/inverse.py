@@ -4,6 +4,7 @@
 # License: BSD (3-clause)
 
 import warnings
+import hashlib
 from copy import deepcopy
 from math import sqrt
 import numpy as np
@@ -30,8 +31,10 @@ from ..source_space import (read_source_spaces_from_tree,
                             find_source_space_hemi, _get_vertno,
                             _write_source_spaces_to_fid, label_src_vertno_sel)
 from ..transforms import invert_transform, transform_surface_to
-from ..source_estimate import _make_stc
-from ..utils import logger, verbose
+from ..source_estimate import _make_stc, LabelExtractor
+from ..utils import logger, verbose, profiled, get_config, _LRUCache
+from ..parallel import _max_nbytes
+from ..externals.six import string_types
 from functools import reduce
 
 
@@ -460,6 +463,7 @@ def _check_ch_names(inv, info):
 
 
 @verbose
+@profiled
 def prepare_inverse_operator(orig, nave, lambda2, method, verbose=None):
     """Prepare an inverse operator for actually computing the inverse
 
@@ -481,6 +485,43 @@ def prepare_inverse_operator(orig, nave, lambda2, method, verbose=None):
     inv : dict
         Prepared inverse operator.
     """
+    return _prepare_inverse_operators(orig, nave, [lambda2], method)[0]
+
+
+@verbose
+@profiled
+def prepare_inverse_operators(orig, nave, lambda2, method, verbose=None):
+    """Prepare an inverse operator for several regularization factors
+
+    The scaling, the projector and the whitener are computed only once, and
+    the noise-normalization factors are computed for all the values of
+    lambda2 at the same time.
+
+    Parameters
+    ----------
+    orig : dict
+        The inverse operator structure read from a file.
+    nave : int
+        Number of averages (scales the noise covariance).
+    lambda2 : list of float
+        The regularization factors. Recommended to be 1 / SNR**2.
+    method : "MNE" | "dSPM" | "sLORETA"
+        Use mininum norm, dSPM or sLORETA.
+    verbose : bool, str, int, or None
+        If not None, override default verbose level (see mne.verbose).
+
+    Returns
+    -------
+    invs : list of dict
+        Prepared inverse operators, one for each value of lambda2. Except
+        for 'reginv' and 'noisenorm', they share their data, which must
+        thus not be modified in place.
+    """
+    return _prepare_inverse_operators(orig, nave, lambda2, method)
+
+
+def _prepare_inverse_operators(orig, nave, lambda2s, method):
+    """Helper to prepare an inverse operator for several lambda2 values"""
     if nave <= 0:
         raise ValueError('The number of averages should be positive')
 
@@ -507,10 +548,11 @@ def prepare_inverse_operator(orig, nave, lambda2, method, verbose=None):
                 ' nave = %d' % (inv['nave'], nave))
     inv['nave'] = nave
     #
-    #   Create the diagonal matrix for computing the regularized inverse
+    #   Create the diagonal matrices for computing the regularized inverse
     #
-    sing = np.array(inv['sing'], dtype=np.float64)
-    inv['reginv'] = sing / (sing ** 2 + lambda2)
+    lambda2s = np.array(lambda2s, dtype=np.float64)
+    sing = np.array(inv['sing'], dtype=np.float64)[:, None]
+    reginv = sing / (sing ** 2 + lambda2s)
     logger.info('    Created the regularized inverter')
     #
     #   Create the projection operator
@@ -560,23 +602,19 @@ def prepare_inverse_operator(orig, nave, lambda2, method, verbose=None):
         if method == "dSPM":
             logger.info('    Computing noise-normalization factors '
                         '(dSPM)...')
-            noise_weight = inv['reginv']
+            noise_weight = reginv
         else:
             logger.info('    Computing noise-normalization factors '
                         '(sLORETA)...')
-            noise_weight = (inv['reginv'] *
-                            np.sqrt((1. + inv['sing'] ** 2 / lambda2)))
-        noise_norm = np.zeros(inv['eigen_leads']['nrow'])
-        nrm2, = linalg.get_blas_funcs(('nrm2',), (noise_norm,))
-        if inv['eigen_leads_weighted']:
-            for k in range(inv['eigen_leads']['nrow']):
-                one = inv['eigen_leads']['data'][k, :] * noise_weight
-                noise_norm[k] = nrm2(one)
-        else:
-            for k in range(inv['eigen_leads']['nrow']):
-                one = (sqrt(inv['source_cov']['data'][k]) *
-                       inv['eigen_leads']['data'][k, :] * noise_weight)
-                noise_norm[k] = nrm2(one)
+            noise_weight = reginv * np.sqrt((1. + sing ** 2 / lambda2s))
+        #
+        #   The squared norms of the weighted eigenleads, for all the
+        #   lambda2 values at once
+        #
+        noise_norm = np.dot(inv['eigen_leads']['data'] ** 2,
+                            noise_weight ** 2)
+        if not inv['eigen_leads_weighted']:
+            noise_norm *= inv['source_cov']['data'][:, None]
 
         #
         #   Compute the final result
@@ -590,14 +628,22 @@ def prepare_inverse_operator(orig, nave, lambda2, method, verbose=None):
             #   Even in this case return only one noise-normalization factor
             #   per source location
             #
-            noise_norm = combine_xyz(noise_norm[:, None]).ravel()
+            noise_norm = (noise_norm[0::3] + noise_norm[1::3] +
+                          noise_norm[2::3])
 
-        inv['noisenorm'] = 1.0 / np.abs(noise_norm)
+        noisenorm = 1.0 / np.sqrt(noise_norm)
         logger.info('[done]')
     else:
-        inv['noisenorm'] = []
+        noisenorm = None
 
-    return inv
+    invs = list()
+    for k in range(len(lambda2s)):
+        this_inv = inv.copy() if k < len(lambda2s) - 1 else inv
+        this_inv['reginv'] = reginv[:, k].copy()
+        this_inv['noisenorm'] = ([] if noisenorm is None
+                                 else noisenorm[:, k].copy())
+        invs.append(this_inv)
+    return invs
 
 
 @verbose
@@ -672,6 +718,112 @@ def _assemble_kernel(inv, label, method, pick_ori, verbose=None):
     return K, noise_norm, vertno
 
 
+###############################################################################
+# Cache of prepared inverse operators and kernels
+
+def _get_inverse_cache_nbytes():
+    """Helper to get the maximum size of the inverse cache (in bytes)"""
+    return float(get_config('MNE_INVERSE_CACHE_SIZE', 512)) * 1e6
+
+
+_inverse_cache = _LRUCache(max_nbytes=_get_inverse_cache_nbytes)
+
+
+def clear_inverse_cache():
+    """Clear the cache of prepared inverse operators and imaging kernels
+
+    The inverse functions (apply_inverse, apply_inverse_raw, etc.) keep the
+    inverse operators prepared for a given nave, lambda2 and method, as well
+    as the imaging kernels computed from them, so that repeated calls with
+    the same parameters do not prepare the operator again. The cached
+    entries are identified by the content of the inverse operator, which is
+    checked on every call, so modified operators are prepared again.
+
+    The maximum memory used by the cache can be set (in MB) with the
+    MNE_INVERSE_CACHE_SIZE config value (see mne.set_config). Use 0 to
+    disable the cache.
+    """
+    _inverse_cache.clear()
+
+
+def _update_digest(md5, obj):
+    """Helper to add an array or a simple python object to a digest"""
+    if isinstance(obj, np.ndarray):
+        # the arrays are hashed on every call (they can be modified in place)
+        md5.update(str((obj.dtype.str, obj.shape)).encode('utf-8'))
+        md5.update(np.ascontiguousarray(obj))
+    else:
+        md5.update(repr(obj).encode('utf-8'))
+
+
+def _inverse_cache_key(inv):
+    """Helper to compute a key identifying the content of an inverse"""
+    md5 = hashlib.md5()
+    orient_prior = inv['orient_prior']
+    if orient_prior is not None:
+        orient_prior = orient_prior['data']
+    for obj in (inv['eigen_leads']['data'], inv['eigen_leads_weighted'],
+                inv['eigen_fields']['data'], inv['sing'],
+                inv['source_cov']['data'], inv['source_ori'], inv['nave'],
+                orient_prior, inv['noise_cov']['data'],
+                inv['noise_cov']['eig'], inv['noise_cov']['eigvec'],
+                inv['noise_cov']['diag'], inv['noise_cov']['names']):
+        _update_digest(md5, obj)
+    for proj in inv['projs']:
+        for obj in (proj['active'], proj['data']['col_names'],
+                    proj['data']['data']):
+            _update_digest(md5, obj)
+    for s in inv['src']:
+        _update_digest(md5, s['type'])
+        _update_digest(md5, s['vertno'])
+    return md5.hexdigest()
+
+
+def _label_cache_key(label):
+    """Helper to compute a key identifying the vertices of a label"""
+    if label is None:
+        return None
+    md5 = hashlib.md5()
+    md5.update(label.hemi.encode('utf-8'))
+    for this_label in (label.lh, label.rh) if label.hemi == 'both' \
+            else (label,):
+        _update_digest(md5, np.asarray(this_label.vertices))
+    return md5.hexdigest()
+
+
+@verbose
+def _prepare_inverse_kernel(orig, nave, lambda2, method, label, pick_ori,
+                            verbose=None):
+    """Helper to get the prepared inverse operator and its imaging kernel
+
+    The prepared inverse operator must not be modified, as it may be shared
+    with other calls. The kernel and noise normalization are copies that
+    can be modified.
+    """
+    inv_key = (_inverse_cache_key(orig), nave, float(lambda2), method)
+    inv = _inverse_cache.get(('inv',) + inv_key)
+    if inv is None:
+        inv = prepare_inverse_operator(orig, nave, lambda2, method)
+        nbytes = sum(a.nbytes for a in (inv['eigen_leads']['data'],
+                                        inv['eigen_fields']['data'],
+                                        inv['whitener'], inv['proj'],
+                                        inv['noise_cov']['eigvec'])
+                     if isinstance(a, np.ndarray))
+        _inverse_cache.set(('inv',) + inv_key, inv, nbytes)
+    else:
+        logger.info('Using the cached prepared inverse operator')
+
+    kernel_key = ('kernel',) + inv_key + (_label_cache_key(label), pick_ori)
+    kernel = _inverse_cache.get(kernel_key)
+    if kernel is None:
+        kernel = _assemble_kernel(inv, label, method, pick_ori)
+        _inverse_cache.set(kernel_key, kernel, kernel[0].nbytes)
+    K, noise_norm, vertno = kernel
+    if noise_norm is not None:
+        noise_norm = noise_norm.copy()
+    return inv, K.copy(), noise_norm, deepcopy(vertno)
+
+
 def _check_method(method):
     if method not in ["MNE", "dSPM", "sLORETA"]:
         raise ValueError('method parameter should be "MNE" or "dSPM" '
@@ -705,6 +857,7 @@ def _subject_from_inverse(inverse_operator):
 
 
 @verbose
+@profiled
 def apply_inverse(evoked, inverse_operator, lambda2, method="dSPM",
                   pick_ori=None, verbose=None, pick_normal=None):
     """Apply inverse operator to evoked data
@@ -744,14 +897,15 @@ def apply_inverse(evoked, inverse_operator, lambda2, method="dSPM",
 
     _check_ch_names(inverse_operator, evoked.info)
 
-    inv = prepare_inverse_operator(inverse_operator, nave, lambda2, method)
+    inv, K, noise_norm, _ = \
+        _prepare_inverse_kernel(inverse_operator, nave, lambda2, method,
+                                None, pick_ori)
     #
     #   Pick the correct channels from the data
     #
     sel = _pick_channels_inverse_operator(evoked.ch_names, inv)
     logger.info('Picked %d channels from the data' % len(sel))
     logger.info('Computing inverse...')
-    K, noise_norm, _ = _assemble_kernel(inv, None, method, pick_ori)
     sol = np.dot(K, evoked.data[sel])  # apply imaging kernel
 
     is_free_ori = (inverse_operator['source_ori'] == FIFF.FIFFV_MNE_FREE_ORI
@@ -778,10 +932,11 @@ def apply_inverse(evoked, inverse_operator, lambda2, method="dSPM",
 
 
 @verbose
+@profiled
 def apply_inverse_raw(raw, inverse_operator, lambda2, method="dSPM",
                       label=None, start=None, stop=None, nave=1,
                       time_func=None, pick_ori=None,
-                      buffer_size=None, verbose=None,
+                      buffer_size=None, data_buffer=None, verbose=None,
                       pick_normal=None):
     """Apply inverse operator to Raw data
 
@@ -816,20 +971,27 @@ def apply_inverse_raw(raw, inverse_operator, lambda2, method="dSPM",
         only the radial component is kept. This is only implemented
         when working with loose orientations.
     buffer_size : int (or None)
-        If not None, the computation of the inverse and the combination of the
-        current components is performed in segments of length buffer_size
-        samples. While slightly slower, this is useful for long datasets as it
-        reduces the memory requirements by approx. a factor of 3 (assuming
-        buffer_size << data length).
-        Note that this setting has no effect for fixed-orientation inverse
-        operators.
+        If not None, the raw data are read, and the inverse and the
+        combination of the current components are computed, in segments of
+        length buffer_size samples. While slightly slower, this is useful for
+        long datasets as the sensor data and the intermediate results are
+        never held in memory for the whole time span. If time_func is not
+        None, the sensor data are still read in one go.
+    data_buffer : str | None
+        If str, the source time courses are written to a np.memmap stored
+        in this file, and the returned source estimate uses it as its data.
+        Combined with buffer_size, this allows computing source estimates
+        larger than the available memory. The file is not removed when the
+        source estimate is deleted.
     verbose : bool, str, int, or None
         If not None, override default verbose level (see mne.verbose).
 
     Returns
     -------
     stc : SourceEstimate | VolSourceEstimate
-        The source estimates.
+        The source estimates. If data_buffer is a str, stc.data is a
+        np.memmap and slices of it (e.g. stc.data[:, start:stop]) can be
+        processed one segment at a time.
     """
     method = _check_method(method)
     pick_ori = _check_ori(pick_ori, pick_normal)
@@ -839,7 +1001,9 @@ def apply_inverse_raw(raw, inverse_operator, lambda2, method="dSPM",
     #
     #   Set up the inverse according to the parameters
     #
-    inv = prepare_inverse_operator(inverse_operator, nave, lambda2, method)
+    inv, K, noise_norm, vertno = \
+        _prepare_inverse_kernel(inverse_operator, nave, lambda2, method,
+                                label, pick_ori)
     #
     #   Pick the correct channels from the data
     #
@@ -847,41 +1011,61 @@ def apply_inverse_raw(raw, inverse_operator, lambda2, method="dSPM",
     logger.info('Picked %d channels from the data' % len(sel))
     logger.info('Computing inverse...')
 
-    data, times = raw[sel, start:stop]
-
-    if time_func is not None:
-        data = time_func(data)
-
-    K, noise_norm, vertno = _assemble_kernel(inv, label, method, pick_ori)
-
     is_free_ori = (inverse_operator['source_ori'] == FIFF.FIFFV_MNE_FREE_ORI
                    and pick_ori == None)
-
-    if buffer_size is not None and is_free_ori:
-        # Process the data in segments to conserve memory
-        n_seg = int(np.ceil(data.shape[1] / float(buffer_size)))
+    n_sources = K.shape[0] // 3 if is_free_ori else K.shape[0]
+
+    start, stop = slice(start, stop).indices(raw.n_times)[:2]
+    n_times = max(stop - start, 0)
+    if time_func is not None or buffer_size is None:
+        data, times = raw[sel, start:stop]
+        if time_func is not None:
+            data = time_func(data)
+            n_times = data.shape[1]
+    else:
+        data = None
+        times = raw.index_as_time(start, use_first_samp=False)
+    if buffer_size is None:
+        buffer_size = max(n_times, 1)
+    n_seg = int(np.ceil(n_times / float(buffer_size)))
+    if n_seg > 1:
         logger.info('computing inverse and combining the current '
                     'components (using %d segments)...' % (n_seg))
 
-        # Allocate space for inverse solution
-        n_times = data.shape[1]
-        sol = np.empty((K.shape[0] / 3, n_times),
-                       dtype=(K[0, 0] * data[0, 0]).dtype)
-
-        for pos in range(0, n_times, buffer_size):
-            sol[:, pos:pos + buffer_size] = \
-                combine_xyz(np.dot(K, data[:, pos:pos + buffer_size]))
-
-            logger.info('segment %d / %d done..'
-                        % (pos / buffer_size + 1, n_seg))
+    # Allocate space for inverse solution
+    dtype = np.result_type(K.dtype, np.float64 if data is None else data)
+    if isinstance(data_buffer, string_types):
+        sol = np.memmap(data_buffer, mode='w+', dtype=dtype,
+                        shape=(n_sources, n_times))
+    elif n_seg > 1:
+        sol = np.empty((n_sources, n_times), dtype=dtype)
     else:
-        sol = np.dot(K, data)
-        if is_free_ori:
-            logger.info('combining the current components...')
-            sol = combine_xyz(sol)
+        sol = None
 
-    if noise_norm is not None:
-        sol *= noise_norm
+    for pos in range(0, n_times, buffer_size):
+        if data is None:
+            this_stop = min(start + pos + buffer_size, stop)
+            this_data, _ = raw[sel, start + pos:this_stop]
+        else:
+            this_data = data[:, pos:pos + buffer_size]
+        this_sol = np.dot(K, this_data)
+        if is_free_ori:
+            if n_seg == 1:
+                logger.info('combining the current components...')
+            this_sol = combine_xyz(this_sol)
+        if noise_norm is not None:
+            this_sol *= noise_norm
+        if sol is None:
+            sol = this_sol
+        else:
+            sol[:, pos:pos + buffer_size] = this_sol
+        if n_seg > 1:
+            logger.info('segment %d / %d done..'
+                        % (pos // buffer_size + 1, n_seg))
+    if sol is None:  # no samples
+        sol = np.empty((n_sources, 0), dtype=dtype)
+    elif isinstance(sol, np.memmap):
+        sol.flush()
 
     tmin = float(times[0])
     tstep = 1.0 / raw.info['sfreq']
@@ -893,29 +1077,23 @@ def apply_inverse_raw(raw, inverse_operator, lambda2, method="dSPM",
     return stc
 
 
-def _apply_inverse_epochs_gen(epochs, inverse_operator, lambda2, method="dSPM",
-                              label=None, nave=1, pick_ori=None,
-                              verbose=None, pick_normal=None):
-    """ see apply_inverse_epochs """
-    method = _check_method(method)
-    pick_ori = _check_ori(pick_ori, pick_normal)
-
+def _prepare_inverse_epochs(epochs, inverse_operator, lambda2, method,
+                            label, nave, pick_ori):
+    """Helper to get the kernel and channel selection for epochs"""
     _check_ch_names(inverse_operator, epochs.info)
 
     #
     #   Set up the inverse according to the parameters
     #
-    inv = prepare_inverse_operator(inverse_operator, nave, lambda2, method)
+    inv, K, noise_norm, vertno = \
+        _prepare_inverse_kernel(inverse_operator, nave, lambda2, method,
+                                label, pick_ori)
     #
     #   Pick the correct channels from the data
     #
     sel = _pick_channels_inverse_operator(epochs.ch_names, inv)
     logger.info('Picked %d channels from the data' % len(sel))
     logger.info('Computing inverse...')
-    K, noise_norm, vertno = _assemble_kernel(inv, label, method, pick_ori)
-
-    tstep = 1.0 / epochs.info['sfreq']
-    tmin = epochs.times[0]
 
     is_free_ori = (inverse_operator['source_ori'] == FIFF.FIFFV_MNE_FREE_ORI
                    and pick_ori == None)
@@ -923,8 +1101,68 @@ def _apply_inverse_epochs_gen(epochs, inverse_operator, lambda2, method="dSPM",
     if not is_free_ori and noise_norm is not None:
         # premultiply kernel with noise normalization
         K *= noise_norm
+        noise_norm = None
+
+    return K, noise_norm, vertno, sel, is_free_ori
+
+
+def _iter_epochs_batches(epochs, sel, batch_size):
+    """Helper to iterate over the epochs data in batches of batch_size"""
+    batch = list()
+    for e in epochs:
+        batch.append(e[sel])
+        if len(batch) == batch_size:
+            yield np.array(batch)
+            batch = list()
+    if len(batch) > 0:
+        yield np.array(batch)
+
+
+def _apply_kernel_epochs(K, noise_norm, is_free_ori, data):
+    """Apply the kernel to data of shape (n_epochs, n_channels, n_times)
+
+    The epochs are concatenated in time so that the whole batch is
+    processed with a single matrix product. The returned array is a view
+    of the solution of the whole batch.
+    """
+    n_epochs, n_channels, n_times = data.shape
+    data = data.transpose(1, 0, 2).reshape(n_channels, n_epochs * n_times)
+    sol = np.dot(K, data)
+    if is_free_ori:
+        sol = combine_xyz(sol)
+    if noise_norm is not None:
+        sol *= noise_norm
+    return sol.reshape(len(sol), n_epochs, n_times).transpose(1, 0, 2)
+
+
+def _apply_inverse_epochs_gen(epochs, inverse_operator, lambda2, method="dSPM",
+                              label=None, nave=1, pick_ori=None, batch_size=1,
+                              verbose=None, pick_normal=None):
+    """ see apply_inverse_epochs """
+    method = _check_method(method)
+    pick_ori = _check_ori(pick_ori, pick_normal)
+
+    K, noise_norm, vertno, sel, is_free_ori = \
+        _prepare_inverse_epochs(epochs, inverse_operator, lambda2, method,
+                                label, nave, pick_ori)
+
+    tstep = 1.0 / epochs.info['sfreq']
+    tmin = epochs.times[0]
 
     subject = _subject_from_inverse(inverse_operator)
+    if batch_size != 1:
+        k = 0
+        for data in _iter_epochs_batches(epochs, sel, batch_size):
+            logger.info('Processing epochs : %d - %d' % (k + 1, k + len(data)))
+            sol = _apply_kernel_epochs(K, noise_norm, is_free_ori, data)
+            for this_sol in sol:
+                # copy so that the stc does not keep the whole batch alive
+                yield _make_stc(this_sol.copy(), vertices=vertno, tmin=tmin,
+                                tstep=tstep, subject=subject)
+            k += len(data)
+        logger.info('[done]')
+        return
+
     for k, e in enumerate(epochs):
         logger.info('Processing epoch : %d' % (k + 1))
         if is_free_ori:
@@ -952,9 +1190,10 @@ def _apply_inverse_epochs_gen(epochs, inverse_operator, lambda2, method="dSPM",
 
 
 @verbose
+@profiled
 def apply_inverse_epochs(epochs, inverse_operator, lambda2, method="dSPM",
                          label=None, nave=1, pick_ori=None,
-                         return_generator=False, verbose=None,
+                         return_generator=False, batch_size=1, verbose=None,
                          pick_normal=None):
     """Apply inverse operator to Epochs
 
@@ -984,6 +1223,11 @@ def apply_inverse_epochs(epochs, inverse_operator, lambda2, method="dSPM",
     return_generator : bool
         Return a generator object instead of a list. This allows iterating
         over the stcs without having to keep them all in memory.
+    batch_size : int
+        Number of epochs processed together with a single matrix product.
+        Larger batches are faster for many short epochs, but use more
+        memory. With batch_size=1, the source estimates of fixed-orientation
+        inverse operators keep the kernel and the sensor data separate.
     verbose : bool, str, int, or None
         If not None, override default verbose level (see mne.verbose).
 
@@ -994,8 +1238,8 @@ def apply_inverse_epochs(epochs, inverse_operator, lambda2, method="dSPM",
     """
     stcs = _apply_inverse_epochs_gen(epochs, inverse_operator, lambda2,
                                      method=method, label=label, nave=nave,
-                                     pick_ori=pick_ori, verbose=verbose,
-                                     pick_normal=pick_normal)
+                                     pick_ori=pick_ori, batch_size=batch_size,
+                                     verbose=verbose, pick_normal=pick_normal)
 
     if not return_generator:
         # return a list
@@ -1004,6 +1248,177 @@ def apply_inverse_epochs(epochs, inverse_operator, lambda2, method="dSPM",
     return stcs
 
 
+@verbose
+@profiled
+def apply_inverse_epochs_data(epochs, inverse_operator, lambda2,
+                              method="dSPM", label=None, nave=1,
+                              pick_ori=None, batch_size=None, verbose=None):
+    """Apply inverse operator to Epochs and return an array
+
+    Contrary to apply_inverse_epochs, the source time courses of all the
+    epochs are returned in a single array, and no SourceEstimate is
+    created. The epochs are processed in batches, each with a single
+    matrix product.
+
+    Parameters
+    ----------
+    epochs : Epochs object
+        Single trial epochs.
+    inverse_operator : dict
+        Inverse operator read with mne.read_inverse_operator.
+    lambda2 : float
+        The regularization parameter.
+    method : "MNE" | "dSPM" | "sLORETA"
+        Use mininum norm, dSPM or sLORETA.
+    label : Label | None
+        Restricts the source estimates to a given label. If None,
+        source estimates will be computed for the entire source space.
+    nave : int
+        Number of averages used to regularize the solution.
+        Set to 1 on single Epoch by default.
+    pick_ori : None | "normal"
+        If "normal", rather than pooling the orientations by taking the norm,
+        only the radial component is kept. This is only implemented
+        when working with loose orientations.
+    batch_size : int | None
+        Number of epochs processed together. If None, it is chosen so that
+        the source solution of each batch uses about 100 MB.
+    verbose : bool, str, int, or None
+        If not None, override default verbose level (see mne.verbose).
+
+    Returns
+    -------
+    data : array, shape (n_epochs, n_sources, n_times)
+        The source time courses of all epochs.
+    vertices : array | list of two arrays
+        The vertex numbers of the sources (see SourceEstimate).
+    """
+    method = _check_method(method)
+    pick_ori = _check_ori(pick_ori, None)
+
+    K, noise_norm, vertno, sel, is_free_ori = \
+        _prepare_inverse_epochs(epochs, inverse_operator, lambda2, method,
+                                label, nave, pick_ori)
+    n_sources = K.shape[0] // 3 if is_free_ori else K.shape[0]
+    n_times = len(epochs.times)
+    if batch_size is None:
+        batch_size = max(int(_max_nbytes // (8 * K.shape[0] * n_times)), 1)
+
+    data = list()
+    k = 0
+    for batch in _iter_epochs_batches(epochs, sel, batch_size):
+        logger.info('Processing epochs : %d - %d' % (k + 1, k + len(batch)))
+        sol = _apply_kernel_epochs(K, noise_norm, is_free_ori, batch)
+        data.append(np.ascontiguousarray(sol))
+        k += len(batch)
+    if len(data) == 0:
+        data = np.empty((0, n_sources, n_times))
+    else:
+        data = np.concatenate(data)
+    logger.info('[done]')
+
+    return data, vertno
+
+
+def _apply_inverse_epochs_labels_gen(epochs, inverse_operator, lambda2,
+                                     labels, method, mode, nave, pick_ori,
+                                     allow_empty):
+    """ see apply_inverse_epochs_labels """
+    method = _check_method(method)
+    pick_ori = _check_ori(pick_ori, None)
+    extractor = LabelExtractor(labels, inverse_operator['src'], mode=mode,
+                               allow_empty=allow_empty)
+
+    is_free_ori = (inverse_operator['source_ori'] == FIFF.FIFFV_MNE_FREE_ORI
+                   and pick_ori is None)
+    if is_free_ori or extractor.operator is None:
+        # the combination of the current components or the extraction mode
+        # is not linear: reduce the source estimates one by one
+        stcs = _apply_inverse_epochs_gen(epochs, inverse_operator, lambda2,
+                                         method=method, nave=nave,
+                                         pick_ori=pick_ori)
+        for label_tc in extractor.extract(stcs, return_generator=True):
+            yield label_tc
+        return
+
+    _check_ch_names(inverse_operator, epochs.info)
+    inv, K, noise_norm, _ = \
+        _prepare_inverse_kernel(inverse_operator, nave, lambda2, method,
+                                None, pick_ori)
+    sel = _pick_channels_inverse_operator(epochs.ch_names, inv)
+    logger.info('Picked %d channels from the data' % len(sel))
+    logger.info('Computing inverse...')
+    if noise_norm is not None:
+        K *= noise_norm
+    # apply the label extraction to the kernel: only a (n_labels x
+    # n_channels) kernel is applied to the data
+    K = extractor.operator * K
+    logger.info('Extracting time courses for %d labels (mode: %s)'
+                % (len(extractor.labels), mode))
+    for k, e in enumerate(epochs):
+        logger.info('Processing epoch : %d' % (k + 1))
+        yield np.dot(K, e[sel])
+
+    logger.info('[done]')
+
+
+@verbose
+@profiled
+def apply_inverse_epochs_labels(epochs, inverse_operator, lambda2, labels,
+                                method="dSPM", mode='mean_flip', nave=1,
+                                pick_ori=None, allow_empty=False,
+                                return_generator=False, verbose=None):
+    """Apply inverse operator to Epochs and extract label time courses
+
+    This is equivalent to apply_inverse_epochs followed by
+    extract_label_time_course, but for the linear cases (fixed orientation
+    or pick_ori="normal", and mode "mean" or "mean_flip") the label
+    extraction is applied to the inverse kernel. The source estimates
+    are then never computed, which saves time and memory.
+
+    Parameters
+    ----------
+    epochs : Epochs object
+        Single trial epochs.
+    inverse_operator : dict
+        Inverse operator read with mne.read_inverse_operator.
+    lambda2 : float
+        The regularization parameter.
+    labels : Label | list of Label
+        The labels for which to extract the time course.
+    method : "MNE" | "dSPM" | "sLORETA"
+        Use mininum norm, dSPM or sLORETA.
+    mode : str
+        Extraction mode, see mne.extract_label_time_course.
+    nave : int
+        Number of averages used to regularize the solution.
+        Set to 1 on single Epoch by default.
+    pick_ori : None | "normal"
+        If "normal", rather than pooling the orientations by taking the norm,
+        only the radial component is kept. This is only implemented
+        when working with loose orientations.
+    allow_empty : bool
+        Instead of emitting an error, return all-zero time courses for labels
+        that do not have any vertices in the source space.
+    return_generator : bool
+        Return a generator object instead of a list.
+    verbose : bool, str, int, or None
+        If not None, override default verbose level (see mne.verbose).
+
+    Returns
+    -------
+    label_tc : list (or generator) of array, shape=(len(labels), n_times)
+        Extracted time course for each label and epoch.
+    """
+    label_tc = _apply_inverse_epochs_labels_gen(epochs, inverse_operator,
+                                                lambda2, labels, method,
+                                                mode, nave, pick_ori,
+                                                allow_empty)
+    if not return_generator:
+        label_tc = list(label_tc)
+    return label_tc
+
+
 def _xyz2lf(Lf_xyz, normals):
     """Reorient leadfield to one component matching the normal to the cortex
 
@@ -1103,6 +1518,7 @@ def _prepare_forward(forward, info, noise_cov, pca=False, verbose=None):
 
 
 @verbose
+@profiled
 def make_inverse_operator(info, forward, noise_cov, loose=0.2, depth=0.8,
                           fixed=False, limit_depth_chs=True, verbose=None):
     """Assemble inverse operator
@@ -1172,47 +1588,109 @@ def make_inverse_operator(info, forward, noise_cov, loose=0.2, depth=0.8,
     weighting. Thus slightly different results are to be expected with
     and without this information.
     """
+    return make_inverse_operators(info, forward, noise_cov, loose=[loose],
+                                  depth=[depth], fixed=fixed,
+                                  limit_depth_chs=limit_depth_chs)[0]
+
+
+@verbose
+@profiled
+def make_inverse_operators(info, forward, noise_cov, loose=0.2, depth=0.8,
+                           fixed=False, limit_depth_chs=True, verbose=None):
+    """Assemble inverse operators for several loose and depth values
+
+    The channel selection, the noise covariance and the whitening of the
+    forward solution are done only once, and the depth-weighting prior is
+    computed once for each depth value.
+
+    Parameters
+    ----------
+    info : dict
+        The measurement info to specify the channels to include.
+        Bad channels in info['bads'] are not used.
+    forward : dict
+        Forward operator.
+    noise_cov : Covariance
+        The noise covariance matrix.
+    loose : None | float in [0, 1] | list
+        Value(s) that weight the source variances of the dipole components
+        defining the tangent space of the cortical surfaces (see
+        make_inverse_operator).
+    depth : None | float in [0, 1] | list
+        Depth weighting coefficient(s). None means no depth weighting.
+    fixed : bool
+        Use fixed source orientations normal to the cortical mantle. If True,
+        the loose parameter is ignored.
+    limit_depth_chs : bool
+        If True, use only grad channels in depth weighting (equivalent to MNE
+        C code). If grad chanels aren't present, only mag channels will be
+        used (if no mag, then eeg). If False, use all channels.
+    verbose : bool, str, int, or None
+        If not None, override default verbose level (see mne.verbose).
+
+    Returns
+    -------
+    invs : list of dict
+        Inverse operators for all the combinations of loose and depth,
+        ordered as [(l, d) for l in loose for d in depth].
+
+    Notes
+    -----
+    See make_inverse_operator for the forward solutions required by the
+    different types of inverse operators. The regularization parameter
+    lambda2 can be varied without assembling new operators, see
+    prepare_inverse_operators.
+    """
+    if not isinstance(loose, (list, tuple)):
+        loose = [loose]
+    if not isinstance(depth, (list, tuple)):
+        depth = [depth]
     is_fixed_ori = is_fixed_orient(forward)
 
-    if fixed and loose is not None:
+    if fixed and any(l is not None for l in loose):
         warnings.warn("When invoking make_inverse_operator with fixed=True, "
                       "the loose parameter is ignored.")
-        loose = None
+        loose = [None]
 
     if is_fixed_ori and not fixed:
         raise ValueError('Forward operator has fixed orientation and can only '
                          'be used to make a fixed-orientation inverse '
                          'operator.')
-    if fixed:
-        if depth is not None:
-            if is_fixed_ori or not forward['surf_ori']:
+    for this_depth in depth:
+        if fixed:
+            if this_depth is not None:
+                if is_fixed_ori or not forward['surf_ori']:
+                    raise ValueError('For a fixed orientation inverse '
+                                     'solution with depth weighting, the '
+                                     'forward solution must be '
+                                     'free-orientation and in surface '
+                                     'orientation')
+            elif forward['surf_ori'] is False:
                 raise ValueError('For a fixed orientation inverse solution '
-                                 'with depth weighting, the forward solution '
-                                 'must be free-orientation and in surface '
-                                 'orientation')
-        elif forward['surf_ori'] is False:
-            raise ValueError('For a fixed orientation inverse solution '
-                             'without depth weighting, the forward solution '
-                             'must be in surface orientation')
-
-    # depth=None can use fixed fwd, depth=0<x<1 must use free ori
-    if depth is not None:
-        if not (0 < depth <= 1):
-            raise ValueError('depth should be a scalar between 0 and 1')
-        if is_fixed_ori or not forward['surf_ori']:
-            raise ValueError('You need a free-orientation, surface-oriented '
-                             'forward solution to do depth weighting even '
-                             'when calculating a fixed-orientation inverse.')
-
-    if loose is not None:
-        if not (0 <= loose <= 1):
-            raise ValueError('loose value should be smaller than 1 and bigger '
-                             'than 0, or None for not loose orientations.')
-        if loose < 1 and not forward['surf_ori']:
-            raise ValueError('Forward operator is not oriented in surface '
-                             'coordinates. A loose inverse operator requires '
-                             'a surface-based, free orientation forward '
-                             'operator.')
+                                 'without depth weighting, the forward '
+                                 'solution must be in surface orientation')
+
+        # depth=None can use fixed fwd, depth=0<x<1 must use free ori
+        if this_depth is not None:
+            if not (0 < this_depth <= 1):
+                raise ValueError('depth should be a scalar between 0 and 1')
+            if is_fixed_ori or not forward['surf_ori']:
+                raise ValueError('You need a free-orientation, '
+                                 'surface-oriented forward solution to do '
+                                 'depth weighting even when calculating a '
+                                 'fixed-orientation inverse.')
+
+    for this_loose in loose:
+        if this_loose is not None:
+            if not (0 <= this_loose <= 1):
+                raise ValueError('loose value should be smaller than 1 and '
+                                 'bigger than 0, or None for not loose '
+                                 'orientations.')
+            if this_loose < 1 and not forward['surf_ori']:
+                raise ValueError('Forward operator is not oriented in surface '
+                                 'coordinates. A loose inverse operator '
+                                 'requires a surface-based, free orientation '
+                                 'forward operator.')
 
     #
     # 1. Read the bad channels
@@ -1225,26 +1703,30 @@ def make_inverse_operator(info, forward, noise_cov, loose=0.2, depth=0.8,
         _prepare_forward(forward, info, noise_cov)
 
     #
-    # 5. Compose the depth-weighting matrix
+    # 5. Compose the depth-weighting matrices
     #
 
-    if depth is not None:
-        patch_areas = forward.get('patch_areas', None)
-        depth_prior = compute_depth_prior(gain, gain_info, is_fixed_ori,
-                                          exp=depth, patch_areas=patch_areas,
-                                          limit_depth_chs=limit_depth_chs)
-    else:
-        depth_prior = np.ones(gain.shape[1], dtype=gain.dtype)
+    depth_priors = list()
+    for this_depth in depth:
+        if this_depth is not None:
+            patch_areas = forward.get('patch_areas', None)
+            depth_prior = compute_depth_prior(gain, gain_info, is_fixed_ori,
+                                              exp=this_depth,
+                                              patch_areas=patch_areas,
+                                              limit_depth_chs=limit_depth_chs)
+        else:
+            depth_prior = np.ones(gain.shape[1], dtype=gain.dtype)
+        depth_priors.append(depth_prior)
 
     # Deal with fixed orientation forward / inverse
     if fixed:
-        if depth is not None:
+        if any(d is not None for d in depth):
             # Convert the depth prior into a fixed-orientation one
             logger.info('    Picked elements from a free-orientation '
                         'depth-weighting prior into the fixed-orientation one')
         if not is_fixed_ori:
             # Convert to the fixed orientation forward solution now
-            depth_prior = depth_prior[2::3]
+            depth_priors = [d[2::3] for d in depth_priors]
             forward = deepcopy(forward)
             _to_fixed_ori(forward)
             is_fixed_ori = is_fixed_orient(forward)
@@ -1254,6 +1736,57 @@ def make_inverse_operator(info, forward, noise_cov, loose=0.2, depth=0.8,
     logger.info("Computing inverse operator with %d channels."
                 % len(gain_info['ch_names']))
 
+    # 7. Apply fMRI weighting (not done)
+
+    #
+    # 8. Apply the linear projection to the forward solution
+    # 9. Apply whitening to the forward computation matrix
+    #
+    logger.info('Whitening the forward solution.')
+    gain = np.dot(whitener, gain)
+
+    # 10. Exclude the source space points within the labels (not done)
+
+    # Handle methods
+    has_meg = False
+    has_eeg = False
+    ch_idx = [k for k, c in enumerate(info['chs'])
+                                    if c['ch_name'] in gain_info['ch_names']]
+    for idx in ch_idx:
+        ch_type = channel_type(info, idx)
+        if ch_type == 'eeg':
+            has_eeg = True
+        if (ch_type == 'mag') or (ch_type == 'grad'):
+            has_meg = True
+    if has_eeg and has_meg:
+        methods = FIFF.FIFFV_MNE_MEG_EEG
+    elif has_meg:
+        methods = FIFF.FIFFV_MNE_MEG
+    else:
+        methods = FIFF.FIFFV_MNE_EEG
+
+    inv_ops = list()
+    for this_loose in loose:
+        # apply loose orientations
+        if not is_fixed_ori:
+            orient_prior = compute_orient_prior(forward, loose=this_loose)
+        else:
+            orient_prior = None
+        for this_depth, depth_prior in zip(depth, depth_priors):
+            inv_op = _make_inverse_operator(info, forward, gain_info, gain,
+                                            noise_cov, n_nzero, depth_prior,
+                                            orient_prior, methods)
+            # We set this for consistency with mne C code written inverses
+            if this_depth is None:
+                inv_op['depth_prior'] = None
+            inv_ops.append(inv_op)
+
+    return inv_ops
+
+
+def _make_inverse_operator(info, forward, gain_info, gain, noise_cov,
+                           n_nzero, depth_prior, orient_prior, methods):
+    """Helper to assemble an inverse from the whitened gain and the priors"""
     #
     # 6. Compose the source covariance matrix
     #
@@ -1265,28 +1798,13 @@ def make_inverse_operator(info, forward, noise_cov, loose=0.2, depth=0.8,
                        eigvec=None, dim=depth_prior.size, nfree=1,
                        projs=[])
 
-    # apply loose orientations
-    if not is_fixed_ori:
-        orient_prior = compute_orient_prior(forward, loose=loose)
+    if orient_prior is not None:
         source_cov *= orient_prior
         orient_prior = dict(data=orient_prior,
                             kind=FIFF.FIFFV_MNE_ORIENT_PRIOR_COV,
                             bads=[], diag=True, names=[], eig=None,
                             eigvec=None, dim=orient_prior.size, nfree=1,
                             projs=[])
-    else:
-        orient_prior = None
-
-    # 7. Apply fMRI weighting (not done)
-
-    #
-    # 8. Apply the linear projection to the forward solution
-    # 9. Apply whitening to the forward computation matrix
-    #
-    logger.info('Whitening the forward solution.')
-    gain = np.dot(whitener, gain)
-
-    # 10. Exclude the source space points within the labels (not done)
 
     #
     # 11. Do appropriate source weighting to the forward computation matrix
@@ -1296,7 +1814,7 @@ def make_inverse_operator(info, forward, noise_cov, loose=0.2, depth=0.8,
     # to number of sensors.
     logger.info('Adjusting source covariance matrix.')
     source_std = np.sqrt(source_cov)
-    gain *= source_std[None, :]
+    gain = gain * source_std[None, :]
     trace_GRGT = linalg.norm(gain, ord='fro') ** 2
     scaling_source_cov = n_nzero / trace_GRGT
     source_cov *= scaling_source_cov
@@ -1328,30 +1846,9 @@ def make_inverse_operator(info, forward, noise_cov, loose=0.2, depth=0.8,
                        col_names=[])
     nave = 1.0
 
-    # Handle methods
-    has_meg = False
-    has_eeg = False
-    ch_idx = [k for k, c in enumerate(info['chs'])
-                                    if c['ch_name'] in gain_info['ch_names']]
-    for idx in ch_idx:
-        ch_type = channel_type(info, idx)
-        if ch_type == 'eeg':
-            has_eeg = True
-        if (ch_type == 'mag') or (ch_type == 'grad'):
-            has_meg = True
-    if has_eeg and has_meg:
-        methods = FIFF.FIFFV_MNE_MEG_EEG
-    elif has_meg:
-        methods = FIFF.FIFFV_MNE_MEG
-    else:
-        methods = FIFF.FIFFV_MNE_EEG
-
-    # We set this for consistency with mne C code written inverses
-    if depth is None:
-        depth_prior = None
     inv_op = dict(eigen_fields=eigen_fields, eigen_leads=eigen_leads,
                   sing=sing, nave=nave, depth_prior=depth_prior,
-                  source_cov=source_cov, noise_cov=noise_cov,
+                  source_cov=source_cov, noise_cov=deepcopy(noise_cov),
                   orient_prior=orient_prior, projs=deepcopy(info['projs']),
                   eigen_leads_weighted=False, source_ori=forward['source_ori'],
                   mri_head_t=deepcopy(forward['mri_head_t']),
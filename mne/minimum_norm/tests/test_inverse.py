@@ -1,7 +1,8 @@
 from __future__ import print_function
 import os.path as op
 import numpy as np
-from numpy.testing import assert_array_almost_equal, assert_equal
+from numpy.testing import (assert_array_almost_equal, assert_equal,
+                           assert_array_equal, assert_allclose)
 from scipy import sparse
 from nose.tools import assert_true, assert_raises
 import copy
@@ -11,13 +12,21 @@ from mne.datasets import sample
 from mne.label import read_label, label_sign_flip
 from mne.event import read_events
 from mne.epochs import Epochs
-from mne.source_estimate import read_source_estimate, VolSourceEstimate
+from mne.source_estimate import (read_source_estimate, VolSourceEstimate,
+                                 extract_label_time_course)
 from mne import fiff, read_cov, read_forward_solution
 from mne.minimum_norm.inverse import (apply_inverse, read_inverse_operator,
                                       apply_inverse_raw, apply_inverse_epochs,
+                                      apply_inverse_epochs_data,
+                                      apply_inverse_epochs_labels,
                                       make_inverse_operator,
+                                      make_inverse_operators,
+                                      prepare_inverse_operator,
+                                      prepare_inverse_operators,
                                       write_inverse_operator,
-                                      compute_rank_inverse)
+                                      compute_rank_inverse,
+                                      clear_inverse_cache)
+from mne.minimum_norm import inverse
 from mne.utils import _TempDir
 from ...externals import six
 
@@ -205,6 +214,78 @@ def test_apply_inverse_operator():
     assert_array_almost_equal(stc.data, my_stc.data, 2)
 
 
+@sample.requires_sample_data
+def test_make_inverse_operators():
+    """Test assembling and preparing inverse operators for several values
+    """
+    evoked = _get_evoked()
+    noise_cov = read_cov(fname_cov)
+    fwd_op = read_forward_solution(fname_fwd, surf_ori=True)
+    looses, depths = [0.2, 1.], [0.8, None]
+    inv_ops = make_inverse_operators(evoked.info, fwd_op, noise_cov,
+                                     loose=looses, depth=depths)
+    assert_equal(len(inv_ops), 4)
+    for inv_op, (loose, depth) in zip(inv_ops, [(l, d) for l in looses
+                                                for d in depths]):
+        inv_op_2 = make_inverse_operator(evoked.info, fwd_op, noise_cov,
+                                         loose=loose, depth=depth)
+        assert_array_almost_equal(inv_op['sing'], inv_op_2['sing'])
+        assert_array_almost_equal(inv_op['source_cov']['data'],
+                                  inv_op_2['source_cov']['data'])
+        assert_equal(inv_op['depth_prior'] is None, depth is None)
+
+    lambda2s = [1. / 9., 1., 0.01]
+    for method in ('MNE', 'dSPM', 'sLORETA'):
+        invs = prepare_inverse_operators(inv_ops[0], 1, lambda2s, method)
+        assert_equal(len(invs), 3)
+        for inv, this_lambda2 in zip(invs, lambda2s):
+            inv_2 = prepare_inverse_operator(inv_ops[0], 1, this_lambda2,
+                                             method)
+            assert_array_almost_equal(inv['reginv'], inv_2['reginv'])
+            assert_array_almost_equal(inv['noisenorm'], inv_2['noisenorm'])
+    assert_raises(ValueError, prepare_inverse_operators, inv_ops[0], 0,
+                  lambda2s, 'MNE')
+
+
+@sample.requires_sample_data
+def test_inverse_cache():
+    """Test caching of prepared inverse operators and kernels
+    """
+    inverse_operator = read_inverse_operator(fname_inv)
+    evoked = _get_evoked()
+    clear_inverse_cache()
+    stc = apply_inverse(evoked, inverse_operator, lambda2, "dSPM")
+    assert_equal(len(inverse._inverse_cache), 2)  # operator and kernel
+    stc_2 = apply_inverse(evoked, inverse_operator, lambda2, "dSPM")
+    assert_equal(len(inverse._inverse_cache), 2)
+    assert_array_equal(stc.data, stc_2.data)
+
+    # another regularization is another entry
+    stc_2 = apply_inverse(evoked, inverse_operator, lambda2 / 2., "dSPM")
+    assert_equal(len(inverse._inverse_cache), 4)
+    assert_true(not np.allclose(stc.data, stc_2.data))
+
+    # modified copies of the operator are detected
+    inv_2 = copy.deepcopy(inverse_operator)
+    inv_2['sing'] = 2 * inv_2['sing']
+    stc_2 = apply_inverse(evoked, inv_2, lambda2, "dSPM")
+    assert_equal(len(inverse._inverse_cache), 6)
+    assert_true(not np.allclose(stc.data, stc_2.data))
+
+    # and so are operators modified in place
+    inv_2['sing'] /= 2.
+    stc_2 = apply_inverse(evoked, inv_2, lambda2, "dSPM")
+    assert_allclose(stc.data, stc_2.data)
+    inv_2['source_cov']['data'] *= 2.
+    stc_2 = apply_inverse(evoked, inv_2, lambda2, "dSPM")
+    assert_true(not np.allclose(stc.data, stc_2.data))
+
+    clear_inverse_cache()
+    assert_equal(len(inverse._inverse_cache), 0)
+    stc_2 = apply_inverse(evoked, inverse_operator, lambda2, "dSPM")
+    assert_array_equal(stc.data, stc_2.data)
+
+
 @sample.requires_sample_data
 def test_make_inverse_operator_fixed():
     """Test MNE inverse computation (fixed orientation)
@@ -344,6 +425,15 @@ def test_apply_mne_inverse_raw():
         assert_array_almost_equal(stc2.times, times)
         assert_array_almost_equal(stc.data, stc2.data)
 
+        # write the source time courses to a memmap, segment by segment
+        stc3 = apply_inverse_raw(raw, inverse_operator, lambda2, "dSPM",
+                                 label=label_lh, start=start, stop=stop,
+                                 nave=1, pick_ori=pick_ori, buffer_size=3,
+                                 data_buffer=op.join(tempdir, 'stc.dat'))
+        assert_true(isinstance(stc3.data, np.memmap))
+        assert_array_almost_equal(stc3.times, times)
+        assert_array_almost_equal(stc.data, stc3.data)
+
 
 @sample.requires_sample_data
 def test_apply_mne_inverse_fixed_raw():
@@ -429,6 +519,44 @@ def test_apply_mne_inverse_epochs():
     assert_true(label_stc.subject == 'sample')
     assert_array_almost_equal(stcs_rh[0].data, label_stc.data)
 
+    # test extracting label time courses directly
+    labels = [label_lh, label_rh]
+    for pick_ori, mode in ((None, 'mean_flip'), ('normal', 'mean'),
+                           ('normal', 'mean_flip'), ('normal', 'max')):
+        stcs = apply_inverse_epochs(epochs, inverse_operator, lambda2,
+                                    "dSPM", pick_ori=pick_ori)
+        label_tc = extract_label_time_course(stcs, labels,
+                                             inverse_operator['src'],
+                                             mode=mode)
+        label_tc_2 = apply_inverse_epochs_labels(epochs, inverse_operator,
+                                                 lambda2, labels, "dSPM",
+                                                 mode=mode, pick_ori=pick_ori)
+        assert_equal(len(label_tc), len(label_tc_2))
+        for tc1, tc2 in zip(label_tc, label_tc_2):
+            assert_true(tc2.shape == (2, len(epochs.times)))
+            assert_array_almost_equal(tc1, tc2)
+
+    # test batched computation
+    for pick_ori in (None, 'normal'):
+        stcs = apply_inverse_epochs(epochs, inverse_operator, lambda2,
+                                    "dSPM", label=label_lh, pick_ori=pick_ori)
+        stcs_2 = apply_inverse_epochs(epochs, inverse_operator, lambda2,
+                                      "dSPM", label=label_lh,
+                                      pick_ori=pick_ori, batch_size=3)
+        data, vertno = apply_inverse_epochs_data(epochs, inverse_operator,
+                                                 lambda2, "dSPM",
+                                                 label=label_lh,
+                                                 pick_ori=pick_ori,
+                                                 batch_size=3)
+        assert_equal(len(stcs), len(stcs_2))
+        assert_equal(data.shape, (len(stcs),) + stcs[0].shape)
+        assert_array_equal(vertno[0], stcs[0].vertno[0])
+        for stc, stc_2, this_data in zip(stcs, stcs_2, data):
+            assert_array_almost_equal(stc.data, stc_2.data)
+            assert_array_almost_equal(stc.data, this_data)
+            # the stcs do not share the data of their batch
+            assert_true(stc_2.data.base is None)
+
 
 @sample.requires_sample_data
 def test_make_inverse_operator_bads():
@@ -14,7 +14,7 @@ from ..time_frequency.tfr import cwt, morlet
 from ..time_frequency.multitaper import (dpss_windows, _psd_from_mt,
                                          _psd_from_mt_adaptive, _mt_spectra)
 from ..baseline import rescale
-from .inverse import (combine_xyz, prepare_inverse_operator, _assemble_kernel,
+from .inverse import (combine_xyz, _prepare_inverse_kernel,
                       _pick_channels_inverse_operator, _check_method,
                       _check_ori, _subject_from_inverse)
 from ..parallel import parallel_func
@@ -201,13 +201,6 @@ def _source_induced_power(epochs, inverse_operator, frequencies, label=None,
     #
     epochs_data = epochs.get_data()
 
-    inv = prepare_inverse_operator(inverse_operator, nave, lambda2, method)
-    #
-    #   Pick the correct channels from the data
-    #
-    sel = _pick_channels_inverse_operator(epochs.ch_names, inv)
-    logger.info('Picked %d channels from the data' % len(sel))
-    logger.info('Computing inverse...')
     #
     #   Simple matrix multiplication followed by combination of the
     #   three current components
@@ -215,7 +208,15 @@ def _source_induced_power(epochs, inverse_operator, frequencies, label=None,
     #   This does all the data transformations to compute the weights for the
     #   eigenleads
     #
-    K, noise_norm, vertno = _assemble_kernel(inv, label, method, pick_ori)
+    inv, K, noise_norm, vertno = \
+        _prepare_inverse_kernel(inverse_operator, nave, lambda2, method,
+                                label, pick_ori)
+    #
+    #   Pick the correct channels from the data
+    #
+    sel = _pick_channels_inverse_operator(epochs.ch_names, inv)
+    logger.info('Picked %d channels from the data' % len(sel))
+    logger.info('Computing inverse...')
 
     if pca:
         U, s, Vh = linalg.svd(K, full_matrices=False)
@@ -388,7 +389,9 @@ def compute_source_psd(raw, inverse_operator, lambda2=1. / 9., method="dSPM",
 
     logger.info('Considering frequencies %g ... %g Hz' % (fmin, fmax))
 
-    inv = prepare_inverse_operator(inverse_operator, nave, lambda2, method)
+    inv, K, noise_norm, vertno = \
+        _prepare_inverse_kernel(inverse_operator, nave, lambda2, method,
+                                label, pick_ori)
     is_free_ori = inverse_operator['source_ori'] == FIFF.FIFFV_MNE_FREE_ORI
 
     #
@@ -397,14 +400,6 @@ def compute_source_psd(raw, inverse_operator, lambda2=1. / 9., method="dSPM",
     sel = _pick_channels_inverse_operator(raw.ch_names, inv)
     logger.info('Picked %d channels from the data' % len(sel))
     logger.info('Computing inverse...')
-    #
-    #   Simple matrix multiplication followed by combination of the
-    #   three current components
-    #
-    #   This does all the data transformations to compute the weights for the
-    #   eigenleads
-    #
-    K, noise_norm, vertno = _assemble_kernel(inv, label, method, pick_ori)
 
     if pca:
         U, s, Vh = linalg.svd(K, full_matrices=False)
@@ -476,7 +471,9 @@ def _compute_source_psd_epochs(epochs, inverse_operator, lambda2=1. / 9.,
 
     logger.info('Considering frequencies %g ... %g Hz' % (fmin, fmax))
 
-    inv = prepare_inverse_operator(inverse_operator, nave, lambda2, method)
+    inv, K, noise_norm, vertno = \
+        _prepare_inverse_kernel(inverse_operator, nave, lambda2, method,
+                                label, pick_ori)
     is_free_ori = inverse_operator['source_ori'] == FIFF.FIFFV_MNE_FREE_ORI
 
     #
@@ -485,14 +482,6 @@ def _compute_source_psd_epochs(epochs, inverse_operator, lambda2=1. / 9.,
     sel = _pick_channels_inverse_operator(epochs.ch_names, inv)
     logger.info('Picked %d channels from the data' % len(sel))
     logger.info('Computing inverse...')
-    #
-    #   Simple matrix multiplication followed by combination of the
-    #   three current components
-    #
-    #   This does all the data transformations to compute the weights for the
-    #   eigenleads
-    #
-    K, noise_norm, vertno = _assemble_kernel(inv, label, method, pick_ori)
 
     if pca:
         U, s, Vh = linalg.svd(K, full_matrices=False)
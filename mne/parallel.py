@@ -10,6 +10,8 @@ import inspect
 import logging
 import os
 
+import numpy as np
+
 from . import get_config
 from .utils import logger, verbose
 
@@ -18,6 +20,17 @@ if 'MNE_FORCE_SERIAL' in os.environ:
 else:
     _force_serial = None
 
+# Rough per-task overhead of dispatching a job (pickling arguments, IPC and
+# result collection), in seconds. Chunks are made at least this expensive.
+_task_overhead = 0.01
+# Number of chunks per job used when tasks may be uneven, so that idle
+# workers can pick up remaining chunks while slow ones finish
+_oversubscribe = 4
+# Default memory budget of each chunk (in bytes), for the temporary arrays of
+# the chunks of work processed by chunk_jobs callers
+_max_nbytes = 100e6
+
+
 @verbose
 def parallel_func(func, n_jobs, verbose=None, max_nbytes='auto'):
     """Return parallel instance with delayed function
@@ -146,3 +159,81 @@ def check_n_jobs(n_jobs, allow_cuda=False):
                 n_jobs = 1
 
     return n_jobs
+
+
+def chunk_jobs(n_items, n_jobs, cost=None, nbytes=None, max_nbytes=None,
+               uneven=None):
+    """Split work items into chunks suitable for parallel_func
+
+    The number of chunks is chosen from the estimated cost of each item,
+    the amount of data that has to be sent to the workers, and the number
+    of jobs. Cheap items are grouped so the per-task dispatch overhead is
+    amortized, while uneven workloads are split in more chunks than jobs
+    so that workers which finish early pull the remaining chunks from the
+    queue (joblib dispatches tasks on demand).
+
+    Parameters
+    ----------
+    n_items : int
+        The number of work items.
+    n_jobs : int
+        The number of jobs (as returned by parallel_func).
+    cost : float | array of float | None
+        The estimated cost (in seconds) of each item. Can be a scalar if all
+        items have the same cost, or an array of length n_items. If None,
+        items are assumed to be expensive compared to the dispatch overhead.
+    nbytes : int | array of int | None
+        The number of bytes that must be sent to the workers for each item.
+    max_nbytes : int | None
+        Maximum number of bytes per chunk. Used with nbytes to bound the
+        memory used by each task. If None, the default budget of 100 MB is
+        used.
+    uneven : bool | None
+        If True, create more chunks than jobs to balance the load. If None,
+        it is True when ``cost`` is an array with varying entries.
+
+    Returns
+    -------
+    chunks : list of slice
+        Contiguous slices covering range(n_items), in order.
+    """
+    n_items = int(n_items)
+    if n_items <= 0:
+        return list()
+    n_jobs = max(int(n_jobs), 1)
+    if cost is None:
+        cost = np.ones(n_items)
+        min_cost = 0.
+    else:
+        cost = np.ones(n_items) * np.asarray(cost, float)
+        if cost.shape != (n_items,):
+            raise ValueError('cost must be a scalar or have n_items entries')
+        min_cost = _task_overhead
+    if uneven is None:
+        uneven = cost.size > 1 and np.ptp(cost) > 0.1 * np.mean(cost)
+    total_cost = cost.sum()
+
+    # as many chunks as allowed by the dispatch overhead
+    n_chunks = n_jobs * (_oversubscribe if uneven else 1)
+    if min_cost > 0:
+        n_chunks = min(n_chunks, int(total_cost // min_cost))
+    n_chunks = max(n_chunks, 1)
+    # but enough chunks to respect the memory budget
+    if nbytes is not None:
+        if max_nbytes is None:
+            max_nbytes = _max_nbytes
+        total_nbytes = np.sum(np.ones(n_items) * nbytes)
+        n_chunks = max(n_chunks, int(np.ceil(total_nbytes /
+                                             float(max_nbytes))))
+    n_chunks = min(n_chunks, n_items)
+
+    # split in contiguous chunks of approximately equal cost
+    cum_cost = np.cumsum(cost)
+    targets = total_cost * np.arange(1, n_chunks) / float(n_chunks)
+    bounds = np.searchsorted(cum_cost, targets, side='right')
+    bounds = np.unique(np.r_[0, bounds, n_items])
+    chunks = [slice(int(start), int(stop)) for start, stop
+              in zip(bounds[:-1], bounds[1:]) if stop > start]
+    logger.debug('Split %d items in %d chunks for %d jobs'
+                 % (n_items, len(chunks), n_jobs))
+    return chunks
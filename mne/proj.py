@@ -12,8 +12,6 @@ from .fiff.proj import Projection, _has_eeg_average_ref_proj
 from .event import make_fixed_length_events
 from .parallel import parallel_func
 from .cov import _check_n_samples
-from .forward import (is_fixed_orient, _subject_from_forward,
-                      convert_forward_solution)
 from .source_estimate import SourceEstimate
 from .fiff.proj import make_projector, make_eeg_average_ref_proj
 
@@ -281,6 +279,8 @@ def sensitivity_map(fwd, projs=None, ch_type='grad', mode='fixed', exclude=[],
         raise ValueError('Unknown mode type (got %s)' % mode)
 
     # check forward
+    from .forward import (is_fixed_orient, _subject_from_forward,
+                          convert_forward_solution)
     if is_fixed_orient(fwd, orig=True):
         raise ValueError('fwd should must be computed with free orientation')
     fwd = convert_forward_solution(fwd, surf_ori=True, force_fixed=False,
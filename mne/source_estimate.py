@@ -8,7 +8,9 @@
 from .externals.six import string_types
 import os
 import copy
-from math import ceil
+import gzip
+import hashlib
+import weakref
 import numpy as np
 from scipy import linalg, sparse
 from scipy.sparse import csr_matrix, coo_matrix
@@ -16,13 +18,12 @@ import warnings
 
 from .filter import resample
 from .fiff.evoked import _get_peak
-from .parallel import parallel_func
+from .parallel import check_n_jobs, chunk_jobs
 from .surface import (read_surface, _get_ico_surface, read_morph_map,
                       _compute_nearest)
 from .utils import (get_subjects_dir, _check_subject,
                     _check_pandas_index_arguments, _check_pandas_installed,
-                    logger, verbose)
-from .viz import plot_source_estimates
+                    logger, verbose, profiled, get_config, _LRUCache)
 from .fixes import in1d
 from .externals.six.moves import zip
 
@@ -371,7 +372,9 @@ class _BaseSourceEstimate(object):
         The data in source space. The data can either be a single array or
         a tuple with two arrays: "kernel" shape (n_vertices, n_sensors) and
         "sens_data" shape (n_sensors, n_times). In this case, the source
-        space data corresponds to "numpy.dot(kernel, sens_data)".
+        space data corresponds to "numpy.dot(kernel, sens_data)". It is only
+        computed when the data attribute is accessed, or by operations that
+        cannot work on the kernel and sensor data (e.g., resample).
     vertices : array | list of two arrays
         Vertex numbers corresponding to the data.
     tmin : scalar
@@ -456,6 +459,25 @@ class _BaseSourceEstimate(object):
             self._kernel = None
             self._sens_data = None
 
+    def _is_factored(self):
+        """Whether the data are stored as (kernel, sens_data)"""
+        return self._kernel is not None and self._sens_data is not None
+
+    def _same_kernel(self, other):
+        """Whether other stores its data with the same kernel"""
+        if not (self._is_factored() and isinstance(other, _BaseSourceEstimate)
+                and other._is_factored()):
+            return False
+        return (self._kernel is other._kernel or
+                (self._kernel.shape == other._kernel.shape and
+                 np.array_equal(self._kernel, other._kernel)))
+
+    def _data_rows(self, idx):
+        """Get the data of some sources without computing all of them"""
+        if self._is_factored():
+            return np.dot(self._kernel[idx], self._sens_data)
+        return self.data[idx]
+
     def crop(self, tmin=None, tmax=None):
         """Restrict SourceEstimate to a time interval
 
@@ -542,6 +564,10 @@ class _BaseSourceEstimate(object):
         return stc
 
     def __iadd__(self, a):
+        if self._same_kernel(a):
+            _verify_source_estimate_compat(self, a)
+            self._sens_data = self._sens_data + a._sens_data
+            return self
         self._remove_kernel_sens_data_()
         if isinstance(a, _BaseSourceEstimate):
             _verify_source_estimate_compat(self, a)
@@ -558,12 +584,16 @@ class _BaseSourceEstimate(object):
         stc : instance of SourceEstimate
             The modified stc (note: method operates inplace).
         """
-        data = self.data
-        tmax = self.tmin + self.tstep * data.shape[1]
+        tmax = self.tmin + self.tstep * self.shape[1]
         tmin = (self.tmin + tmax) / 2.
         tstep = tmax - self.tmin
-        mean_stc = SourceEstimate(self.data.mean(axis=1)[:, np.newaxis],
-                                  vertices=self.vertno, tmin=tmin,
+        if self._is_factored():
+            # the mean is linear, take it in sensor space
+            data = (self._kernel,
+                    self._sens_data.mean(axis=1)[:, np.newaxis])
+        else:
+            data = self.data.mean(axis=1)[:, np.newaxis]
+        mean_stc = SourceEstimate(data, vertices=self.vertno, tmin=tmin,
                                   tstep=tstep, subject=self.subject)
         return mean_stc
 
@@ -573,6 +603,10 @@ class _BaseSourceEstimate(object):
         return stc
 
     def __isub__(self, a):
+        if self._same_kernel(a):
+            _verify_source_estimate_compat(self, a)
+            self._sens_data = self._sens_data - a._sens_data
+            return self
         self._remove_kernel_sens_data_()
         if isinstance(a, _BaseSourceEstimate):
             _verify_source_estimate_compat(self, a)
@@ -593,6 +627,9 @@ class _BaseSourceEstimate(object):
         return self.__idiv__(a)
 
     def __idiv__(self, a):
+        if self._is_factored() and np.isscalar(a):
+            self._kernel = self._kernel / a
+            return self
         self._remove_kernel_sens_data_()
         if isinstance(a, _BaseSourceEstimate):
             _verify_source_estimate_compat(self, a)
@@ -607,6 +644,9 @@ class _BaseSourceEstimate(object):
         return stc
 
     def __imul__(self, a):
+        if self._is_factored() and np.isscalar(a):
+            self._kernel = self._kernel * a
+            return self
         self._remove_kernel_sens_data_()
         if isinstance(a, _BaseSourceEstimate):
             _verify_source_estimate_compat(self, a)
@@ -639,6 +679,9 @@ class _BaseSourceEstimate(object):
 
     def __neg__(self):
         stc = copy.deepcopy(self)
+        if stc._is_factored():
+            stc._kernel *= -1
+            return stc
         stc._remove_kernel_sens_data_()
         stc._data *= -1
         return stc
@@ -687,12 +730,15 @@ class _BaseSourceEstimate(object):
             tstop = self.times[-1]
 
         times = np.arange(tstart, tstop + self.tstep, width)
-        nv, _ = self.shape
         nt = len(times) - 1
-        data = np.empty((nv, nt), dtype=self.data.dtype)
+        # linear summaries can be computed in sensor space
+        factored = self._is_factored() and func in (np.mean, np.sum)
+        data = self._sens_data if factored else self.data
+        data_bin = np.empty((data.shape[0], nt), dtype=data.dtype)
         for i in range(nt):
             idx = (self.times >= times[i]) & (self.times < times[i + 1])
-            data[:, i] = func(self.data[:, idx], axis=1)
+            data_bin[:, i] = func(data[:, idx], axis=1)
+        data = (self._kernel, data_bin) if factored else data_bin
 
         tmin = times[0] + width / 2.
         stc = _make_stc(data, vertices=self.vertno,
@@ -1011,8 +1057,8 @@ class SourceEstimate(_BaseSourceEstimate):
         if ftype not in ['stc', 'w']:
             raise ValueError('ftype must be "stc" or "w", not "%s"' % ftype)
 
-        lh_data = self.data[:len(self.lh_vertno)]
-        rh_data = self.data[-len(self.rh_vertno):]
+        lh_data = self._data_rows(slice(None, len(self.lh_vertno)))
+        rh_data = self._data_rows(slice(len(self.lh_vertno), None))
 
         if ftype == 'stc':
             logger.info('Writing STC to disk...')
@@ -1077,11 +1123,9 @@ class SourceEstimate(_BaseSourceEstimate):
 
         # find data
         if label.hemi == 'rh':
-            values = self.data[idx + len(self.vertno[0])]
-        else:
-            values = self.data[idx]
+            idx = idx + len(self.vertno[0])
 
-        return vertices, values
+        return vertices, idx
 
     def in_label(self, label):
         """Returns a SourceEstimate object restricted to a label
@@ -1104,15 +1148,15 @@ class SourceEstimate(_BaseSourceEstimate):
                                                             self.subject))
 
         if label.hemi == 'both':
-            lh_vert, lh_val = self._hemilabel_stc(label.lh)
-            rh_vert, rh_val = self._hemilabel_stc(label.rh)
+            lh_vert, lh_idx = self._hemilabel_stc(label.lh)
+            rh_vert, rh_idx = self._hemilabel_stc(label.rh)
             vertices = [lh_vert, rh_vert]
-            values = np.vstack((lh_val, rh_val))
+            idx = np.concatenate((lh_idx, rh_idx))
         elif label.hemi == 'lh':
-            lh_vert, values = self._hemilabel_stc(label)
+            lh_vert, idx = self._hemilabel_stc(label)
             vertices = [lh_vert, np.array([])]
         elif label.hemi == 'rh':
-            rh_vert, values = self._hemilabel_stc(label)
+            rh_vert, idx = self._hemilabel_stc(label)
             vertices = [np.array([]), rh_vert]
         else:
             raise TypeError("Expected  Label or BiHemiLabel; got %r" % label)
@@ -1120,6 +1164,12 @@ class SourceEstimate(_BaseSourceEstimate):
         if sum([len(v) for v in vertices]) == 0:
             raise ValueError('No vertices match the label in the stc file')
 
+        if self._is_factored():
+            # keep only the rows of the kernel
+            values = (self._kernel[idx], self._sens_data)
+        else:
+            values = self.data[idx]
+
         label_stc = SourceEstimate(values, vertices=vertices,
                                    tmin=self.tmin, tstep=self.tstep,
                                    subject=self.subject)
@@ -1374,6 +1424,7 @@ class SourceEstimate(_BaseSourceEstimate):
         brain : Brain
             A instance of surfer.viz.Brain from PySurfer.
         """
+        from .viz import plot_source_estimates
         brain = plot_source_estimates(self, subject, surface=surface,
                         hemi=hemi, colormap=colormap, time_label=time_label,
                         smoothing_steps=smoothing_steps, fmin=fmin, fmid=fmid,
@@ -1735,14 +1786,15 @@ def mesh_dist(tris, vert):
 
 
 @verbose
-def _morph_buffer(data, idx_use, e, smooth, n_vertices, nearest, maps,
-                  verbose=None):
-    """Morph data from one subject's source space to another
+def _smoothing_operator(idx_use, e, smooth, n_vertices, verbose=None):
+    """Sparse operator for the smoothing steps of the morphing
+
+    The smoothing iterations only depend on the geometry, so they are
+    folded into a single sparse matrix that maps the data on the vertices
+    idx_use to all the vertices of the mesh.
 
     Parameters
     ----------
-    data : array, or csr sparse matrix
-        A n_vertices x n_times (or other dimension) dataset to morph.
     idx_use : array of int
         Vertices from the original subject's data.
     e : sparse matrix
@@ -1752,19 +1804,14 @@ def _morph_buffer(data, idx_use, e, smooth, n_vertices, nearest, maps,
         also imposed.
     n_vertices : int
         Number of vertices.
-    nearest : array of int
-        Vertices on the destination surface to use.
-    maps : sparse matrix
-        Morph map from one subject to the other.
     verbose : bool, str, int, or None
         If not None, override default verbose level (see mne.verbose).
 
     Returns
     -------
-    data_morphed : array, or csr sparse matrix
-        The morphed data (same type as input).
+    smooth_mat : csr sparse matrix, shape=(n_vertices, len(idx_use))
+        The smoothing operator.
     """
-
     n_iter = 99  # max nb of smoothing iterations (minus one)
     if smooth is not None:
         if smooth <= 0:
@@ -1773,12 +1820,7 @@ def _morph_buffer(data, idx_use, e, smooth, n_vertices, nearest, maps,
         smooth -= 1
     # make sure we're in CSR format
     e = e.tocsr()
-    if sparse.issparse(data):
-        use_sparse = True
-        if not isinstance(data, sparse.csr_matrix):
-            data = data.tocsr()
-    else:
-        use_sparse = False
+    smooth_mat = sparse.eye(len(idx_use), len(idx_use), format='csr')
     done = False
     # do the smoothing
     for k in range(n_iter + 1):
@@ -1804,55 +1846,44 @@ def _morph_buffer(data, idx_use, e, smooth, n_vertices, nearest, maps,
             idx_out = None
             done = True
 
-        # do standard smoothing multiplication
-        data = _morph_mult(data, e, use_sparse, idx_use_data, idx_out)
+        # do standard smoothing multiplication, i.e.
+        # (e[:, idx_use_data] * smooth_mat)[idx_out]
+        e_use = e if idx_out is None else e[idx_out]
+        if len(idx_use_data) < e.shape[1]:
+            e_use = e_use[:, idx_use_data]
+        smooth_mat = (e_use * smooth_mat).tocsr()
 
         if done is True:
             break
 
         # do standard normalization
-        if use_sparse:
-            data.data /= data_sum[idx_use].repeat(np.diff(data.indptr))
-        else:
-            data /= data_sum[idx_use][:, None]
+        smooth_mat.data /= data_sum[idx_use].repeat(np.diff(smooth_mat.indptr))
 
     # do special normalization for last iteration
-    if use_sparse:
-        data_sum[data_sum == 0] = 1
-        data.data /= data_sum.repeat(np.diff(data.indptr))
-    else:
-        data[idx_use, :] /= data_sum[idx_use][:, None]
+    data_sum[data_sum == 0] = 1
+    smooth_mat.data /= data_sum.repeat(np.diff(smooth_mat.indptr))
 
     logger.info('    %d smooth iterations done.' % (k + 1))
-    data_morphed = maps[nearest, :] * data
-    return data_morphed
-
-
-def _morph_mult(data, e, use_sparse, idx_use_data, idx_use_out=None):
-    """Helper for morphing
-
-    Equivalent to "data = (e[:, idx_use_data] * data)[idx_use_out]"
-    but faster.
-    """
-    if len(idx_use_data) < e.shape[1]:
-        if use_sparse:
-            data = e[:, idx_use_data] * data
-        else:
-            # constructing a new sparse matrix is faster than sub-indexing
-            # e[:, idx_use_data]!
-            col, row = np.meshgrid(np.arange(data.shape[1]), idx_use_data)
-            d_sparse = sparse.csr_matrix((data.ravel(),
-                                          (row.ravel(), col.ravel())),
-                                         shape=(e.shape[1], data.shape[1]))
-            data = e * d_sparse
-            data = np.asarray(data.todense())
-    else:
-        data = e * data
-
-    # trim data
-    if idx_use_out is not None:
-        data = data[idx_use_out]
-    return data
+    return smooth_mat
+
+
+def _get_smoothing_operator(subject, hemi, idx_use, smooth, subjects_dir,
+                            cache=True):
+    """Get the smoothing operator of a hemisphere, with caching"""
+    vertices = [np.array([], int)] * 2
+    vertices[hemi] = idx_use
+    key = _morph_cache_key((subject,), vertices, smooth, subjects_dir)
+    smooth_mat = _smooth_cache.get(key) if cache else None
+    if smooth_mat is None:
+        tris = _get_subject_sphere_tris(subject, subjects_dir)[hemi]
+        e = mesh_edges(tris)
+        e.data[e.data == 2] = 1
+        n_vertices = e.shape[0]
+        e = e + sparse.eye(n_vertices, n_vertices)
+        smooth_mat = _smoothing_operator(idx_use, e, smooth, n_vertices)
+        if cache:
+            _smooth_cache.set(key, smooth_mat)
+    return smooth_mat
 
 
 def _get_subject_sphere_tris(subject, subjects_dir):
@@ -1862,9 +1893,108 @@ def _get_subject_sphere_tris(subject, subjects_dir):
     return tris
 
 
+###############################################################################
+# Morph matrix cache
+
+# in-memory caches of morph matrices and smoothing operators
+_morph_cache = _LRUCache(max_size=16)
+_smooth_cache = _LRUCache(max_size=16)
+
+
+def _morph_cache_key(subjects, vertices, smooth, subjects_dir):
+    """Hash identifying a morph matrix (or smoothing operator)
+
+    The modification times and sizes of the sphere.reg surfaces and of the
+    morph maps are part of the key, so that re-running the FreeSurfer
+    reconstruction or regenerating the morph maps invalidates the cache.
+    """
+    md5 = hashlib.md5()
+    md5.update(os.path.realpath(subjects_dir).encode('utf-8'))
+    fnames = list()
+    for subject in subjects:
+        md5.update(('|%s' % subject).encode('utf-8'))
+        fnames += [os.path.join(subjects_dir, subject, 'surf',
+                                '%s.sphere.reg' % hemi)
+                   for hemi in ('lh', 'rh')]
+    if len(subjects) == 2:
+        fnames += [os.path.join(subjects_dir, 'morph-maps',
+                                '%s-%s-morph.fif' % pair)
+                   for pair in (subjects, subjects[::-1])]
+    for fname in fnames:
+        if os.path.isfile(fname):
+            stat = os.stat(fname)
+            md5.update(('|%s|%s' % (stat.st_mtime, stat.st_size))
+                       .encode('utf-8'))
+    for verts in vertices:
+        md5.update(b'|')
+        md5.update(np.ascontiguousarray(verts, dtype=np.int64))
+    md5.update(('|%s' % smooth).encode('utf-8'))
+    return md5.hexdigest()
+
+
+def _get_morph_cache_fname(subject_from, subject_to, key):
+    """Name of the on-disk cache file of a morph matrix (None if unset)"""
+    cache_dir = get_config('MNE_CACHE_DIR', None)
+    if cache_dir is None:
+        return None
+    return os.path.join(cache_dir, 'morph-matrices', '%s-%s-morph-%s.npz'
+                        % (subject_from, subject_to, key))
+
+
+def _read_morph_cache(fname):
+    """Read a morph matrix written by _write_morph_cache (None on failure)"""
+    if fname is None or not os.path.isfile(fname):
+        return None
+    try:
+        npz = np.load(fname)
+        try:
+            morpher = sparse.csr_matrix((npz['data'], npz['indices'],
+                                         npz['indptr']),
+                                        shape=tuple(npz['shape']))
+        finally:
+            npz.close()
+    except Exception as exp:
+        logger.warning('Could not read cached morph matrix %s (%s)'
+                       % (fname, exp))
+        return None
+    return morpher
+
+
+def _write_morph_cache(fname, morpher):
+    """Write a morph matrix in double precision, warn on failure"""
+    if fname is None:
+        return
+    try:
+        cache_dir = os.path.dirname(fname)
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        # write to a temporary file first so that concurrent readers
+        # never see a partially written matrix
+        tmp_fname = '%s-%d.tmp.npz' % (fname[:-4], os.getpid())
+        np.savez(tmp_fname, data=morpher.data, indices=morpher.indices,
+                 indptr=morpher.indptr, shape=np.array(morpher.shape))
+        os.rename(tmp_fname, fname)
+    except Exception as exp:
+        logger.warning('Could not write morph matrix cache %s (%s)'
+                       % (fname, exp))
+
+
+def _morph_stc_data(morph_mat, stc):
+    """Apply a morph matrix to the data of a source estimate
+
+    If the data are stored as (kernel, sens_data), only the kernel is
+    morphed.
+    """
+    if stc._is_factored():
+        return (morph_mat * stc._kernel, stc._sens_data)
+    return morph_mat * stc.data
+
+
 @verbose
+@profiled
 def morph_data(subject_from, subject_to, stc_from, grade=5, smooth=None,
-               subjects_dir=None, buffer_size=64, n_jobs=1, verbose=None):
+               subjects_dir=None, buffer_size=64, n_jobs=1, cache=True,
+               verbose=None):
     """Morph a source estimate from one subject to another
 
     Parameters
@@ -1892,10 +2022,13 @@ def morph_data(subject_from, subject_to, stc_from, grade=5, smooth=None,
     subjects_dir : string, or None
         Path to SUBJECTS_DIR if it is not set in the environment.
     buffer_size : int
-        Morph data in chunks of `buffer_size` time instants.
-        Saves memory when morphing long time intervals.
+        Not used anymore, the data are morphed at once with the morph
+        matrix (see compute_morph_matrix). Kept for backward compatibility.
     n_jobs : int
         Number of jobs to run in parallel
+    cache : bool
+        If True (default), the morph matrix is cached for reuse (see
+        compute_morph_matrix).
     verbose : bool, str, int, or None
         If not None, override default verbose level (see mne.verbose).
 
@@ -1911,44 +2044,19 @@ def morph_data(subject_from, subject_to, stc_from, grade=5, smooth=None,
     logger.info('Morphing data...')
     subjects_dir = get_subjects_dir(subjects_dir)
     nearest = grade_to_vertices(subject_to, grade, subjects_dir, n_jobs)
-    tris = _get_subject_sphere_tris(subject_from, subjects_dir)
-    maps = read_morph_map(subject_from, subject_to, subjects_dir)
-
-    # morph the data
-    data = [stc_from.lh_data, stc_from.rh_data]
-    data_morphed = [None, None]
-
-    n_chunks = ceil(stc_from.data.shape[1] / float(buffer_size))
-
-    parallel, my_morph_buffer, _ = parallel_func(_morph_buffer, n_jobs)
+    # no output vertices in a hemisphere without input vertices
+    vertices = [v if len(v_from) > 0 else np.array([], dtype=int)
+                for v, v_from in zip(nearest, stc_from.vertno)]
 
-    for hemi in [0, 1]:
-        e = mesh_edges(tris[hemi])
-        e.data[e.data == 2] = 1
-        n_vertices = e.shape[0]
-        e = e + sparse.eye(n_vertices, n_vertices)
-        idx_use = stc_from.vertno[hemi]
-        if len(idx_use) == 0:
-            continue
-        data_morphed[hemi] = np.concatenate(
-            parallel(my_morph_buffer(data_buffer, idx_use, e, smooth,
-                                     n_vertices, nearest[hemi], maps[hemi])
-                     for data_buffer
-                     in np.array_split(data[hemi], n_chunks, axis=1)), axis=1)
-
-    vertices = [nearest[0], nearest[1]]
-    if data_morphed[0] is None:
-        if data_morphed[1] is None:
-            data = np.r_[[], []]
-            vertices = [np.array([], dtype=int), np.array([], dtype=int)]
-        else:
-            data = data_morphed[1]
-            vertices = [np.array([], dtype=int), vertices[1]]
-    elif data_morphed[1] is None:
-        data = data_morphed[0]
-        vertices = [vertices[0], np.array([], dtype=int)]
+    if sum(len(v) for v in stc_from.vertno) == 0:
+        data = np.r_[[], []]
     else:
-        data = np.r_[data_morphed[0], data_morphed[1]]
+        # the smoothing is linear, so morphing reduces to a single sparse
+        # product with the (cached) morph matrix
+        morph_mat = compute_morph_matrix(subject_from, subject_to,
+                                         stc_from.vertno, nearest, smooth,
+                                         subjects_dir, cache=cache)
+        data = _morph_stc_data(morph_mat, stc_from)
 
     stc_to = SourceEstimate(data, vertices, stc_from.tmin, stc_from.tstep,
                             subject=subject_to, verbose=stc_from.verbose)
@@ -1958,8 +2066,10 @@ def morph_data(subject_from, subject_to, stc_from, grade=5, smooth=None,
 
 
 @verbose
+@profiled
 def compute_morph_matrix(subject_from, subject_to, vertices_from, vertices_to,
-                         smooth=None, subjects_dir=None, verbose=None):
+                         smooth=None, subjects_dir=None, cache=True,
+                         verbose=None):
     """Get a matrix that morphs data from one subject to another
 
     Parameters
@@ -1978,6 +2088,11 @@ def compute_morph_matrix(subject_from, subject_to, vertices_from, vertices_to,
         with non-zero values.
     subjects_dir : string
         Path to SUBJECTS_DIR is not set in the environment
+    cache : bool
+        If True, morph matrices are kept in memory for reuse by later calls
+        with the same subjects, vertices and smoothing. If the
+        "MNE_CACHE_DIR" config variable is set, they are also saved in its
+        "morph-matrices" folder.
     verbose : bool, str, int, or None
         If not None, override default verbose level (see mne.verbose).
 
@@ -1986,24 +2101,53 @@ def compute_morph_matrix(subject_from, subject_to, vertices_from, vertices_to,
     morph_matrix : sparse matrix
         matrix that morphs data from subject_from to subject_to
     """
-    logger.info('Computing morph matrix...')
     subjects_dir = get_subjects_dir(subjects_dir)
-    tris = _get_subject_sphere_tris(subject_from, subjects_dir)
+    if not cache:
+        return _compute_morph_matrix(subject_from, subject_to, vertices_from,
+                                     vertices_to, smooth, subjects_dir,
+                                     cache=False)
+
+    key = _morph_cache_key((subject_from, subject_to),
+                           list(vertices_from) + list(vertices_to), smooth,
+                           subjects_dir)
+    morpher = _morph_cache.get(key)
+    if morpher is not None:
+        logger.info('Using cached morph matrix')
+    else:
+        fname = _get_morph_cache_fname(subject_from, subject_to, key)
+        morpher = _read_morph_cache(fname)
+        if morpher is not None:
+            logger.info('Reading morph matrix from %s' % fname)
+        else:
+            morpher = _compute_morph_matrix(subject_from, subject_to,
+                                            vertices_from, vertices_to,
+                                            smooth, subjects_dir)
+            # the morph maps may have been created by the computation
+            key = _morph_cache_key((subject_from, subject_to),
+                                   list(vertices_from) + list(vertices_to),
+                                   smooth, subjects_dir)
+            fname = _get_morph_cache_fname(subject_from, subject_to, key)
+            if sparse.issparse(morpher):
+                _write_morph_cache(fname, morpher)
+        _morph_cache.set(key, morpher)
+    return morpher.copy() if sparse.issparse(morpher) else morpher
+
+
+def _compute_morph_matrix(subject_from, subject_to, vertices_from,
+                          vertices_to, smooth, subjects_dir, cache=True):
+    """Compute the morph matrix, see compute_morph_matrix"""
+    logger.info('Computing morph matrix...')
     maps = read_morph_map(subject_from, subject_to, subjects_dir)
 
     morpher = [None] * 2
     for hemi in [0, 1]:
-        e = mesh_edges(tris[hemi])
-        e.data[e.data == 2] = 1
-        n_vertices = e.shape[0]
-        e = e + sparse.eye(n_vertices, n_vertices)
         idx_use = vertices_from[hemi]
         if len(idx_use) == 0:
             morpher[hemi] = []
             continue
-        m = sparse.eye(len(idx_use), len(idx_use), format='csr')
-        morpher[hemi] = _morph_buffer(m, idx_use, e, smooth, n_vertices,
-                                      vertices_to[hemi], maps[hemi])
+        smooth_mat = _get_smoothing_operator(subject_from, hemi, idx_use,
+                                             smooth, subjects_dir, cache)
+        morpher[hemi] = maps[hemi][vertices_to[hemi], :] * smooth_mat
     # be careful about zero-length arrays
     if isinstance(morpher[0], list):
         morpher = morpher[1]
@@ -2068,12 +2212,11 @@ def grade_to_vertices(subject, grade, subjects_dir=None, n_jobs=1,
             rhs /= np.sqrt(np.sum(rhs ** 2, axis=1))[:, None]
 
             # Compute nearest vertices in high dim mesh
-            parallel, my_compute_nearest, _ = \
-                parallel_func(_compute_nearest, n_jobs)
+            n_jobs = check_n_jobs(n_jobs)
             lhs, rhs, rr = [a.astype(np.float32)
                             for a in [lhs, rhs, ico['rr']]]
-            vertices = parallel(my_compute_nearest(xhs, rr)
-                                for xhs in [lhs, rhs])
+            vertices = [_compute_nearest(xhs, rr, n_jobs=n_jobs)
+                        for xhs in [lhs, rhs]]
             # Make sure the vertices are ordered
             vertices = [np.sort(verts) for verts in vertices]
     else:  # potentially fill the surface
@@ -2082,6 +2225,7 @@ def grade_to_vertices(subject, grade, subjects_dir=None, n_jobs=1,
     return vertices
 
 
+@profiled
 def morph_data_precomputed(subject_from, subject_to, stc_from, vertices_to,
                            morph_mat):
     """Morph source estimate between subjects using a precomputed matrix
@@ -2113,13 +2257,13 @@ def morph_data_precomputed(subject_from, subject_to, stc_from, vertices_to,
     if not sum(len(v) for v in vertices_to) == morph_mat.shape[0]:
         raise ValueError('number of vertices in vertices_to must match '
                          'morph_mat.shape[0]')
-    if not stc_from.data.shape[0] == morph_mat.shape[1]:
+    if not stc_from.shape[0] == morph_mat.shape[1]:
         raise ValueError('stc_from.data.shape[0] must be the same as '
                          'morph_mat.shape[0]')
 
     if stc_from.subject is not None and stc_from.subject != subject_from:
         raise ValueError('stc_from.subject and subject_from must match')
-    data = morph_mat * stc_from.data
+    data = _morph_stc_data(morph_mat, stc_from)
     stc_to = SourceEstimate(data, vertices_to, stc_from.tmin, stc_from.tstep,
                             verbose=stc_from.verbose, subject=subject_to)
     return stc_to
@@ -2407,6 +2551,55 @@ def _get_ico_tris(grade, verbose=None, return_surf=False):
         return ico
 
 
+# in-memory cache of the MRI interpolators restricted to the sources in use
+# (these are large, so only a few are kept)
+_vol_interpolator_cache = _LRUCache(max_size=2)
+
+
+def _get_vol_interpolator(s):
+    """Get the interpolator of a volume source space from its used sources"""
+    interpolator = s['interpolator']
+    inuse = np.ascontiguousarray(s['inuse'])
+    # the entries are dropped when their interpolator is deleted, so that the
+    # cache does not keep it alive and its id is not reused while cached
+    key = (id(interpolator), hashlib.md5(inuse).hexdigest())
+    item = _vol_interpolator_cache.get(key)
+    if item is not None and item[0]() is interpolator:
+        return item[1]
+    this_interp = csr_matrix(interpolator[:, np.where(inuse)[0]])
+    try:
+        ref = weakref.ref(interpolator, lambda r, key=key:
+                          _vol_interpolator_cache.pop(key))
+    except TypeError:  # not all objects support weak references
+        return this_interp
+    _vol_interpolator_cache.set(key, (ref, this_interp))
+    return this_interp
+
+
+def _write_nifti_chunks(fname, header, affine, shape, vols):
+    """Write a 4D NIfTI file from blocks of volumes
+
+    vols yields arrays of shape (n_times, n_voxels) in the C order of the
+    (transposed) 3D volumes.
+    """
+    import nibabel as nib
+    # let nibabel fill the header as it would for the whole image
+    img = nib.Nifti1Image(np.zeros((1, 1, 1, 1)), affine, header=header)
+    img.update_header()
+    header = img.get_header()
+    header.set_data_shape(shape)
+    dtype = header.get_data_dtype()
+    opener = gzip.open if fname.endswith('.gz') else open
+    fid = opener(fname, 'wb')
+    try:
+        header.write_to(fid)
+        fid.write(b'\0' * (int(header.get_data_offset()) - fid.tell()))
+        for vol in vols:
+            fid.write(np.ascontiguousarray(vol, dtype=dtype).tostring())
+    finally:
+        fid.close()
+
+
 def save_stc_as_volume(fname, stc, src, dest='mri', mri_resolution=False):
     """Save a volume source estimate in a nifti file
 
@@ -2431,36 +2624,30 @@ def save_stc_as_volume(fname, stc, src, dest='mri', mri_resolution=False):
     Returns
     -------
     img : instance Nifti1Image
-        The image object.
+        The image object. If the image was saved to a .nii or .nii.gz file,
+        the time points are written a few at a time and the image is read
+        back from the file (without loading the data).
     """
     if not isinstance(stc, VolSourceEstimate):
         raise Exception('Only volume source estimates can be saved as '
                         'volumes')
 
     n_times = stc.data.shape[1]
-    shape = src[0]['shape']
-    shape3d = (shape[2], shape[1], shape[0])
-    shape = (n_times, shape[2], shape[1], shape[0])
-    vol = np.zeros(shape)
-    mask3d = src[0]['inuse'].reshape(shape3d).astype(np.bool)
-
     if mri_resolution:
-        mri_shape3d = (src[0]['mri_height'], src[0]['mri_depth'],
-                       src[0]['mri_width'])
-        mri_shape = (n_times, src[0]['mri_height'], src[0]['mri_depth'],
-                     src[0]['mri_width'])
-        mri_vol = np.zeros(mri_shape)
-        interpolator = src[0]['interpolator']
-
-    for k, v in enumerate(vol):
-        v[mask3d] = stc.data[:, k]
-        if mri_resolution:
-            mri_vol[k] = (interpolator * v.ravel()).reshape(mri_shape3d)
-
-    if mri_resolution:
-        vol = mri_vol
-
-    vol = vol.T
+        shape3d = (src[0]['mri_height'], src[0]['mri_depth'],
+                   src[0]['mri_width'])
+        interpolator = _get_vol_interpolator(src[0])
+    else:
+        shape = src[0]['shape']
+        shape3d = (shape[2], shape[1], shape[0])
+        # put the sources in use in the grid
+        vertno = np.where(src[0]['inuse'])[0]
+        interpolator = csr_matrix((np.ones(len(vertno)),
+                                   (vertno, np.arange(len(vertno)))),
+                                  shape=(np.prod(shape3d), len(vertno)))
+    n_vox = interpolator.shape[0]
+    chunks = chunk_jobs(n_times, 1, nbytes=16 * n_vox)
+    vols = (np.asarray(interpolator * stc.data[:, c]).T for c in chunks)
 
     if mri_resolution:
         affine = src[0]['vox_mri_t']['trans'].copy()
@@ -2478,6 +2665,17 @@ def save_stc_as_volume(fname, stc, src, dest='mri', mri_resolution=False):
     header = nib.nifti1.Nifti1Header()
     header.set_xyzt_units('mm', 'msec')
     header['pixdim'][4] = 1e3 * stc.tstep
+    if fname is not None and (fname.endswith('.nii') or
+                              fname.endswith('.nii.gz')):
+        # no need to hold all the volumes in memory
+        _write_nifti_chunks(fname, header, affine,
+                            shape3d[::-1] + (n_times,), vols)
+        return nib.load(fname)
+
+    vol = np.empty((n_times, n_vox))
+    for c, v in zip(chunks, vols):
+        vol[c] = v
+    vol = vol.reshape((n_times,) + shape3d).T
     img = nib.Nifti1Image(vol, affine, header=header)
     if fname is not None:
         nib.save(img, fname)
@@ -2502,18 +2700,9 @@ def _get_label_flip(labels, label_vertidx, src):
     return label_flip
 
 
-@verbose
-def _gen_extract_label_time_course(stcs, labels, src, mode='mean',
-                                   allow_empty=False, verbose=None):
-    """Generator for extract_label_time_course"""
-
-    n_labels = len(labels)
-
-    # get vertno from source space, they have to be the same as in the stcs
-    vertno = [s['vertno'] for s in src]
+def _get_label_vertidx(labels, vertno, allow_empty):
+    """Helper to get the indices of the label vertices in the source space"""
     nvert = [len(vn) for vn in vertno]
-
-    # do the initialization
     label_vertidx = list()
     for label in labels:
         if label.hemi == 'both':
@@ -2546,50 +2735,109 @@ def _gen_extract_label_time_course(stcs, labels, src, mode='mean',
             this_vertidx = None  # to later check if label is empty
 
         label_vertidx.append(this_vertidx)
+    return label_vertidx
 
-    # mode-dependent initalization
-    if mode == 'mean':
-        pass  # we have this here to catch invalid values for mode
-    elif mode == 'mean_flip':
-       # get the sign-flip vector for every label
-        label_flip = _get_label_flip(labels, label_vertidx, src)
-    elif mode == 'pca_flip':
-       # get the sign-flip vector for every label
-        label_flip = _get_label_flip(labels, label_vertidx, src)
-    elif mode == 'max':
-        pass  # we calculate the maximum value later
-    else:
-        raise ValueError('%s is an invalid mode' % mode)
 
-    # loop through source estimates and extract time series
-    for stc in stcs:
+class LabelExtractor(object):
+    """Extract label time courses with a precomputed operator
+
+    The labels are compiled once, so that the time courses can be extracted
+    efficiently from many source estimates. For the "mean" and "mean_flip"
+    modes, the extraction is a product with a sparse (n_labels x n_sources)
+    matrix that includes the sign flips.
+
+    Parameters
+    ----------
+    labels : Label | list of Label
+        The labels for which to extract the time course.
+    src : list
+        Source spaces for left and right hemisphere.
+    mode : str
+        Extraction mode, see extract_label_time_course.
+    allow_empty : bool
+        Instead of emitting an error, return all-zero time courses for labels
+        that do not have any vertices in the source space.
+    verbose : bool, str, int, or None
+        If not None, override default verbose level (see mne.verbose).
 
-        # make sure the stc is compatible with the source space
-        if len(stc.vertno[0]) != nvert[0] or len(stc.vertno[1]) != nvert[1]:
-            raise ValueError('stc not compatible with source space')
-        if any([np.any(svn != vn) for svn, vn in zip(stc.vertno, vertno)]):
-            raise ValueError('stc not compatible with source space')
+    Attributes
+    ----------
+    operator : sparse matrix | None
+        The (n_labels x n_sources) extraction operator. None for the
+        "pca_flip" and "max" modes, which are not linear.
+    """
+    @verbose
+    def __init__(self, labels, src, mode='mean_flip', allow_empty=False,
+                 verbose=None):
+        if not isinstance(labels, list):
+            labels = [labels]
+        if mode not in ('mean', 'mean_flip', 'pca_flip', 'max'):
+            raise ValueError('%s is an invalid mode' % mode)
+        self.labels = labels
+        self.mode = mode
+        self.verbose = verbose
+        # get vertno from source space, they have to be the same as in the
+        # stcs
+        self.vertno = [s['vertno'] for s in src]
+        self._vertidx = _get_label_vertidx(labels, self.vertno, allow_empty)
+        if mode in ('mean_flip', 'pca_flip'):
+            # get the sign-flip vector for every label
+            self._flip = _get_label_flip(labels, self._vertidx, src)
+        else:
+            self._flip = [None] * len(labels)
+
+        self.operator = None
+        if mode in ('mean', 'mean_flip'):
+            n_sources = sum(len(vn) for vn in self.vertno)
+            rows, cols, weights = list(), list(), list()
+            for i, (vertidx, flip) in enumerate(zip(self._vertidx,
+                                                    self._flip)):
+                if vertidx is None:
+                    continue
+                w = np.ones(len(vertidx)) if flip is None else flip.ravel()
+                rows.append(i * np.ones(len(vertidx), int))
+                cols.append(vertidx)
+                weights.append(w / len(vertidx))
+            if len(rows) > 0:
+                rows, cols, weights = [np.concatenate(x) for x in
+                                       (rows, cols, weights)]
+            else:
+                rows, cols, weights = np.zeros(0, int), np.zeros(0, int), []
+            self.operator = csr_matrix((weights, (rows, cols)),
+                                       shape=(len(labels), n_sources))
 
-        logger.info('Extracting time courses for %d labels (mode: %s)'
-                    % (n_labels, mode))
+    def __repr__(self):
+        return '<LabelExtractor  |  %d labels, mode : %s>' % (len(self.labels),
+                                                             self.mode)
 
-        # do the extraction
-        label_tc = np.zeros((n_labels, stc.data.shape[1]),
-                            dtype=stc.data.dtype)
-        if mode == 'mean':
-            for i, vertidx in enumerate(label_vertidx):
-                if vertidx is not None:
-                    label_tc[i] = np.mean(stc.data[vertidx, :], axis=0)
-        elif mode == 'mean_flip':
-            for i, (vertidx, flip) in enumerate(zip(label_vertidx,
-                                                    label_flip)):
-                if vertidx is not None:
-                    label_tc[i] = np.mean(flip * stc.data[vertidx, :], axis=0)
-        elif mode == 'pca_flip':
-            for i, (vertidx, flip) in enumerate(zip(label_vertidx,
-                                                    label_flip)):
+    def _extract(self, data):
+        """Extract the label time courses from (n_sources, n_times) data
+
+        The data can also be a tuple (kernel, sens_data).
+        """
+        if isinstance(data, tuple):
+            kernel, sens_data = data
+            dtype = np.result_type(kernel, sens_data)
+            n_times = sens_data.shape[1]
+            if self.operator is not None:
+                # apply the operator to the kernel
+                return np.dot(self.operator * kernel, sens_data)
+            get_rows = lambda idx: np.dot(kernel[idx], sens_data)
+        else:
+            if self.operator is not None:
+                label_tc = self.operator * data
+                if label_tc.dtype != data.dtype:
+                    label_tc = label_tc.astype(data.dtype)
+                return label_tc
+            dtype, n_times = data.dtype, data.shape[1]
+            get_rows = lambda idx: data[idx, :]
+
+        label_tc = np.zeros((len(self.labels), n_times), dtype=dtype)
+        if self.mode == 'pca_flip':
+            for i, (vertidx, flip) in enumerate(zip(self._vertidx,
+                                                    self._flip)):
                 if vertidx is not None:
-                    U, s, V = linalg.svd(stc.data[vertidx, :],
+                    U, s, V = linalg.svd(get_rows(vertidx),
                                          full_matrices=False)
                     # determine sign-flip
                     sign = np.sign(np.dot(U[:, 0], flip))
@@ -2598,18 +2846,90 @@ def _gen_extract_label_time_course(stcs, labels, src, mode='mean',
                     scale = linalg.norm(s) / np.sqrt(len(vertidx))
 
                     label_tc[i] = sign * scale * V[0]
-        elif mode == 'max':
-            for i, vertidx in enumerate(label_vertidx):
+        elif self.mode == 'max':
+            for i, vertidx in enumerate(self._vertidx):
                 if vertidx is not None:
-                    label_tc[i] = np.max(np.abs(stc.data[vertidx, :]), axis=0)
-        else:
-            raise ValueError('%s is an invalid mode' % mode)
+                    label_tc[i] = np.max(np.abs(get_rows(vertidx)), axis=0)
+        return label_tc
 
-        # this is a generator!
-        yield label_tc
+    @verbose
+    def _gen_extract(self, stcs, verbose=None):
+        """Generator for extract"""
+        n_labels = len(self.labels)
+        for stc in stcs:
+            # make sure the stc is compatible with the source space
+            if any([len(svn) != len(vn) or np.any(svn != vn)
+                    for svn, vn in zip(stc.vertno, self.vertno)]):
+                raise ValueError('stc not compatible with source space')
+
+            logger.info('Extracting time courses for %d labels (mode: %s)'
+                        % (n_labels, self.mode))
+            if stc._is_factored():
+                data = (stc._kernel, stc._sens_data)
+            else:
+                data = stc.data
+            # this is a generator!
+            yield self._extract(data)
+
+    def extract(self, stcs, return_generator=False):
+        """Extract the label time courses from source estimates
+
+        Parameters
+        ----------
+        stcs : SourceEstimate | list (or generator) of SourceEstimate
+            The source estimates from which to extract the time course.
+        return_generator : bool
+            If True, a generator instead of a list is returned.
+
+        Returns
+        -------
+        label_tc : array | list (or generator) of array,
+                   shape=(len(labels), n_times)
+            Extracted time course for each label and source estimate.
+        """
+        if isinstance(stcs, SourceEstimate):
+            return list(self._gen_extract([stcs]))[0]
+        label_tc = self._gen_extract(stcs)
+        if not return_generator:
+            label_tc = list(label_tc)
+        return label_tc
+
+    def extract_data(self, data):
+        """Extract the label time courses from a data array
+
+        Parameters
+        ----------
+        data : array, shape=(n_sources, n_times) or
+               shape=(n_stcs, n_sources, n_times)
+            The source time courses, for the vertices of the source space.
+            For the "mean" and "mean_flip" modes, a stacked batch of source
+            estimates is processed with a single matrix product.
+
+        Returns
+        -------
+        label_tc : array, shape=(n_labels, n_times) or
+                   shape=(n_stcs, n_labels, n_times)
+            Extracted time courses.
+        """
+        data = np.asarray(data)
+        n_sources = sum(len(vn) for vn in self.vertno)
+        if data.ndim not in (2, 3) or data.shape[-2] != n_sources:
+            raise ValueError('data must have shape (n_sources, n_times) or '
+                             '(n_stcs, n_sources, n_times) with n_sources=%d'
+                             % n_sources)
+        if data.ndim == 2:
+            return self._extract(data)
+        n_stcs, _, n_times = data.shape
+        if self.operator is None:
+            return np.array([self._extract(d) for d in data])
+        data = data.transpose(1, 0, 2).reshape(n_sources, n_stcs * n_times)
+        label_tc = self._extract(data)
+        label_tc = label_tc.reshape(len(self.labels), n_stcs, n_times)
+        return label_tc.transpose(1, 0, 2)
 
 
 @verbose
+@profiled
 def extract_label_time_course(stcs, labels, src, mode='mean_flip',
                               allow_empty=False, return_generator=False,
                               verbose=None):
@@ -2663,26 +2983,6 @@ def extract_label_time_course(stcs, labels, src, mode='mean_flip',
                shape=(len(labels), n_times)
         Extracted time course for each label and source estimate.
     """
-    # convert inputs to lists
-    if isinstance(stcs, SourceEstimate):
-        stcs = [stcs]
-        return_several = False
-        return_generator = False
-    else:
-        return_several = True
-
-    if not isinstance(labels, list):
-        labels = [labels]
-
-    label_tc = _gen_extract_label_time_course(stcs, labels, src, mode=mode,
-                                              allow_empty=allow_empty)
-
-    if not return_generator:
-        # do the extraction and return a list
-        label_tc = list(label_tc)
-
-    if not return_several:
-        # input was a single SoureEstimate, return single array
-        label_tc = label_tc[0]
-
-    return label_tc
+    extractor = LabelExtractor(labels, src, mode=mode,
+                               allow_empty=allow_empty)
+    return extractor.extract(stcs, return_generator=return_generator)
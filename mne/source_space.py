@@ -27,7 +27,7 @@ from .source_estimate import mesh_dist
 from .utils import (get_subjects_dir, run_subprocess, has_freesurfer,
                     has_nibabel, logger, verbose, check_scipy_version)
 from .fixes import in1d, partial
-from .parallel import parallel_func, check_n_jobs
+from .parallel import parallel_func, check_n_jobs, chunk_jobs
 from .transforms import (invert_transform, apply_trans, _print_coord_trans,
                          combine_transforms)
 if has_nibabel():
@@ -1389,64 +1389,47 @@ def _add_interpolator(s, mri_name):
     combo_trans['trans'] = combo_trans['trans'].astype(np.float32)
 
     logger.info('Setting up interpolation...')
-    js = np.arange(mri_width, dtype=np.float32)
-    js = np.tile(js[np.newaxis, np.newaxis, :],
-                 (mri_depth, mri_height, 1)).ravel()
-    ks = np.arange(mri_height, dtype=np.float32)
-    ks = np.tile(ks[np.newaxis, :, np.newaxis],
-                 (mri_depth, 1, mri_width)).ravel()
-    ps = np.arange(mri_depth, dtype=np.float32)
-    ps = np.tile(ps[:, np.newaxis, np.newaxis],
-                 (1, mri_height, mri_width)).ravel()
-
-    r0 = apply_trans(combo_trans['trans'], np.c_[js, ks, ps])
-    del js, ks, ps
-    rn = np.floor(r0).astype(int)
     maxs = (s['vol_dims'] - 1)[np.newaxis, :]
-    good = np.logical_and(np.all(rn >= 0, axis=1), np.all(rn < maxs, axis=1))
-    rn = rn[good]
-    r0 = r0[good]
-    jj = rn[:, 0]
-    kk = rn[:, 1]
-    pp = rn[:, 2]
-    vss = np.empty((8, len(jj)), int)
     width = s['vol_dims'][0]
     height = s['vol_dims'][1]
-    vss[0, :] = _vol_vertex(width, height, jj, kk, pp)
-    vss[1, :] = _vol_vertex(width, height, jj + 1, kk, pp)
-    vss[2, :] = _vol_vertex(width, height, jj + 1, kk + 1, pp)
-    vss[3, :] = _vol_vertex(width, height, jj, kk + 1, pp)
-    vss[4, :] = _vol_vertex(width, height, jj, kk, pp + 1)
-    vss[5, :] = _vol_vertex(width, height, jj + 1, kk, pp + 1)
-    vss[6, :] = _vol_vertex(width, height, jj + 1, kk + 1, pp + 1)
-    vss[7, :] = _vol_vertex(width, height, jj, kk + 1, pp + 1)
-    del jj, kk, pp
-    uses = np.any(s['inuse'][vss], axis=0)
-
-    verts = vss[:, uses].ravel()  # vertex (col) numbers in csr matrix
-    row_idx = np.tile(np.where(good)[0][uses], (8, 1)).ravel()
-
-    # figure out weights for each vertex
-    r0 = r0[uses]
-    rn = rn[uses]
-    xf = r0[:, 0] - rn[:, 0].astype(np.float32)
-    yf = r0[:, 1] - rn[:, 1].astype(np.float32)
-    zf = r0[:, 2] - rn[:, 2].astype(np.float32)
-    omxf = 1.0 - xf
-    omyf = 1.0 - yf
-    omzf = 1.0 - zf
-    weights = np.concatenate([omxf * omyf * omzf,  # correspond to rows of vss
-                              xf * omyf * omzf,
-                              xf * yf * omzf,
-                              omxf * yf * omzf,
-                              omxf * omyf * zf,
-                              xf * omyf * zf,
-                              xf * yf * zf,
-                              omxf * yf * zf])
-    del xf, yf, zf, omxf, omyf, omzf
+    # the 8 corners of the source grid cells (in the order of the rows of
+    # the original vss array)
+    corners = np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0],
+                        [0, 0, 1], [1, 0, 1], [1, 1, 1], [0, 1, 1]], bool)
+    n_plane = mri_width * mri_height
+    js, ks = [a.ravel() for a in np.meshgrid(
+        np.arange(mri_width, dtype=np.float32),
+        np.arange(mri_height, dtype=np.float32))]
+    rows, verts, weights = list(), list(), list()
+    # go through the MRI volume in blocks of slices to save memory
+    for b in chunk_jobs(mri_depth, 1, nbytes=200 * n_plane):
+        n_p = b.stop - b.start
+        ps = np.repeat(np.arange(b.start, b.stop, dtype=np.float32), n_plane)
+        r0 = apply_trans(combo_trans['trans'],
+                         np.c_[np.tile(js, n_p), np.tile(ks, n_p), ps])
+        del ps
+        rn = np.floor(r0).astype(int)
+        good = np.where(np.logical_and(np.all(rn >= 0, axis=1),
+                                       np.all(rn < maxs, axis=1)))[0]
+        rn = rn[good]
+        r0 = r0[good]
+        vss = np.array([_vol_vertex(width, height, rn[:, 0] + c[0],
+                                    rn[:, 1] + c[1], rn[:, 2] + c[2])
+                        for c in corners.astype(int)])
+        uses = np.any(s['inuse'][vss], axis=0)
+        verts.append(vss[:, uses].ravel())  # vertex (col) numbers
+        rows.append(np.tile(b.start * n_plane + good[uses], 8))
+
+        # figure out weights for each vertex
+        frac = r0[uses] - rn[uses].astype(np.float32)
+        frac = np.where(corners[:, np.newaxis, :], frac[np.newaxis],
+                        1.0 - frac[np.newaxis])
+        weights.append((frac[:, :, 0] * frac[:, :, 1] * frac[:, :, 2]).ravel())
+        del r0, rn, vss, frac
 
     # Compose the sparse matrix
-    ij = (row_idx, verts)
+    weights = np.concatenate(weights)
+    ij = (np.concatenate(rows), np.concatenate(verts))
     nvox = mri_width * mri_height * mri_depth
     interp = sparse.csr_matrix((weights, ij), shape=(nvox, s['np']))
     s['interpolator'] = interp
@@ -1486,11 +1469,10 @@ def _filter_source_spaces(surf, limit, mri_head_t, src, n_jobs=1,
             r1s = apply_trans(inv_trans['trans'], r1s)
 
         # Check that the source is inside surface (often the inner skull)
-        x = _sum_solids_div(r1s, surf, n_jobs)
-        outside = np.abs(x - 1.0) > 1e-5
+        outside = _points_outside_surface(r1s, surf, n_jobs)
         omit_outside = np.sum(outside)
 
-        # vectorized nearest using BallTree (or cdist)
+        # vectorized nearest using a KD-tree
         omit = 0
         if limit > 0.0:
             dists = _compute_nearest(surf['rr'], r1s, return_dists=True)[1]
@@ -1516,6 +1498,129 @@ def _filter_source_spaces(surf, limit, mri_head_t, src, n_jobs=1,
     logger.info('Thank you for waiting.')
 
 
+def _points_outside_surface(rr, surf, n_jobs=1):
+    """Check whether points are outside a closed surface
+
+    This gives the same result as checking the sum of solid angles of
+    _sum_solids_div, but counts the crossings of a ray from each point with
+    the surface instead of summing over all triangles. The solid angles are
+    only used for the points for which the count is ambiguous (the ray hits
+    an edge or a vertex, or the point is on the surface).
+    """
+    outside = np.ones(len(rr), bool)
+    if len(rr) == 0:
+        return outside
+    tri_rr = surf['rr'][surf['tris']]
+    buckets = _triangle_buckets(tri_rr)
+    n_cand, start = _bucket_candidates(rr, buckets)
+    ambiguous = np.zeros(len(rr), bool)
+    # the candidate pairs of points and triangles take about 400 bytes each
+    for b in chunk_jobs(len(rr), 1, nbytes=400 * n_cand):
+        n_cross, ambiguous[b] = _ray_crossings(rr[b], tri_rr, buckets[0],
+                                               n_cand[b], start[b])
+        outside[b] = n_cross % 2 == 0
+    ambiguous = np.where(ambiguous)[0]
+    logger.info('    %d/%d points checked with ray crossings'
+                % (len(rr) - len(ambiguous), len(rr)))
+    outside[ambiguous] = _points_outside_surface_solids(rr[ambiguous], surf,
+                                                        n_jobs)
+    return outside
+
+
+def _triangle_buckets(tri_rr):
+    """Sort the triangles in a grid of cells in the x-y plane
+
+    Returns the triangles overlapping each cell (in CSR format), the origin
+    and size of the cells, and the shape of the grid.
+    """
+    lo = np.min(tri_rr[:, :, :2], axis=1)
+    hi = np.max(tri_rr[:, :, :2], axis=1)
+    origin = np.min(lo, axis=0)
+    extent = np.max(hi, axis=0) - origin
+    # cells about the size of a triangle, but not too many of them
+    cell = max(np.mean(hi - lo), np.sqrt(np.prod(extent) / (4. * len(lo))),
+               1e-6 * np.max(extent), np.finfo(float).tiny)
+    n_cells = np.floor(extent / cell).astype(int) + 1
+    ilo = np.floor((lo - origin) / cell).astype(int)
+    ihi = np.floor((hi - origin) / cell).astype(int)
+    nx = ihi[:, 0] - ilo[:, 0] + 1
+    counts = nx * (ihi[:, 1] - ilo[:, 1] + 1)
+    tri_idx = np.repeat(np.arange(len(tri_rr)), counts)
+    k = np.arange(len(tri_idx)) - np.repeat(np.cumsum(counts) - counts, counts)
+    cells = ((ilo[tri_idx, 0] + k % nx[tri_idx]) * n_cells[1] +
+             ilo[tri_idx, 1] + k // nx[tri_idx])
+    order = np.argsort(cells, kind='mergesort')
+    cell_tris = tri_idx[order]
+    cell_ptr = np.searchsorted(cells[order], np.arange(np.prod(n_cells) + 1))
+    return cell_tris, cell_ptr, origin, cell, n_cells
+
+
+def _bucket_candidates(rr, buckets):
+    """Get the number of candidate triangles of each point and their start"""
+    cell_tris, cell_ptr, origin, cell, n_cells = buckets
+    pc = np.floor((rr[:, :2] - origin) / cell).astype(int)
+    valid = np.all(np.logical_and(pc >= 0, pc < n_cells), axis=1)
+    pcell = np.where(valid, pc[:, 0] * n_cells[1] + pc[:, 1], 0)
+    start = cell_ptr[pcell]
+    n_cand = np.where(valid, cell_ptr[pcell + 1] - start, 0)
+    return n_cand, start
+
+
+def _ray_crossings(rr, tri_rr, cell_tris, n_cand, start, tol=1e-8):
+    """Count the crossings of rays from points in the +z direction
+
+    Returns the number of triangles crossed by the ray from each point and
+    whether the count is ambiguous.
+    """
+    pt_idx = np.repeat(np.arange(len(rr)), n_cand)
+    k = np.arange(len(pt_idx)) - np.repeat(np.cumsum(n_cand) - n_cand,
+                                           n_cand)
+    tri = tri_rr[cell_tris[np.repeat(start, n_cand) + k]]
+    del k
+    x, y, z = rr[pt_idx].T
+    # barycentric coordinates of the points projected on the x-y plane
+    xx = tri[:, :, 0] - x[:, np.newaxis]
+    yy = tri[:, :, 1] - y[:, np.newaxis]
+    bary = np.array([xx[:, 1] * yy[:, 2] - xx[:, 2] * yy[:, 1],
+                     xx[:, 2] * yy[:, 0] - xx[:, 0] * yy[:, 2],
+                     xx[:, 0] * yy[:, 1] - xx[:, 1] * yy[:, 0]]).T
+    del xx, yy
+    area = np.sum(bary, axis=1)
+    # triangles parallel to the rays cannot be crossed, but can be touched
+    flat = np.abs(area) <= tol * np.sum((tri[:, 1, :2] - tri[:, 0, :2]) ** 2 +
+                                        (tri[:, 2, :2] - tri[:, 0, :2]) ** 2,
+                                        axis=1)
+    bary[~flat] /= area[~flat, np.newaxis]
+    inside = np.all(bary > tol, axis=1) & ~flat
+    edge = np.all(bary > -tol, axis=1) & ~inside & ~flat
+    edge[flat] = np.all(np.logical_and(
+        np.min(tri[flat, :, :2], axis=1) <= rr[pt_idx[flat], :2] + tol,
+        np.max(tri[flat, :, :2], axis=1) >= rr[pt_idx[flat], :2] - tol),
+        axis=1)
+    # height of the crossings, edges touched below the points do not matter
+    hit = inside | edge
+    bary[flat] = 1. / 3.
+    dz = np.sum(bary[hit] * tri[hit, :, 2], axis=1) - z[hit]
+    dz[flat[hit]] = np.max(tri[hit & flat, :, 2], axis=1) - z[hit & flat]
+    z_tol = tol * (np.abs(z[hit]) + np.max(np.abs(tri[hit, :, 2]), axis=1))
+    inside = inside[hit]
+    pt_idx = pt_idx[hit]
+    cross = pt_idx[inside & (dz > z_tol)]
+    ambiguous = np.zeros(len(rr), bool)
+    ambiguous[pt_idx[~inside & (dz > -z_tol)]] = True
+    ambiguous[pt_idx[inside & (np.abs(dz) <= z_tol)]] = True
+    n_cross = np.bincount(cross, minlength=len(rr))
+    return n_cross, ambiguous
+
+
+def _points_outside_surface_solids(rr, surf, n_jobs):
+    """Check the sum of solid angles of all triangles"""
+    if len(rr) == 0:
+        return np.zeros(0, bool)
+    x = _sum_solids_div(rr, surf, n_jobs)
+    return np.abs(x - 1.0) > 1e-5
+
+
 def _sum_solids_div(fros, surf, n_jobs):
     """Compute sum of solid angles according to van Oosterom for all tris"""
     parallel, p_fun, _ = parallel_func(_get_solids, n_jobs)
@@ -1562,8 +1667,8 @@ def add_source_space_distances(src, dist_limit=np.inf, n_jobs=1, verbose=None):
         Note: if limit < np.inf, scipy > 0.13 (bleeding edge as of
         10/2013) must be installed.
     n_jobs : int
-        Number of jobs to run in parallel. Will only use (up to) as many
-        cores as there are source spaces.
+        Number of jobs to run in parallel. The sources of each source space
+        are split in chunks that are processed in parallel.
     verbose : bool, str, int, or None
         If not None, override default verbose level (see mne.verbose).
 
@@ -1610,16 +1715,20 @@ def add_source_space_distances(src, dist_limit=np.inf, n_jobs=1, verbose=None):
             raise RuntimeError('Cannot use "limit < np.inf" unless scipy '
                                '> 0.13 is installed')
 
-    parallel, p_fun, _ = parallel_func(_do_src_distances, n_jobs)
+    parallel, p_fun, n_jobs = parallel_func(_do_src_distances, n_jobs)
     min_dists = list()
     min_idxs = list()
     logger.info('Calculating source space distances (limit=%s mm)...'
                 % (1000 * dist_limit))
     for s in src:
         connectivity = mesh_dist(s['tris'], s['rr'])
-        d = parallel(p_fun(connectivity, s['vertno'], r, dist_limit)
-                     for r in np.array_split(np.arange(len(s['vertno'])),
-                                             n_jobs))
+        # one Dijkstra run per source vertex, each returning a dense row
+        n_use = len(s['vertno'])
+        run_inds = np.arange(n_use)
+        chunks = chunk_jobs(n_use, n_jobs,
+                            cost=1e-7 * s['np'] * np.log(s['np']))
+        d = parallel(p_fun(connectivity, s['vertno'], run_inds[c], dist_limit)
+                     for c in chunks)
         # deal with indexing so we can add patch info
         min_idx = np.array([dd[1] for dd in d])
         min_dist = np.array([dd[2] for dd in d])
@@ -1629,15 +1738,10 @@ def add_source_space_distances(src, dist_limit=np.inf, n_jobs=1, verbose=None):
         min_idx = min_idx[midx, range_idx]
         min_dists.append(min_dist)
         min_idxs.append(min_idx)
-        # now actually deal with distances, convert to sparse representation
-        d = np.concatenate([dd[0] for dd in d], axis=0)
-        i, j = np.meshgrid(s['vertno'], s['vertno'])
-        d = d.ravel()
-        i = i.ravel()
-        j = j.ravel()
-        idx = d > 0
-        d = sparse.csr_matrix((d[idx], (i[idx], j[idx])),
-                              shape=(s['np'], s['np']), dtype=np.float32)
+        # now actually deal with distances, assemble the sparse pieces
+        i, j, d = [np.concatenate([dd[0][k] for dd in d]) for k in range(3)]
+        d = sparse.csr_matrix((d, (i, j)), shape=(s['np'], s['np']),
+                              dtype=np.float32)
         s['dist'] = d
         s['dist_limit'] = np.array([dist_limit], np.float32)
 
@@ -1654,27 +1758,39 @@ def add_source_space_distances(src, dist_limit=np.inf, n_jobs=1, verbose=None):
 
 
 def _do_src_distances(con, vertno, run_inds, limit):
-    """Helper to compute source space distances in chunks"""
+    """Helper to compute source space distances in chunks
+
+    The distances are returned as the (row, col, data) triplets of a sparse
+    matrix, so the memory used scales with the number of distances below
+    the limit rather than with the squared number of sources.
+    """
     if limit < np.inf:
         func = partial(sparse.csgraph.dijkstra, limit=limit)
     else:
         func = sparse.csgraph.dijkstra
-    chunk_size = 100  # save memory by chunking (only a little slower)
-    lims = np.r_[np.arange(0, len(run_inds), chunk_size), len(run_inds)]
-    n_chunks = len(lims) - 1
-    d = np.empty((len(run_inds), len(vertno)))
-    min_dist = np.empty((n_chunks, con.shape[0]))
-    min_idx = np.empty((n_chunks, con.shape[0]), np.int32)
+    # save memory by chunking (only a little slower), each run returns a
+    # dense row over all vertices
+    chunks = chunk_jobs(len(run_inds), 1, nbytes=8 * con.shape[0])
+    min_dist = np.empty((len(chunks), con.shape[0]))
+    min_idx = np.empty((len(chunks), con.shape[0]), np.int32)
     range_idx = np.arange(con.shape[0])
-    for li, (l1, l2) in enumerate(zip(lims[:-1], lims[1:])):
-        idx = vertno[run_inds[l1:l2]]
+    rows, cols, data = list(), list(), list()
+    for ci, c in enumerate(chunks):
+        idx = vertno[run_inds[c]]
         out = func(con, indices=idx)
         midx = np.argmin(out, axis=0)
-        min_idx[li] = idx[midx]
-        min_dist[li] = out[midx, range_idx]
-        d[l1:l2] = out[:, vertno]
+        min_idx[ci] = idx[midx]
+        min_dist[ci] = out[midx, range_idx]
+        out = out[:, vertno]
+        # scipy will give us np.inf for uncalc. distances
+        ii, jj = np.nonzero((out > 0) & (out < np.inf))
+        # distance from source idx[ii] to source vertno[jj] is stored at
+        # [vertno[jj], idx[ii]]
+        rows.append(vertno[jj].astype(np.int32))
+        cols.append(idx[ii].astype(np.int32))
+        data.append(out[ii, jj].astype(np.float32))
     midx = np.argmin(min_dist, axis=0)
     min_dist = min_dist[midx, range_idx]
     min_idx = min_idx[midx, range_idx]
-    d[d == np.inf] = 0  # scipy will give us np.inf for uncalc. distances
+    d = (np.concatenate(rows), np.concatenate(cols), np.concatenate(data))
     return d, min_idx, min_dist
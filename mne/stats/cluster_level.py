@@ -14,8 +14,8 @@ from scipy import stats, sparse, ndimage
 import warnings
 
 from .parametric import f_oneway
-from ..parallel import parallel_func, check_n_jobs
-from ..utils import split_list, logger, verbose
+from ..parallel import parallel_func, check_n_jobs, chunk_jobs
+from ..utils import logger, verbose, profiled
 from ..fixes import in1d, unravel_index
 from ..source_estimate import SourceEstimate
 
@@ -241,6 +241,7 @@ def _get_components(x_in, connectivity, return_list=True):
         return components
 
 
+@profiled
 def _find_clusters(x, threshold, tail=0, connectivity=None, max_step=1,
                    include=None, partitions=None, t_power=1, show_info=False):
     """For a given 1d-array (test statistic), find all clusters which
@@ -763,7 +764,7 @@ def _permutation_cluster_test(X, threshold, n_permutations, tail, stat_fun,
         slices = [slice(splits_idx[k], splits_idx[k + 1])
                                                     for k in range(len(X))]
 
-    parallel, my_do_perm_func, _ = parallel_func(do_perm_func, n_jobs)
+    parallel, my_do_perm_func, n_jobs = parallel_func(do_perm_func, n_jobs)
 
     # Step 2: If we have some clusters, repeat process on permuted data
     # -------------------------------------------------------------------
@@ -785,6 +786,9 @@ def _permutation_cluster_test(X, threshold, n_permutations, tail, stat_fun,
             else:
                 seeds = list(seed + np.arange(n_permutations))
 
+        # rough cost of one permutation (in seconds)
+        chunks = chunk_jobs(len(seeds), n_jobs, cost=1e-8 * X_full.size)
+
         # Step 3: repeat permutations for step-down-in-jumps procedure
         n_removed = 1  # number of new clusters added
         total_removed = 0
@@ -802,7 +806,7 @@ def _permutation_cluster_test(X, threshold, n_permutations, tail, stat_fun,
             H0 = parallel(my_do_perm_func(X_full, slices, threshold, tail,
                           connectivity, stat_fun, max_step, this_include,
                           partitions, t_power, s, sample_shape, buffer_size)
-                          for s in split_list(seeds, n_jobs))
+                          for s in [seeds[c] for c in chunks])
             H0 = np.concatenate(H0)
             cluster_pv = _pval_from_histogram(cluster_stats, H0, tail)
 
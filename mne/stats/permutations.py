@@ -9,7 +9,7 @@
 from math import sqrt
 import numpy as np
 
-from ..parallel import parallel_func
+from ..parallel import parallel_func, chunk_jobs
 from .. import verbose
 
 
@@ -134,8 +134,11 @@ def permutation_t_test(X, n_permutations=10000, tail=0, n_jobs=1,
 
     parallel, my_max_stat, n_jobs = parallel_func(_max_stat, n_jobs)
 
-    max_abs = np.concatenate(parallel(my_max_stat(X, X2, p, dof_scaling)
-                                      for p in np.array_split(perms, n_jobs)))
+    # rough cost of one permutation (in seconds)
+    chunks = chunk_jobs(len(perms), n_jobs, cost=2e-9 * X.size)
+    max_abs = np.concatenate(parallel(my_max_stat(X, X2, perms[c],
+                                                  dof_scaling)
+                                      for c in chunks))
     H0 = np.sort(max_abs)
 
     scaling = float(n_permutations + 1)
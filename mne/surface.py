@@ -9,7 +9,10 @@ import os
 from os import path as op
 import sys
 from struct import pack
+import hashlib
+from multiprocessing.pool import ThreadPool
 import numpy as np
+from scipy.spatial import cKDTree
 from scipy.spatial.distance import cdist
 from scipy import sparse
 from fnmatch import fnmatch
@@ -23,7 +26,8 @@ from .fiff.write import (write_int, write_float, write_float_matrix,
                          write_int_matrix, start_file, end_block,
                          start_block, end_file, write_string,
                          write_float_sparse_rcs)
-from .utils import logger, verbose, get_subjects_dir
+from .utils import logger, verbose, get_subjects_dir, _LRUCache
+from .parallel import chunk_jobs
 from .transforms import transform_surface_to
 
 
@@ -539,7 +543,24 @@ def _normalize_vectors(rr):
     rr /= size[:, np.newaxis]  # operate in-place
 
 
-def _compute_nearest(xhs, rr, use_balltree=True, return_dists=False):
+_nearest_tree_cache = _LRUCache(max_size=8)  # KD-trees built on surfaces
+
+
+def _get_nearest_tree(xhs):
+    """Get a KD-tree of the points, using the cache if possible"""
+    xhs = np.ascontiguousarray(xhs, dtype=np.float64)
+    md5 = hashlib.md5()
+    md5.update(str(xhs.shape).encode('utf-8'))
+    md5.update(xhs)
+    key = md5.hexdigest()
+    tree = _nearest_tree_cache.get(key)
+    if tree is None:
+        tree = cKDTree(xhs)
+        _nearest_tree_cache.set(key, tree)
+    return tree
+
+
+def _compute_nearest(xhs, rr, use_tree=True, return_dists=False, n_jobs=1):
     """Find nearest neighbors
 
     Note: The rows in xhs and rr must all be unit-length vectors, otherwise
@@ -551,30 +572,39 @@ def _compute_nearest(xhs, rr, use_balltree=True, return_dists=False):
         Points of data set.
     rr : array, shape=(n_query, n_dim)
         Points to find nearest neighbors for.
-    use_balltree : bool
-        Use fast BallTree based search from scikit-learn. If scikit-learn
-        is not installed it will fall back to the slow brute force search.
+    use_tree : bool
+        Use fast KD-tree based search (scipy.spatial.cKDTree). The trees are
+        cached, so repeated searches in the same points are faster. If False,
+        use the slow brute force search.
+    return_dists : bool
+        If True, also return the distances to the nearest neighbors.
+    n_jobs : int
+        Number of threads used for the KD-tree queries.
 
     Returns
     -------
     nearest : array, shape=(n_query,)
         Index of nearest neighbor in xhs for every point in rr.
+    dists : array, shape=(n_query,)
+        The distances. Only returned if return_dists is True.
     """
-    if use_balltree:
-        try:
-            from sklearn.neighbors import BallTree
-        except ImportError:
-            logger.info('Nearest-neighbor searches will be significantly '
-                        'faster if scikit-learn is installed.')
-            use_balltree = False
-
-    if use_balltree is True:
-        ball_tree = BallTree(xhs)
+    if use_tree is True:
+        tree = _get_nearest_tree(xhs)
+        rr = np.asarray(rr, dtype=np.float64)
+        blocks = chunk_jobs(len(rr), n_jobs, cost=1e-6)
+        if n_jobs == 1 or len(blocks) <= 1:
+            dists, nearest = tree.query(rr, k=1)
+        else:
+            # the queries release the GIL, so threads share the tree
+            pool = ThreadPool(n_jobs)
+            try:
+                out = pool.map(lambda b: tree.query(rr[b], k=1), blocks)
+            finally:
+                pool.close()
+            dists, nearest = [np.concatenate(o) for o in zip(*out)]
         if return_dists:
-            out = ball_tree.query(rr, k=1, return_distance=True)
-            return out[1][:, 0], out[0][:, 0]
+            return nearest, dists
         else:
-            nearest = ball_tree.query(rr, k=1, return_distance=False)[:, 0]
             return nearest
     else:
         if return_dists:
@@ -1153,16 +1183,17 @@ def _get_tri_supp_geom(tris, rr):
 
 
 @verbose
-def _make_morph_map(subject_from, subject_to, subjects_dir=None):
+def _make_morph_map(subject_from, subject_to, subjects_dir=None, n_jobs=1,
+                    verbose=None):
     """Construct morph map from one subject to another
 
     Note that this is close, but not exactly like the C version.
     For example, parts are more accurate due to double precision,
     so expect some small morph-map differences!
 
-    Note: This seems easily parallelizable, but the overhead
-    of pickling all the data structures makes it less efficient
-    than just running on a single core :(
+    The nearest triangles are found for blocks of points at once. With
+    n_jobs > 1 the blocks are processed in threads, which avoids the
+    overhead of pickling the data structures for other processes.
     """
     subjects_dir = get_subjects_dir(subjects_dir)
     morph_maps = list()
@@ -1193,17 +1224,14 @@ def _make_morph_map(subject_from, subject_to, subjects_dir=None):
         _normalize_vectors(to_pts)
 
         # from surface: get nearest neighbors, find triangles for each vertex
-        nn_pts_idx = _compute_nearest(from_pts, to_pts)
+        nn_pts_idx = _compute_nearest(from_pts, to_pts, n_jobs=n_jobs)
         from_pt_tris = _triangle_neighbors(from_tris, len(from_pts))
         from_pt_tris = [from_pt_tris[pt_idx] for pt_idx in nn_pts_idx]
 
         # find triangle in which point lies and assoc. weights
-        nn_tri_inds = []
-        nn_tris_weights = []
-        for pt_tris, to_pt in zip(from_pt_tris, to_pts):
-            p, q, idx, dist = _find_nearest_tri_pt(pt_tris, to_pt, tri_geom)
-            nn_tri_inds.append(idx)
-            nn_tris_weights.extend([1. - (p + q), p, q])
+        p, q, nn_tri_inds = _find_nearest_tri_pts(from_pt_tris, to_pts,
+                                                  tri_geom, n_jobs=n_jobs)[:3]
+        nn_tris_weights = np.c_[1. - (p + q), p, q].ravel()
 
         nn_tris = from_tris[nn_tri_inds]
         row_ind = np.repeat(np.arange(n_to_pts), 3)
@@ -1215,6 +1243,96 @@ def _make_morph_map(subject_from, subject_to, subjects_dir=None):
     return morph_maps
 
 
+def _find_nearest_tri_pts(pt_tris, to_pts, tri_geom, run_all=False,
+                          n_jobs=1):
+    """Find nearest point mapping to sets of triangles for many points
+
+    This gives the same results as calling _find_nearest_tri_pt for each
+    point in to_pts (with its set of triangles in the list pt_tris), but
+    the points are processed in blocks with array operations.
+    """
+    n_pts = len(to_pts)
+    counts = np.array([len(t) for t in pt_tris], int)
+    offsets = np.r_[0, np.cumsum(counts)]
+    pt_tris = np.concatenate(pt_tris).astype(int)
+    # (one entry for each pair of point and candidate triangle)
+    nbytes = 600 * counts
+    blocks = chunk_jobs(n_pts, n_jobs, nbytes=nbytes)
+    args = [(pt_tris[offsets[b.start]:offsets[b.stop]], counts[b],
+             to_pts[b], tri_geom, run_all) for b in blocks]
+    if n_jobs == 1 or len(blocks) == 1:
+        out = [_find_nearest_tri_pts_block(*a) for a in args]
+    else:
+        pool = ThreadPool(n_jobs)
+        try:
+            out = pool.map(lambda a: _find_nearest_tri_pts_block(*a), args)
+        finally:
+            pool.close()
+    p, q, pt, dist = [np.concatenate(o) for o in zip(*out)]
+    return p, q, pt, dist
+
+
+def _group_first(groups, *keys):
+    """Get the index of the smallest element (by keys) of each group
+
+    Ties are broken by the following keys, then by the position of the
+    elements (the sort is stable).
+    """
+    order = np.lexsort(tuple(keys[::-1]) + (groups,))
+    first = np.r_[True, groups[order][1:] != groups[order][:-1]]
+    return order[first]
+
+
+def _find_nearest_tri_pts_block(pt_tris, counts, to_pts, tri_geom, run_all):
+    """Vectorized _find_nearest_tri_pt for a block of points"""
+    n_pts = len(to_pts)
+    pt_idx = np.repeat(np.arange(n_pts), counts)
+    # same computations as in _find_nearest_tri_pt, for all pairs at once
+    rrs = to_pts[pt_idx] - tri_geom['r1'][pt_tris]
+    vect = np.einsum('ijk,ik->ij', tri_geom['r1213'][pt_tris], rrs)
+    pqs = np.einsum('ijk,ik->ji', tri_geom['mat'][pt_tris], vect)
+    dists = np.sum(rrs * tri_geom['nn'][pt_tris], axis=1)
+    inside = (np.all(pqs >= 0., axis=0) & np.all(pqs <= 1., axis=0) &
+              (np.sum(pqs, axis=0) < 1.))
+
+    p = np.zeros(n_pts)
+    q = np.zeros(n_pts)
+    pt = np.zeros(n_pts, int)
+    dist = np.empty(n_pts)
+    dist.fill(np.inf)
+
+    # points lying within triangles: take the closest triangle
+    idx = np.where(inside)[0]
+    if len(idx) > 0:
+        idx = idx[_group_first(pt_idx[idx], np.abs(dists[idx]))]
+        use = pt_idx[idx]
+        p[use], q[use] = pqs[:, idx]
+        pt[use] = pt_tris[idx]
+        dist[use] = dists[idx]
+
+    # points not found (or all of them with run_all) must check the sides
+    # of the triangles they are not inside of
+    check = ~inside
+    if not run_all:
+        check &= np.isinf(dist[pt_idx])
+    idx = np.where(check)[0]
+    if len(idx) > 0:
+        pp, qq, distt = _nearest_tri_edges(pt_tris[idx], pqs[:, idx],
+                                           dists[idx], tri_geom)
+        n_idx = len(idx)
+        # the sides are ordered as in _nearest_tri_edge: all the triangles
+        # for side 1 -> 2, then 2 -> 3 and 1 -> 3
+        best = _group_first(np.tile(pt_idx[idx], 3), np.abs(distt),
+                            np.repeat(np.arange(3), n_idx))
+        use = pt_idx[idx[best % n_idx]]
+        closer = np.abs(distt[best]) < np.abs(dist[use])
+        best, use = best[closer], use[closer]
+        p[use], q[use] = pp[best], qq[best]
+        pt[use] = pt_tris[idx[best % n_idx]]
+        dist[use] = distt[best]
+    return p, q, pt, dist
+
+
 def _find_nearest_tri_pt(pt_tris, to_pt, tri_geom, run_all=False):
     """Find nearest point mapping to a set of triangles
 
@@ -1273,6 +1391,17 @@ def _find_nearest_tri_pt(pt_tris, to_pt, tri_geom, run_all=False):
 
 def _nearest_tri_edge(pt_tris, to_pt, pqs, dist, tri_geom):
     """Get nearest location from a point to the edge of a set of triangles"""
+    pp, qq, dists = _nearest_tri_edges(pt_tris, pqs, dist, tri_geom)
+    ii = np.argmin(np.abs(dists))
+    p, q, pt, dist = pp[ii], qq[ii], pt_tris[ii % len(pt_tris)], dists[ii]
+    return p, q, pt, dist
+
+
+def _nearest_tri_edges(pt_tris, pqs, dist, tri_geom):
+    """Get nearest locations on the three sides of each triangle
+
+    The results are concatenated for the sides 1 -> 2, 2 -> 3 and 1 -> 3.
+    """
     # We might do something intelligent here. However, for now
     # it is ok to do it in the hard way
     aa = tri_geom['a'][pt_tris]
@@ -1296,13 +1425,11 @@ def _nearest_tri_edge(pt_tris, to_pt, pqs, dist, tri_geom):
                                / bb, 0.0), 1.0)
     p2 = np.zeros_like(q2)
 
-    # figure out which one had the lowest distance
+    # distances to the nearest points
     dist0 = _get_tri_dist(pp, qq, p0, q0, aa, bb, cc, dist)
     dist1 = _get_tri_dist(pp, qq, p1, q1, aa, bb, cc, dist)
     dist2 = _get_tri_dist(pp, qq, p2, q2, aa, bb, cc, dist)
     pp = np.r_[p0, p1, p2]
     qq = np.r_[q0, q1, q2]
     dists = np.r_[dist0, dist1, dist2]
-    ii = np.argmin(np.abs(dists))
-    p, q, pt, dist = pp[ii], qq[ii], pt_tris[ii % len(pt_tris)], dists[ii]
-    return p, q, pt, dist
+    return pp, qq, dists
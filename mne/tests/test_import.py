@@ -0,0 +1,31 @@
+import subprocess
+import sys
+
+from nose.tools import assert_true, assert_equal
+
+import mne
+
+lazy_modules = ['mne.forward', 'mne.minimum_norm', 'mne.viz', 'mne.stats',
+                'mne.time_frequency', 'mne.connectivity', 'mne.gui']
+
+
+def test_lazy_import():
+    """Test that heavy submodules are not imported with mne
+    """
+    code = ('import sys, mne; '
+            'print(" ".join(m for m in %r if m in sys.modules))'
+            % lazy_modules)
+    out = subprocess.check_output([sys.executable, '-c', code])
+    assert_equal(out.decode().strip(), '')
+
+def test_lazy_attributes():
+    """Test access to lazily imported submodules and names
+    """
+    assert_true(mne.forward.read_forward_solution is
+                mne.read_forward_solution)
+    from mne import make_forward_solution, minimum_norm
+    assert_true(make_forward_solution is mne.forward.make_forward_solution)
+    assert_true(minimum_norm is sys.modules['mne.minimum_norm'])
+    for name in ('viz', 'stats', 'read_forward_solution'):
+        assert_true(name in dir(mne))
+    assert_true(not hasattr(mne, 'foo'))
@@ -0,0 +1,35 @@
+from numpy.testing import assert_array_equal
+from nose.tools import assert_true, assert_equal, assert_raises
+import numpy as np
+
+from mne.parallel import chunk_jobs
+
+
+def test_chunk_jobs():
+    """Test splitting of work items in chunks for parallel jobs
+    """
+    for n_items, n_jobs in ((10, 3), (2, 8), (1000, 4)):
+        chunks = chunk_jobs(n_items, n_jobs)
+        assert_equal(len(chunks), min(n_items, n_jobs))
+        assert_array_equal(np.concatenate([np.arange(n_items)[c]
+                                           for c in chunks]),
+                           np.arange(n_items))
+    assert_equal(chunk_jobs(0, 4), list())
+
+    # cheap items are grouped to amortize the dispatch overhead
+    assert_equal(len(chunk_jobs(1000, 4, cost=1e-6)), 1)
+    assert_equal(len(chunk_jobs(1000, 4, cost=1e-3)), 4)
+
+    # uneven items are split in more chunks of roughly equal cost
+    cost = np.linspace(0, 1, 100)
+    chunks = chunk_jobs(100, 4, cost=cost)
+    assert_true(len(chunks) > 4)
+    chunk_cost = [cost[c].sum() for c in chunks]
+    assert_true(max(chunk_cost) < 2 * np.mean(chunk_cost))
+
+    # memory budget
+    chunks = chunk_jobs(100, 2, nbytes=1e6, max_nbytes=1e7)
+    assert_equal(len(chunks), 10)
+    chunks = chunk_jobs(100, 2, nbytes=1e7)  # default budget (100 MB)
+    assert_equal(len(chunks), 10)
+    assert_raises(ValueError, chunk_jobs, 10, 2, cost=np.ones(3))
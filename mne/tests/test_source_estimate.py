@@ -1,4 +1,5 @@
 from __future__ import print_function
+import os
 import os.path as op
 from nose.tools import assert_true, assert_raises
 import warnings
@@ -9,14 +10,21 @@ from numpy.testing import (assert_array_almost_equal, assert_array_equal,
                            assert_allclose, assert_equal)
 
 from scipy.fftpack import fft
+from scipy import sparse
 
 from mne.datasets import sample
 from mne import (stats, SourceEstimate, VolSourceEstimate, Label,
                  read_source_spaces)
-from mne import read_source_estimate, morph_data, extract_label_time_course
+from mne import (read_source_estimate, morph_data, extract_label_time_course,
+                 LabelExtractor)
 from mne.source_estimate import (spatio_temporal_tris_connectivity,
                                  spatio_temporal_src_connectivity,
-                                 compute_morph_matrix, grade_to_vertices)
+                                 compute_morph_matrix, grade_to_vertices,
+                                 _morph_cache, _smoothing_operator,
+                                 mesh_edges, _get_vol_interpolator,
+                                 _vol_interpolator_cache, _morph_cache_key,
+                                 _get_morph_cache_fname)
+from mne.surface import _get_ico_surface
 
 from mne.minimum_norm import read_inverse_operator
 from mne.label import read_annot, label_sign_flip
@@ -92,10 +100,13 @@ def test_volume_stc():
                                   decimal=5)
 
         # export without saving
-        img = stc.as_volume(src, dest='mri', mri_resolution=True)
-        assert_true(img.shape == t1_img.shape + (len(stc.times),))
-        assert_array_almost_equal(img.get_affine(), t1_img.get_affine(),
+        img_mem = stc.as_volume(src, dest='mri', mri_resolution=True)
+        assert_true(img_mem.shape == t1_img.shape + (len(stc.times),))
+        assert_array_almost_equal(img_mem.get_affine(), t1_img.get_affine(),
                                   decimal=5)
+        # the volumes written one block at a time are the same
+        assert_allclose(img.get_data(), img_mem.get_data(), rtol=1e-6,
+                        atol=1e-6 * np.abs(img_mem.get_data()).max())
 
     except ImportError:
         print('Save as nifti test skipped, needs NiBabel')
@@ -304,6 +315,18 @@ def test_extract_label_time_course():
             if mode == 'max':
                 assert_array_almost_equal(tc1, label_maxs)
 
+        # precomputed extractor, also with a stacked batch of stcs
+        extractor = LabelExtractor(labels, src, mode=mode)
+        assert_equal(extractor.operator is None,
+                     mode in ('pca_flip', 'max'))
+        label_tc_extractor = extractor.extract(stcs)
+        label_tc_data = extractor.extract_data([stc.data for stc in stcs])
+        assert_true(label_tc_data.shape == (n_stcs, n_labels, n_times))
+        for tc1, tc2, tc3 in zip(label_tc, label_tc_extractor, label_tc_data):
+            assert_array_almost_equal(tc1, tc2)
+            assert_array_almost_equal(tc1, tc3)
+    assert_raises(ValueError, extractor.extract_data, np.zeros((3, n_times)))
+
     # test label with very few vertices (check SVD conditionals)
     label = Label(vertices=src[0]['vertno'][:2], hemi='lh')
     x = label_sign_flip(label, src)
@@ -313,6 +336,39 @@ def test_extract_label_time_course():
     assert_true(x.size == 0)
 
 
+def test_morph_smoothing_operator():
+    """Test the smoothing operator of morphing against iterative smoothing
+    """
+    rng = np.random.RandomState(0)
+    tris = _get_ico_surface(3)['tris']
+    e = mesh_edges(tris)
+    e.data[e.data == 2] = 1
+    n_vertices = e.shape[0]
+    e = e + sparse.eye(n_vertices, n_vertices)
+    idx_use = np.sort(rng.permutation(n_vertices)[:50])
+    data = rng.randn(len(idx_use), 10)
+    for smooth in (1, 3, 6):
+        # smooth the data iteratively, normalizing by the number of
+        # neighbors that have values
+        smoothed = np.zeros((n_vertices, data.shape[1]))
+        smoothed[idx_use] = data
+        use = np.zeros(n_vertices)
+        use[idx_use] = 1
+        for k in range(smooth):
+            data_sum = e * use
+            smoothed = e * smoothed
+            use = (data_sum > 0).astype(float)
+            smoothed[use > 0] /= data_sum[use > 0][:, np.newaxis]
+        smooth_mat = _smoothing_operator(idx_use, e, smooth, n_vertices)
+        assert_true(smooth_mat.shape == (n_vertices, len(idx_use)))
+        assert_array_almost_equal(smooth_mat * data, smoothed, 12)
+    # fill the surface
+    smooth_mat = _smoothing_operator(idx_use, e, None, n_vertices)
+    assert_array_equal(np.unique(smooth_mat.nonzero()[0]),
+                       np.arange(n_vertices))
+    assert_raises(ValueError, _smoothing_operator, idx_use, e, 0, n_vertices)
+
+
 @sample.requires_sample_data
 def test_morph_data():
     """Test morphing of data
@@ -349,6 +405,35 @@ def test_morph_data():
     stc_to3 = stc_from.morph_precomputed(subject_to, vertices_to, morph_mat)
     assert_array_almost_equal(stc_to1.data, stc_to3.data)
 
+    # make sure cached morph matrices are reused and exact
+    cache_dir = op.join(tempdir, 'cache')
+    os.environ['MNE_CACHE_DIR'] = cache_dir
+    try:
+        _morph_cache.clear()
+        morph_mat_2 = compute_morph_matrix(subject_from, subject_to,
+                                           stc_from.vertno, vertices_to,
+                                           smooth=12,
+                                           subjects_dir=subjects_dir)
+        assert_equal(len(os.listdir(op.join(cache_dir, 'morph-matrices'))),
+                     1)
+        assert_equal(len(_morph_cache), 1)
+        assert_array_equal(morph_mat.toarray(), morph_mat_2.toarray())
+        _morph_cache.clear()  # read from disk
+        morph_mat_2 = compute_morph_matrix(subject_from, subject_to,
+                                           stc_from.vertno, vertices_to,
+                                           smooth=12,
+                                           subjects_dir=subjects_dir)
+        assert_array_equal(morph_mat.toarray(), morph_mat_2.toarray())
+        morph_mat_2 = compute_morph_matrix(subject_from, subject_to,
+                                           stc_from.vertno, vertices_to,
+                                           smooth=11,
+                                           subjects_dir=subjects_dir)
+        assert_equal(len(_morph_cache), 2)
+        assert_true(abs(morph_mat - morph_mat_2).max() > 0)
+    finally:
+        del os.environ['MNE_CACHE_DIR']
+        _morph_cache.clear()
+
     mean_from = stc_from.data.mean(axis=0)
     mean_to = stc_to1.data.mean(axis=0)
     assert_true(np.corrcoef(mean_to, mean_from).min() > 0.999)
@@ -405,6 +490,66 @@ def test_transform_data():
             assert_allclose(data_f, stc_data_t)
 
 
+def test_factored_stc():
+    """Test operations that keep the (kernel, sens_data) representation"""
+    rng = np.random.RandomState(0)
+    n_sensors, n_verts_lh, n_verts_rh, n_times = 10, 12, 8, 20
+    vertices = [np.arange(n_verts_lh), np.arange(n_verts_rh)]
+    kernel = rng.randn(n_verts_lh + n_verts_rh, n_sensors)
+    sens_data = rng.randn(n_sensors, n_times)
+    data = np.dot(kernel, sens_data)
+
+    def _make():
+        return SourceEstimate((kernel, sens_data), vertices, -0.1, 0.01,
+                              subject='sample')
+
+    def _assert_factored(stc, want):
+        assert_true(stc._data is None)
+        assert_allclose(stc.data, want)
+
+    stc = _make()
+    _assert_factored(stc.copy().crop(0., 0.05), data[:, 10:16])
+    _assert_factored(stc.mean(), data.mean(axis=1)[:, np.newaxis])
+    stc_dense = SourceEstimate(data, vertices, -0.1, 0.01, subject='sample')
+    _assert_factored(stc.bin(0.05), stc_dense.bin(0.05).data)
+    _assert_factored(stc * 2, 2 * data)
+    _assert_factored(-(stc / 2.), -data / 2.)
+    _assert_factored(stc + _make() - stc, data)
+    label = Label(vertices=np.arange(2, 6), hemi='rh', subject='sample')
+    _assert_factored(stc.in_label(label), data[n_verts_lh + 2:n_verts_lh + 6])
+    assert_true(stc._data is None)
+
+    # adding different kernels has to compute the data
+    stc_2 = SourceEstimate((2 * kernel, sens_data), vertices, -0.1, 0.01,
+                           subject='sample')
+    assert_allclose((stc + stc_2).data, 3 * data)
+    assert_allclose((stc + 1).data, data + 1)
+    assert_true(stc._data is None)
+
+    # label time courses
+    src = [dict(vertno=v, nn=np.tile([0., 0., 1.], (len(v), 1)))
+           for v in vertices]
+    for mode in ('mean', 'max'):
+        tc = extract_label_time_course(stc, label, src, mode=mode)
+        assert_allclose(tc, extract_label_time_course(stc_dense, label, src,
+                                                      mode=mode))
+    assert_true(stc._data is None)
+
+    # morphing with a precomputed matrix only morphs the kernel
+    morph_mat = sparse.random(30, n_verts_lh + n_verts_rh, density=0.2,
+                              format='csr', random_state=0)
+    vertices_to = [np.arange(15), np.arange(15)]
+    stc_to = stc.morph_precomputed('fsaverage', vertices_to, morph_mat)
+    _assert_factored(stc_to, morph_mat * data)
+
+    # saving
+    fname = op.join(tempdir, 'factored')
+    stc.save(fname)
+    assert_true(stc._data is None)
+    assert_allclose(read_source_estimate(fname).data, data, rtol=1e-5,
+                    atol=1e-6)
+
+
 def test_transform():
     """Test applying linear (time) transform to data"""
     # make up some data
@@ -456,6 +601,43 @@ def test_transform():
     assert_array_equal(stc.data, data_t)
 
 
+def test_morph_cache_key():
+    """Test that regenerated morph maps invalidate cached morph matrices
+    """
+    subjects_dir = _TempDir()
+    os.mkdir(op.join(subjects_dir, 'morph-maps'))
+    fname = op.join(subjects_dir, 'morph-maps', 'a-b-morph.fif')
+    vertices = [np.arange(10), np.arange(5)]
+    keys = [_morph_cache_key(('a', 'b'), vertices, 5, subjects_dir)]
+    for content in ('map', 'new map'):
+        with open(fname, 'w') as fid:
+            fid.write(content)
+        keys.append(_morph_cache_key(('a', 'b'), vertices, 5, subjects_dir))
+    assert_equal(len(set(keys)), 3)
+    # without MNE_CACHE_DIR, morph matrices are not written to disk
+    old_cache_dir = os.environ.pop('MNE_CACHE_DIR', None)
+    try:
+        assert_true(_get_morph_cache_fname('a', 'b', keys[0]) is None)
+    finally:
+        if old_cache_dir is not None:
+            os.environ['MNE_CACHE_DIR'] = old_cache_dir
+
+
+def test_vol_interpolator_cache():
+    """Test the cache of volume interpolators
+    """
+    _vol_interpolator_cache.clear()
+    interpolator = sparse.csr_matrix(np.random.RandomState(0).rand(20, 10))
+    s = dict(interpolator=interpolator, inuse=np.arange(10) % 2)
+    interp = _get_vol_interpolator(s)
+    assert_equal(interp.shape, (20, 5))
+    assert_array_equal(interp.toarray(), interpolator.toarray()[:, 1::2])
+    assert_equal(len(_vol_interpolator_cache), 1)
+    assert_true(_get_vol_interpolator(s) is interp)
+    # the cache does not keep the interpolator alive
+    del s, interpolator
+    assert_equal(len(_vol_interpolator_cache), 0)
+
 @requires_sklearn
 def test_spatio_temporal_tris_connectivity():
     """Test spatio-temporal connectivity from triangles"""
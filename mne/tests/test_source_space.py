@@ -16,7 +16,9 @@ from mne import (read_source_spaces, vertex_to_mni, write_source_spaces,
 from mne.utils import (_TempDir, requires_fs_or_nibabel, requires_nibabel,
                        requires_freesurfer, run_subprocess,
                        requires_mne, requires_scipy_version)
-from mne.surface import _accumulate_normals, _triangle_neighbors
+from mne.surface import (_accumulate_normals, _triangle_neighbors,
+                         _get_ico_surface, _normalize_vectors)
+from mne.source_space import _points_outside_surface, _sum_solids_div
 from mne.externals.six.moves import zip
 
 # WARNING: test_source_space is imported by forward, so download=False
@@ -268,6 +270,26 @@ def test_accumulate_normals():
     assert_allclose(nn, this['nn'], rtol=1e-7, atol=1e-7)
 
 
+def test_points_outside_surface():
+    """Test the ray-crossing check of points outside a surface"""
+    rng = np.random.RandomState(0)
+    surf = _get_ico_surface(3)
+    rr = surf['rr'].copy()
+    _normalize_vectors(rr)
+    # make it non-convex
+    rr *= (0.07 + 0.02 * np.sin(4 * rr[:, [0]]) * np.cos(3 * rr[:, [1]]))
+    surf = dict(rr=rr, tris=surf['tris'])
+    pts = np.r_[rng.uniform(-0.1, 0.1, (1000, 3)),
+                np.array(np.meshgrid(*[np.arange(-0.1, 0.1001, 0.02)] * 3)
+                         ).reshape(3, -1).T,
+                rr[:100], rr[100:200] * 1.0001, rr[200:300] * 0.9999]
+    outside = np.abs(_sum_solids_div(pts, surf, 1) - 1.0) > 1e-5
+    assert_array_equal(_points_outside_surface(pts, surf), outside)
+    assert_true(0 < np.sum(outside) < len(pts))
+    assert_array_equal(_points_outside_surface(np.zeros((0, 3)), surf),
+                       np.zeros(0, bool))
+
+
 @sample.requires_sample_data
 def test_setup_source_space():
     """Test setting up ico, oct, and all source spaces
@@ -8,9 +8,12 @@ from numpy.testing import (assert_array_equal, assert_array_almost_equal,
 from mne.datasets import sample
 from mne import (read_bem_surfaces, write_bem_surface, read_surface,
                  write_surface, decimate_surface)
+from mne import surface
 from mne.surface import (_make_morph_map, read_morph_map, _compute_nearest,
                          fast_cross_3d, get_head_surf,
-                         get_meg_helmet_surf)
+                         get_meg_helmet_surf, _get_ico_surface,
+                         _get_tri_supp_geom, _triangle_neighbors,
+                         _find_nearest_tri_pt, _find_nearest_tri_pts)
 from mne.utils import _TempDir, requires_tvtk
 from mne.fiff import read_info
 from mne.transforms import _get_mri_head_t_from_trans_file
@@ -66,20 +69,58 @@ def test_compute_nearest():
     nn_true = np.random.permutation(np.arange(500, dtype=np.int))[:20]
     y = x[nn_true]
 
-    nn1 = _compute_nearest(x, y, use_balltree=False)
-    nn2 = _compute_nearest(x, y, use_balltree=True)
+    nn1 = _compute_nearest(x, y, use_tree=False)
+    nn2 = _compute_nearest(x, y, use_tree=True)
     assert_array_equal(nn_true, nn1)
     assert_array_equal(nn_true, nn2)
 
     # test distance support
-    nnn1 = _compute_nearest(x, y, use_balltree=False, return_dists=True)
-    nnn2 = _compute_nearest(x, y, use_balltree=True, return_dists=True)
+    nnn1 = _compute_nearest(x, y, use_tree=False, return_dists=True)
+    nnn2 = _compute_nearest(x, y, use_tree=True, return_dists=True)
     assert_array_equal(nnn1[0], nn_true)
     assert_array_equal(nnn1[1], np.zeros_like(nn1))  # all dists should be 0
     assert_equal(len(nnn1), len(nnn2))
     for nn1, nn2 in zip(nnn1, nnn2):
         assert_array_equal(nn1, nn2)
 
+    # the trees are cached, threaded queries give the same result
+    surface._nearest_tree_cache.clear()
+    y = np.random.randn(50000, 3)
+    y /= np.sqrt(np.sum(y ** 2, axis=1))[:, None]
+    nnn1 = _compute_nearest(x, y, return_dists=True)
+    nnn2 = _compute_nearest(x, y, return_dists=True, n_jobs=2)
+    assert_equal(len(surface._nearest_tree_cache), 1)
+    for nn1, nn2 in zip(nnn1, nnn2):
+        assert_array_equal(nn1, nn2)
+    _compute_nearest(y, x)
+    assert_equal(len(surface._nearest_tree_cache), 2)
+    surface._nearest_tree_cache.clear()
+
+
+def test_find_nearest_tri_pts():
+    """Test vectorized search of the nearest triangles
+    """
+    rng = np.random.RandomState(0)
+    surf = _get_ico_surface(3)
+    geom = _get_tri_supp_geom(surf['tris'], surf['rr'])
+    pts = rng.randn(500, 3)
+    pts /= np.sqrt(np.sum(pts ** 2, axis=1))[:, np.newaxis]
+    pts[:10] = surf['rr'][:10]  # lie exactly on vertices
+    neighbor_tri = _triangle_neighbors(surf['tris'], len(surf['rr']))
+    nearest = _compute_nearest(surf['rr'], pts)
+    for run_all in (False, True):
+        pt_tris = [neighbor_tri[n] for n in nearest]
+        if run_all:  # add some triangles that the points are not within
+            pt_tris = [np.unique(np.r_[t, rng.randint(len(surf['tris']),
+                                                      size=5)])
+                       for t in pt_tris]
+        want = [_find_nearest_tri_pt(t, pt, geom, run_all)
+                for t, pt in zip(pt_tris, pts)]
+        for n_jobs in (1, 2):
+            got = _find_nearest_tri_pts(pt_tris, pts, geom, run_all, n_jobs)
+            for w, g in zip(zip(*want), got):
+                assert_allclose(w, g, rtol=1e-12, atol=1e-12)
+
 
 @sample.requires_sample_data
 def test_make_morph_maps():
@@ -1,16 +1,22 @@
 from numpy.testing import assert_equal
 from nose.tools import assert_true, assert_raises
+from nose.plugins.skip import SkipTest
 import os.path as op
 import numpy as np
 import os
+import json
+import logging
 import warnings
 from ..externals.six.moves import urllib
 
 from ..utils import (set_log_level, set_log_file, _TempDir,
                      get_config, set_config, deprecated, _fetch_file,
                      sum_squared, requires_mem_gb, estimate_rank,
-                     _url_to_local_path, sizeof_fmt)
-from ..fiff import Evoked, show_fiff
+                     _url_to_local_path, sizeof_fmt, profile_context,
+                     verbose, logger, _LRUCache, _clear_caches)
+from .. import utils
+from ..fiff import Evoked, show_fiff, Raw
+from ..filter import _overlap_add_filter
 
 warnings.simplefilter('always')  # enable b/c these tests throw warnings
 
@@ -115,6 +121,84 @@ def test_logging():
     assert_equal(new_lines, old_lines)
 
 
+@verbose
+def _get_level(verbose=None):
+    return logger.level
+
+
+@verbose
+def _raise_error(verbose=None):
+    raise RuntimeError
+
+
+def test_verbose_decorator():
+    """Test the verbose decorator
+    """
+    old_level = set_log_level('INFO', return_old_level=True)
+    assert_equal(_get_level(), logging.INFO)
+    assert_equal(_get_level('WARNING'), logging.WARNING)
+    assert_equal(_get_level(verbose=True), logging.INFO)
+    assert_equal(_get_level(False), logging.WARNING)
+    assert_equal(_get_level(logging.DEBUG), logging.DEBUG)
+    assert_equal(logger.level, logging.INFO)
+    assert_raises(ValueError, _get_level, 'foo')
+    # the level is restored when an error is raised
+    assert_raises(RuntimeError, _raise_error, 'DEBUG')
+    assert_equal(logger.level, logging.INFO)
+    set_log_level(old_level)
+
+
+def test_profile_context():
+    """Test profiling of MNE functions
+    """
+    Raw(fname_raw, preload=True)  # not profiled
+    with profile_context() as profile:
+        raw = Raw(fname_raw, preload=True)
+    stats = profile.stats
+    assert_true('mne.fiff.tag.read_tag' in stats)
+    assert_true('mne.fiff.raw._read_segment' in stats)
+    assert_true(stats['mne.fiff.tag.read_tag']['n_calls'] > 1)
+    assert_true(stats['mne.fiff.tag.read_tag']['bytes_read'] > 0)
+    for key in ('wall', 'cpu'):
+        assert_true(stats['mne.fiff.raw._read_segment'][key] >= 0)
+    assert_true('_read_segment' in profile.table())
+    fname = op.join(tempdir, 'profile.json')
+    profile.to_json(fname)
+    with open(fname, 'r') as fid:
+        assert_equal(json.load(fid), json.loads(profile.to_json()))
+    # collection stops outside of the context
+    n_calls = stats['mne.fiff.raw._read_segment']['n_calls']
+    raw._read_segment()
+    assert_equal(stats['mne.fiff.raw._read_segment']['n_calls'], n_calls)
+
+
+def test_global_profile():
+    """Test profiling of the whole session (MNE_PROFILE)
+    """
+    tracemalloc = utils.tracemalloc
+    if tracemalloc is None or not hasattr(tracemalloc, 'reset_peak'):
+        raise SkipTest('Peak memory tracing requires Python >= 3.9')
+    was_tracing = tracemalloc.is_tracing()
+    registered = list()
+    atexit_register = utils.atexit.register
+    utils.atexit.register = registered.append  # do not report at exit
+    try:
+        profile = utils._start_global_profile('1')
+    finally:
+        utils.atexit.register = atexit_register
+    try:
+        assert_true(tracemalloc.is_tracing())
+        _overlap_add_filter(np.random.randn(2, 1000), np.ones(11))
+    finally:
+        utils._profilers.remove(profile)
+        if not was_tracing:
+            tracemalloc.stop()
+    assert_equal(len(registered), 1)
+    stats = profile.stats['mne.filter._overlap_add_filter']
+    assert_equal(stats['n_calls'], 1)
+    assert_true(stats['peak_memory'] > 0)
+
+
 def test_config():
     """Test mne-python config file support"""
     key = '_MNE_PYTHON_CONFIG_TESTING'
@@ -144,6 +228,40 @@ def test_config():
     assert_equal(get_config(home_dir=tempdir), config)
 
 
+def test_lru_cache():
+    """Test the cache of computed results
+    """
+    cache = _LRUCache(max_size=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert_equal(cache.get('a'), 1)  # 'b' is now the least recently used
+    cache.set('c', 3)
+    assert_true('b' not in cache)
+    assert_equal(cache.get('b', 0), 0)
+    assert_equal(len(cache), 2)
+    assert_equal(cache.pop('a'), 1)
+    assert_equal(len(cache), 1)
+
+    # size in bytes
+    max_nbytes = [10]
+    cache_nbytes = _LRUCache(max_nbytes=lambda: max_nbytes[0])
+    cache_nbytes.set('a', 1, nbytes=4)
+    cache_nbytes.set('b', 2, nbytes=4)
+    cache_nbytes.set('c', 3, nbytes=20)  # too large
+    assert_true('c' not in cache_nbytes)
+    cache_nbytes.set('c', 3, nbytes=4)
+    assert_true('a' not in cache_nbytes)
+    assert_equal(len(cache_nbytes), 2)
+    max_nbytes[0] = 0
+    cache_nbytes.set('d', 4, nbytes=0)
+    assert_equal(len(cache_nbytes), 1)
+
+    # all the caches are cleared at once
+    _clear_caches()
+    assert_equal(len(cache), 0)
+    assert_equal(len(cache_nbytes), 0)
+
+
 def test_show_fiff():
     """Test show_fiff
     """
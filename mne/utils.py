@@ -11,11 +11,13 @@ from distutils.version import LooseVersion
 import os
 import os.path as op
 from functools import wraps
+from contextlib import contextmanager
 import inspect
 from string import Formatter
 import subprocess
 import sys
 from sys import stdout
+import time
 import tempfile
 import shutil
 from shutil import rmtree
@@ -349,8 +351,7 @@ class deprecated(object):
         return newdoc
 
 
-@decorator
-def verbose(function, *args, **kwargs):
+def verbose(function):
     """Improved verbose decorator to allow functions to override log-level
 
     Do not call this directly to set global verbosrity level, instead use
@@ -366,31 +367,239 @@ def verbose(function, *args, **kwargs):
     dec - function
         The decorated function
     """
+    # inspect the signature only once, at decoration time
     arg_names = inspect.getargspec(function).args
-
-    if len(arg_names) > 0 and arg_names[0] == 'self':
-        default_level = getattr(args[0], 'verbose', None)
+    if 'verbose' in arg_names:
+        verbose_idx = arg_names.index('verbose')
     else:
-        default_level = None
+        verbose_idx = None
+    is_method = len(arg_names) > 0 and arg_names[0] == 'self'
+
+    def _verbose(function, *args, **kwargs):
+        if verbose_idx is not None:
+            verbose_level = args[verbose_idx]
+        elif is_method:
+            verbose_level = getattr(args[0], 'verbose', None)
+        else:
+            verbose_level = None
+
+        if verbose_level is not None:
+            level = _get_log_level(verbose_level)
+            old_level = logger.level
+            if level != old_level:
+                logger.setLevel(level)
+                # set it back even if we get an exception
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    logger.setLevel(old_level)
+        return function(*args, **kwargs)
 
-    if('verbose' in arg_names):
-        verbose_level = args[arg_names.index('verbose')]
-    else:
-        verbose_level = default_level
+    return decorator(_verbose, function)
 
-    if verbose_level is not None:
-        old_level = set_log_level(verbose_level, True)
-        # set it back if we get an exception
-        try:
-            ret = function(*args, **kwargs)
-        except:
-            set_log_level(old_level)
-            raise
-        set_log_level(old_level)
-        return ret
+
+###############################################################################
+# PROFILING
+
+try:
+    _process_time = time.process_time
+except AttributeError:  # Python 2
+    _process_time = time.clock
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+_profilers = list()  # active Profile instances
+_peak_stack = list()  # peak memory of nested profiled calls
+
+
+def _get_bytes_read():
+    """Get the number of bytes read by this process (None if unknown)"""
+    try:
+        with open('/proc/self/io', 'r') as fid:
+            for line in fid:
+                if line.startswith('rchar:'):
+                    return int(line.split()[1])
+    except (IOError, OSError):
+        pass
+    return None
+
+
+def _trace_memory():
+    """Check if memory can be traced per call"""
+    return (tracemalloc is not None and tracemalloc.is_tracing() and
+            hasattr(tracemalloc, 'reset_peak'))
+
+
+@decorator
+def profiled(function, *args, **kwargs):
+    """Decorator to record time and memory use of a function when profiling
+
+    Statistics are only collected inside a profile_context (or when the
+    MNE_PROFILE config variable is set), otherwise the function is called
+    directly.
+    """
+    if len(_profilers) == 0:
+        return function(*args, **kwargs)
+    name = '%s.%s' % (function.__module__, function.__name__)
+    trace = _trace_memory()
+    if trace:
+        current, peak = tracemalloc.get_traced_memory()
+        if len(_peak_stack) > 0:
+            _peak_stack[-1] = max(_peak_stack[-1], peak)
+        _peak_stack.append(current)
+        tracemalloc.reset_peak()
+    nbytes = _get_bytes_read()
+    cpu = _process_time()
+    wall = time.time()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        wall = time.time() - wall
+        cpu = _process_time() - cpu
+        if nbytes is not None:
+            nbytes = _get_bytes_read() - nbytes
+        peak = None
+        if trace:
+            peak = max(_peak_stack.pop(), tracemalloc.get_traced_memory()[1])
+            if len(_peak_stack) > 0:
+                _peak_stack[-1] = max(_peak_stack[-1], peak)
+            tracemalloc.reset_peak()
+            peak -= current
+        for prof in _profilers:
+            prof._add(name, wall, cpu, nbytes, peak)
+
+
+def _profile_count(name, nbytes):
+    """Count a call and the bytes read by a function called too often to
+    be timed with the profiled decorator (e.g., read_tag)"""
+    for prof in _profilers:
+        prof._add(name, 0., 0., nbytes, None)
+
+
+class Profile(object):
+    """Timing and memory statistics of profiled MNE functions
+
+    Statistics are aggregated per function (call site) and contain the
+    number of calls, the wall and CPU time (in seconds), the number of bytes
+    read from disk and the peak memory allocated during a call (in bytes,
+    requires Python >= 3.9). Nested calls are included in the statistics
+    of the calling function. Functions that are called very often (reading
+    FIF tags) are only counted, with the number of bytes they read but
+    without timing.
+
+    Attributes
+    ----------
+    stats : dict
+        The statistics for each function, keyed by function name.
+    """
+    def __init__(self):
+        self.stats = dict()
+
+    def _add(self, name, wall, cpu, nbytes, peak):
+        if name not in self.stats:
+            self.stats[name] = dict(n_calls=0, wall=0., cpu=0.,
+                                    bytes_read=None, peak_memory=None)
+        stats = self.stats[name]
+        stats['n_calls'] += 1
+        stats['wall'] += wall
+        stats['cpu'] += cpu
+        if nbytes is not None:
+            stats['bytes_read'] = (stats['bytes_read'] or 0) + nbytes
+        if peak is not None:
+            stats['peak_memory'] = max(stats['peak_memory'] or 0, peak)
+
+    def to_json(self, fname=None):
+        """Export the statistics to JSON
+
+        Parameters
+        ----------
+        fname : str | None
+            If not None, the JSON is also written to this file.
+
+        Returns
+        -------
+        s : str
+            The statistics as a JSON string.
+        """
+        s = json.dumps(self.stats, sort_keys=True, indent=2)
+        if fname is not None:
+            with open(fname, 'w') as fid:
+                fid.write(s)
+        return s
+
+    def table(self):
+        """Format the statistics as a table sorted by wall time
+
+        Returns
+        -------
+        s : str
+            The table.
+        """
+        lines = ['%-50s %8s %10s %10s %10s %10s'
+                 % ('function', 'calls', 'wall (s)', 'cpu (s)', 'read',
+                    'peak mem')]
+        for name, stats in sorted(self.stats.items(),
+                                  key=lambda x: -x[1]['wall']):
+            fmt = [sizeof_fmt(stats[key]) if stats[key] is not None else '-'
+                   for key in ('bytes_read', 'peak_memory')]
+            lines.append('%-50s %8d %10.3f %10.3f %10s %10s'
+                         % (name, stats['n_calls'], stats['wall'],
+                            stats['cpu'], fmt[0], fmt[1]))
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return '<Profile  |  %d functions>' % len(self.stats)
+
+
+@contextmanager
+def profile_context(memory=True):
+    """Context manager to profile MNE functions
+
+    Parameters
+    ----------
+    memory : bool
+        If True, trace memory allocations to report the peak memory of each
+        call (requires Python >= 3.9). This slows down the execution.
+
+    Returns
+    -------
+    profile : instance of Profile
+        The statistics collected in the context.
+
+    Examples
+    --------
+    >>> with mne.utils.profile_context() as profile: # doctest: +SKIP
+    ...     raw = mne.fiff.Raw(fname, preload=True)
+    >>> print(profile.table()) # doctest: +SKIP
+    """
+    profile = Profile()
+    trace = memory and tracemalloc is not None and not tracemalloc.is_tracing()
+    if trace:
+        tracemalloc.start()
+    _profilers.append(profile)
+    try:
+        yield profile
+    finally:
+        _profilers.remove(profile)
+        if trace:
+            tracemalloc.stop()
+
+
+def _start_global_profile(value):
+    """Profile the whole session and report at exit (MNE_PROFILE)"""
+    profile = Profile()
+    # same as profile_context(memory=True), for the rest of the session
+    if tracemalloc is not None and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _profilers.append(profile)
+    if value.lower().endswith('.json'):
+        atexit.register(profile.to_json, value)
     else:
-        ret = function(*args, **kwargs)
-        return ret
+        atexit.register(lambda: sys.stderr.write(profile.table() + '\n'))
+    return profile
 
 
 def has_command_line_tools():
@@ -690,23 +899,31 @@ def set_log_level(verbose=None, return_old_level=False):
     """
     if verbose is None:
         verbose = get_config('MNE_LOGGING_LEVEL', 'INFO')
-    elif isinstance(verbose, bool):
+    verbose = _get_log_level(verbose)
+    logger = logging.getLogger('mne')
+    old_verbose = logger.level
+    logger.setLevel(verbose)
+    return (old_verbose if return_old_level else None)
+
+
+_logging_types = dict(DEBUG=logging.DEBUG, INFO=logging.INFO,
+                      WARNING=logging.WARNING, ERROR=logging.ERROR,
+                      CRITICAL=logging.CRITICAL)
+
+
+def _get_log_level(verbose):
+    """Convert a (non-None) verbose value to a logging level"""
+    if isinstance(verbose, bool):
         if verbose is True:
             verbose = 'INFO'
         else:
             verbose = 'WARNING'
     if isinstance(verbose, string_types):
         verbose = verbose.upper()
-        logging_types = dict(DEBUG=logging.DEBUG, INFO=logging.INFO,
-                             WARNING=logging.WARNING, ERROR=logging.ERROR,
-                             CRITICAL=logging.CRITICAL)
-        if not verbose in logging_types:
+        if not verbose in _logging_types:
             raise ValueError('verbose must be of a valid type')
-        verbose = logging_types[verbose]
-    logger = logging.getLogger('mne')
-    old_verbose = logger.level
-    logger.setLevel(verbose)
-    return (old_verbose if return_old_level else None)
+        verbose = _logging_types[verbose]
+    return verbose
 
 
 def set_log_file(fname=None, output_format='%(message)s', overwrite=None):
@@ -870,11 +1087,13 @@ known_config_types = [
     'MNE_DATASETS_MEGSIM_PATH',
     'MNE_DATASETS_SAMPLE_PATH',
     'MNE_DATASETS_SPM_FACE_PATH',
+    'MNE_INVERSE_CACHE_SIZE',
     'MNE_LOGGING_LEVEL',
     'MNE_USE_CUDA',
     'SUBJECTS_DIR',
     'MNE_CACHE_DIR',
     'MNE_MEMMAP_MIN_SIZE',
+    'MNE_PROFILE',
     'MNE_SKIP_SAMPLE_DATASET_TESTS',
     'MNE_DATASETS_SPM_FACE_DATASETS_TESTS'
     ]
@@ -988,6 +1207,83 @@ def set_config(key, value, home_dir=None):
         json.dump(config, fid, sort_keys=True, indent=0)
 
 
+_caches = list()  # all the _LRUCache instances, see _clear_caches
+
+
+class _LRUCache(object):
+    """Cache dropping the least recently used items first
+
+    Parameters
+    ----------
+    max_size : int | None
+        The maximum number of items. If None, the number is not limited.
+    max_nbytes : float | callable | None
+        The maximum total size of the items (in bytes), or a function
+        returning it. Items larger than this are not stored. If None, the
+        size is not limited.
+    """
+    def __init__(self, max_size=None, max_nbytes=None):
+        self.max_size = max_size
+        self.max_nbytes = max_nbytes
+        # (no OrderedDict on Python 2.6, the order is kept in a list)
+        self._items = dict()  # (value, nbytes)
+        self._keys = list()  # most recently used at the end
+        _caches.append(self)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key, default=None):
+        """Get an item, which becomes the most recently used"""
+        if key not in self._items:
+            return default
+        self._keys.remove(key)
+        self._keys.append(key)
+        return self._items[key][0]
+
+    def set(self, key, value, nbytes=0):
+        """Add an item, dropping the least recently used ones if needed"""
+        max_nbytes = self.max_nbytes
+        if callable(max_nbytes):
+            max_nbytes = max_nbytes()
+        self.pop(key)
+        if max_nbytes is not None and nbytes > max_nbytes:
+            return
+        self._items[key] = (value, nbytes)
+        self._keys.append(key)
+        while self.max_size is not None and len(self._keys) > self.max_size:
+            self._drop_oldest()
+        if max_nbytes is not None:
+            total = sum(n for _, n in self._items.values())
+            while total > max_nbytes:
+                total -= self._drop_oldest()
+
+    def _drop_oldest(self):
+        """Drop the least recently used item, return its size"""
+        return self._items.pop(self._keys.pop(0))[1]
+
+    def pop(self, key, default=None):
+        """Remove an item and return it"""
+        if key not in self._items:
+            return default
+        self._keys.remove(key)
+        return self._items.pop(key)[0]
+
+    def clear(self):
+        """Remove all the items"""
+        self._items.clear()
+        del self._keys[:]
+
+
+def _clear_caches():
+    """Clear all the caches of computed results (see _LRUCache)"""
+    for cache in _caches:
+        cache.clear()
+
+
 class ProgressBar(object):
     """Class for generating a command-line progressbar
 